@@ -16,12 +16,13 @@ from threading import Event, enumerate as enumerate_threads
 from traceback import print_exc
 
 from twisted.internet import reactor
-from twisted.internet.defer import Deferred, DeferredList, inlineCallbacks, succeed
+from twisted.internet.defer import Deferred, DeferredList, inlineCallbacks, returnValue, succeed
 from twisted.internet.task import LoopingCall
 from twisted.internet.threads import deferToThread
 from twisted.python.threadable import isInIOThread
 
 from Tribler.Core.DownloadConfig import DownloadStartupConfig
+from Tribler.Core.Modules.download_state_store import DOWNLOAD_STATE_DB_FILENAME, DownloadStateStore
 from Tribler.Core.Modules.MetadataStore.store import MetadataStore
 from Tribler.Core.Modules.gigachannel_manager import GigaChannelManager
 from Tribler.Core.Modules.payout_manager import PayoutManager
@@ -36,6 +37,7 @@ from Tribler.Core.TorrentDef import TorrentDef, TorrentDefNoMetainfo
 from Tribler.Core.Utilities.configparser import CallbackConfigParser
 from Tribler.Core.Utilities.install_dir import get_lib_path
 from Tribler.Core.Video.VideoServer import VideoServer
+from Tribler.Core.exceptions import DownloadHopsUpdateError
 from Tribler.Core.simpledefs import (DLSTATUS_DOWNLOADING, DLSTATUS_SEEDING, DLSTATUS_STOPPED_ON_ERROR, NTFY_ERROR,
                                      NTFY_FINISHED, NTFY_STARTED, NTFY_TORRENT, NTFY_TRIBLER,
                                      STATE_START_API_ENDPOINTS, STATE_START_CREDIT_MINING,
@@ -49,6 +51,10 @@ from Tribler.pyipv8.ipv8.peerdiscovery.discovery import EdgeWalk, RandomWalk
 from Tribler.pyipv8.ipv8.taskmanager import TaskManager
 from Tribler.pyipv8.ipv8_service import IPv8
 
+# The number of download checkpoints that are loaded by a single thread pool job when resuming downloads
+RESUME_BATCH_SIZE = 50
+DOWNLOAD_STATE_FLUSH_INTERVAL = 10
+
 
 class TriblerLaunchMany(TaskManager):
 
@@ -94,6 +100,7 @@ class TriblerLaunchMany(TaskManager):
         self.video_server = None
 
         self.ltmgr = None
+        self.download_state_store = None
         self.tracker_manager = None
         self.torrent_checker = None
         self.tunnel_community = None
@@ -304,6 +311,8 @@ class TriblerLaunchMany(TaskManager):
 
         if self.session.config.get_libtorrent_enabled():
             self.session.readable_status = STATE_START_LIBTORRENT
+            if self.session.config.get_libtorrent_download_state_db_enabled():
+                self.init_download_state_store()
             from Tribler.Core.Libtorrent.LibtorrentMgr import LibtorrentMgr
             self.ltmgr = LibtorrentMgr(self.session)
             self.ltmgr.initialize()
@@ -352,7 +361,16 @@ class TriblerLaunchMany(TaskManager):
     def add(self, tdef, dscfg, pstate=None, setupDelay=0, hidden=False,
             share_mode=False, checkpoint_disabled=False):
         """ Called by any thread """
-        d = None
+        d, setup_deferred = self.setup_download(tdef, dscfg, pstate=pstate, setupDelay=setupDelay,
+                                                share_mode=share_mode, checkpoint_disabled=checkpoint_disabled)
+        setup_deferred.addCallback(self.on_download_handle_created)
+        return d
+
+    def setup_download(self, tdef, dscfg, pstate=None, setupDelay=0, share_mode=False, checkpoint_disabled=False):
+        """
+        Create a download and add it to libtorrent, without checkpointing it.
+        :return: a tuple of the download and a deferred that fires when libtorrent has added the download.
+        """
         with self.session_lock:
             infohash = tdef.get_infohash()
 
@@ -383,9 +401,8 @@ class TriblerLaunchMany(TaskManager):
             self.downloads[infohash] = d
             setup_deferred = d.setup(dscfg, pstate, wrapperDelay=setupDelay,
                                      share_mode=share_mode, checkpoint_disabled=checkpoint_disabled)
-            setup_deferred.addCallback(self.on_download_handle_created)
 
-        return d
+        return d, setup_deferred
 
     def on_download_handle_created(self, download):
         """
@@ -423,24 +440,68 @@ class TriblerLaunchMany(TaskManager):
         with self.session_lock:
             return infohash in self.downloads
 
-    @inlineCallbacks
     def update_download_hops(self, download, new_hops):
         """
         Update the amount of hops for a specified download. This can be done on runtime.
         """
         infohash = hexlify(download.tdef.get_infohash())
         self._logger.info("Updating the amount of hops of download %s", infohash)
-        pstate = download.get_persistent_download_config()
-        pstate.set('state', 'engineresumedata', (yield download.save_resume_data()))
-        yield self.session.remove_download(download)
+        return self.update_downloads_hops([download], new_hops)
 
-        # copy the old download_config and change the hop count
-        dscfg = download.copy()
-        dscfg.set_hops(new_hops)
-        # If the user wants to change the hop count to 0, don't automatically bump this up to 1 anymore
-        dscfg.set_safe_seeding(False)
-
-        self.session.start_download_from_tdef(download.tdef, dscfg, pstate=pstate)
+    @inlineCallbacks
+    def update_downloads_hops(self, downloads, new_hops):
+        """
+        Update the amount of hops for a list of downloads. The downloads are removed and added again all at once,
+        and checkpointed together when libtorrent has added all of them. A download of which we cannot save the resume
+        data, or which we cannot remove, keeps its hop count and does not stop the update of the other downloads.
+        :return: a deferred that fires with the list of the new downloads, or that fails with a DownloadHopsUpdateError
+                 with the infohashes of the downloads that could not be updated, once the others have been updated.
+        """
+        failed_infohashes = []
+
+        def on_failure(download, action, failure):
+            infohash = hexlify(download.get_def().get_infohash())
+            self._logger.error("Could not %s of download %s: %s", action, infohash, failure.getErrorMessage())
+            failed_infohashes.append(infohash)
+
+        pstates = [download.get_persistent_download_config() for download in downloads]
+        saved_downloads = []
+        results = yield DeferredList([download.save_resume_data() for download in downloads], consumeErrors=True)
+        for download, pstate, (success, result) in zip(downloads, pstates, results):
+            if not success:
+                on_failure(download, "save the resume data", result)
+                continue
+            pstate.set('state', 'engineresumedata', result)
+            saved_downloads.append((download, pstate))
+
+        removed_downloads = []
+        results = yield DeferredList([self.session.remove_download(download) for download, _ in saved_downloads],
+                                     consumeErrors=True)
+        for (download, pstate), (success, result) in zip(saved_downloads, results):
+            if not success:
+                on_failure(download, "remove the old instance", result)
+                continue
+            removed_downloads.append((download, pstate))
+
+        new_downloads = []
+        setup_deferreds = []
+        for download, pstate in removed_downloads:
+            # copy the old download_config and change the hop count
+            dscfg = download.copy()
+            dscfg.set_hops(new_hops)
+            # If the user wants to change the hop count to 0, don't automatically bump this up to 1 anymore
+            dscfg.set_safe_seeding(False)
+
+            new_download, setup_deferred = self.setup_download(download.tdef, dscfg, pstate=pstate)
+            new_downloads.append(new_download)
+            setup_deferreds.append(setup_deferred)
+
+        # The checkpoints should contain the new hop count, which libtorrent only knows when it has added a download
+        yield DeferredList(setup_deferreds, consumeErrors=True)
+        yield self.checkpoint_downloads(new_downloads)
+        if failed_infohashes:
+            raise DownloadHopsUpdateError(failed_infohashes)
+        returnValue(new_downloads)
 
     def update_trackers(self, infohash, trackers):
         """ Update the trackers for a download.
@@ -550,7 +611,7 @@ class TriblerLaunchMany(TaskManager):
             # Check the peers of this download every five seconds and add them to the payout manager when
             # this peer runs a Tribler instance
             if self.state_cb_count % 5 == 0 and download.get_hops() == 0 and self.payout_manager:
-                for peer in download.get_peerlist():
+                for peer in ds.get_peerlist():
                     if peer["extended_version"].startswith('Tribler'):
                         self.payout_manager.update_peer(unhexlify(peer["id"]), infohash, peer["dtotal"])
 
@@ -569,22 +630,72 @@ class TriblerLaunchMany(TaskManager):
     #
     # Persistence methods
     #
-    def load_checkpoint(self):
-        """ Called by any thread """
+    def init_download_state_store(self):
+        """
+        Open the database with the persistent state of all downloads and move the existing .state files into it.
+        The buffered writes to the database are flushed periodically on the thread pool.
+        """
+        pstate_dir = self.session.get_downloads_pstate_dir()
+        self.download_state_store = DownloadStateStore(os.path.join(pstate_dir, DOWNLOAD_STATE_DB_FILENAME))
+
+        moved_filenames = []
+        for filename in iglob(os.path.join(pstate_dir, '*.state')):
+            try:
+                infohash = unhexlify(os.path.basename(filename)[:-len('.state')])
+                self.download_state_store.put(infohash, self.load_download_pstate(filename))
+                moved_filenames.append(filename)
+            except Exception:
+                self._logger.exception("tlm: could not move checkpoint %s to the download state store", filename)
+        self.download_state_store.flush()
+
+        for filename in moved_filenames:
+            os.remove(filename)
 
+        self.register_task("flush_download_states",
+                           LoopingCall(self.flush_download_states)).start(DOWNLOAD_STATE_FLUSH_INTERVAL, now=False)
+
+    def flush_download_states(self):
+        """
+        Write the buffered download states to the download state store, in a single transaction on the thread pool.
+        """
+        if not self.download_state_store:
+            return succeed(None)
+        return deferToThread(self.download_state_store.flush)
+
+    def load_checkpoint(self):
+        """
+        Resume the downloads from their checkpoints. The checkpoints are read and parsed in batches on the thread pool,
+        after which the downloads in each batch are added at once.
+        Called by the reactor thread, since it schedules the batches on the thread pool.
+        """
         def do_load_checkpoint():
-            with self.session_lock:
-                for i, filename in enumerate(iglob(os.path.join(self.session.get_downloads_pstate_dir(), '*.state'))):
-                    self.resume_download(filename, setupDelay=i * 0.1)
+            if self.download_state_store:
+                keys = self.download_state_store.get_infohashes()
+                load_batch = self.load_stored_resume_states
+            else:
+                keys = list(iglob(os.path.join(self.session.get_downloads_pstate_dir(), '*.state')))
+                load_batch = self.load_resume_states
+
+            deferreds = []
+            for index in range(0, len(keys), RESUME_BATCH_SIZE):
+                batch_deferred = deferToThread(load_batch, keys[index:index + RESUME_BATCH_SIZE])
+                deferreds.append(batch_deferred.addCallback(self.resume_downloads))
+            return DeferredList(deferreds, consumeErrors=True)
 
         if self.initComplete:
-            do_load_checkpoint()
-        else:
-            self.register_task("load_checkpoint", reactor.callLater(1, do_load_checkpoint))
+            return do_load_checkpoint()
+
+        deferred = Deferred()
+        self.register_task("load_checkpoint",
+                           reactor.callLater(1, lambda: do_load_checkpoint().chainDeferred(deferred)))
+        return deferred
 
     def load_download_pstate_noexc(self, infohash):
         """ Called by any thread, assume session_lock already held """
         try:
+            if self.download_state_store:
+                return self.download_state_store.get(infohash)
+
             basename = hexlify(infohash) + '.state'
             filename = os.path.join(self.session.get_downloads_pstate_dir(), basename)
             if os.path.exists(filename):
@@ -595,11 +706,48 @@ class TriblerLaunchMany(TaskManager):
         except Exception:
             self._logger.exception("Exception while loading pstate: %s", infohash)
 
-    def resume_download(self, filename, setupDelay=0):
-        tdef = dscfg = pstate = None
+    def load_resume_states(self, filenames):
+        """
+        Load the checkpoints of the given files. Checkpoints that cannot be loaded are skipped.
+        Called by a thread pool thread.
+        :return: a list of (filename, tdef, dscfg, pstate) tuples
+        """
+        resume_states = []
+        for filename in filenames:
+            try:
+                resume_states.append((filename, ) + self.load_resume_state(filename))
+            except Exception:
+                self._logger.exception("tlm: could not load checkpoint %s", filename)
+        return resume_states
 
-        pstate = self.load_download_pstate(filename)
+    def load_resume_state(self, filename):
+        """
+        Load the checkpoint in a given file.
+        :return: a (tdef, dscfg, pstate) tuple
+        """
+        return self.parse_resume_state(self.load_download_pstate(filename))
+
+    def load_stored_resume_states(self, hex_infohashes):
+        """
+        Load the checkpoints of the given downloads from the download state store. Checkpoints that cannot be loaded
+        are skipped.
+        Called by a thread pool thread.
+        :return: a list of (None, tdef, dscfg, pstate) tuples
+        """
+        resume_states = []
+        for hex_infohash in hex_infohashes:
+            try:
+                pstate = self.download_state_store.get(unhexlify(hex_infohash))
+                resume_states.append((None, ) + self.parse_resume_state(pstate))
+            except Exception:
+                self._logger.exception("tlm: could not load checkpoint %s from the download state store", hex_infohash)
+        return resume_states
 
+    def parse_resume_state(self, pstate):
+        """
+        Create the torrent definition and download configuration of a checkpoint.
+        :return: a (tdef, dscfg, pstate) tuple
+        """
         metainfo = pstate.get('state', 'metainfo')
         if 'infohash' in metainfo:
             tdef = TorrentDefNoMetainfo(metainfo['infohash'], metainfo['name'], metainfo.get('url', None))
@@ -612,6 +760,25 @@ class TriblerLaunchMany(TaskManager):
 
         dscfg = DownloadStartupConfig(pstate)
 
+        return tdef, dscfg, pstate
+
+    def resume_downloads(self, resume_states):
+        """
+        Resume the downloads from a list of loaded checkpoints, see load_resume_states.
+        """
+        with self.session_lock:
+            for filename, tdef, dscfg, pstate in resume_states:
+                # A download that cannot be resumed should not keep the other downloads of the batch from resuming
+                try:
+                    self.resume_download_from_state(filename, tdef, dscfg, pstate)
+                except Exception:
+                    self._logger.exception("tlm: could not resume download from checkpoint %s", filename)
+
+    def resume_download(self, filename, setupDelay=0):
+        tdef, dscfg, pstate = self.load_resume_state(filename)
+        self.resume_download_from_state(filename, tdef, dscfg, pstate, setupDelay=setupDelay)
+
+    def resume_download_from_state(self, filename, tdef, dscfg, pstate, setupDelay=0):
         if pstate is not None:
             has_resume_data = pstate.get('state', 'engineresumedata') is not None
             self._logger.debug("tlm: load_checkpoint: resumedata %s",
@@ -629,25 +796,31 @@ class TriblerLaunchMany(TaskManager):
                 except Exception as e:
                     self._logger.exception("tlm: load check_point: exception while adding download %s", tdef)
             else:
-                self._logger.info("tlm: removing checkpoint %s destdir is %s", filename, dscfg.get_dest_dir())
-                os.remove(filename)
+                self._logger.info("tlm: removing checkpoint %s destdir is %s",
+                                  filename or hexlify(tdef.get_infohash()), dscfg.get_dest_dir())
+                if filename:
+                    os.remove(filename)
+                else:
+                    self.download_state_store.remove(tdef.get_infohash())
         else:
             self._logger.info("tlm: could not resume checkpoint %s %s %s", filename, tdef, dscfg)
 
-    def checkpoint_downloads(self):
+    def checkpoint_downloads(self, downloads=None):
         """
-        Checkpoints all running downloads in Tribler.
+        Checkpoints all running downloads in Tribler, or the given list of downloads.
         Even if the list of Downloads changes in the mean time this is no problem.
         For removals, dllist will still hold a pointer to the download, and additions are no problem
         (just won't be included in list of states returned via callback).
         """
-        downloads = self.downloads.values()
+        if downloads is None:
+            downloads = self.downloads.values()
         deferred_list = []
         self._logger.debug("tlm: checkpointing %s downloads", len(downloads))
         for download in downloads:
             deferred_list.append(download.checkpoint())
 
-        return DeferredList(deferred_list)
+        # Write all download states that have been checkpointed in a single transaction
+        return DeferredList(deferred_list).addCallback(lambda _: self.flush_download_states())
 
     def shutdown_downloads(self):
         """
@@ -659,6 +832,10 @@ class TriblerLaunchMany(TaskManager):
     def remove_pstate(self, infohash):
         def do_remove():
             if not self.download_exists(infohash):
+                if self.download_state_store:
+                    self.download_state_store.remove(infohash)
+                    return
+
                 dlpstatedir = self.session.get_downloads_pstate_dir()
 
                 # Remove checkpoint
@@ -787,6 +964,11 @@ class TriblerLaunchMany(TaskManager):
             self.ltmgr.shutdown()
             self.ltmgr = None
 
+        # Write the states of the downloads that have been checkpointed during shutdown
+        if self.download_state_store is not None:
+            self.download_state_store.close()
+            self.download_state_store = None
+
     def save_download_pstate(self, infohash, pstate):
         """ Called by network thread """
 
@@ -48,6 +48,9 @@ max_download_rate = integer(default=0)
 max_upload_rate = integer(default=0)
 utp = boolean(default=True)
 dht = boolean(default=True)
+download_state_db = boolean(default=False)
+shared_metainfo_session = boolean(default=False)
+settings_profile = option('desktop', 'seedbox', 'low_memory', default='desktop')
 
 anon_listen_port = integer(min=-1, max=65536, default=-1)
 anon_proxy_type = integer(min=0, max=5, default=0)
@@ -411,6 +411,35 @@ class TriblerConfig(object):
     def get_libtorrent_dht_enabled(self):
         return self.config['libtorrent']['dht']
 
+    def set_libtorrent_download_state_db_enabled(self, value):
+        """
+        Set whether the persistent state of downloads is stored in a single database instead of a file per download.
+        """
+        self.config['libtorrent']['download_state_db'] = value
+
+    def get_libtorrent_download_state_db_enabled(self):
+        return self.config['libtorrent']['download_state_db']
+
+    def set_libtorrent_shared_metainfo_session_enabled(self, value):
+        """
+        Set whether metainfo and DHT health lookups use the session of the downloads without hops, instead of a
+        separate libtorrent session.
+        """
+        self.config['libtorrent']['shared_metainfo_session'] = value
+
+    def get_libtorrent_shared_metainfo_session_enabled(self):
+        return self.config['libtorrent']['shared_metainfo_session']
+
+    def set_libtorrent_settings_profile(self, value):
+        """
+        Set the profile of the disk cache, disk threads, send buffer and connection settings of libtorrent.
+        :param value: either 'desktop', 'seedbox' or 'low_memory'.
+        """
+        self.config['libtorrent']['settings_profile'] = value
+
+    def get_libtorrent_settings_profile(self):
+        return self.config['libtorrent']['settings_profile']
+
     # Video server
 
     def set_video_server_enabled(self, value):
@@ -90,7 +90,11 @@ class CreditMiningManager(TaskManager):
 
         self.register_task('check_disk_space', LoopingCall(self.check_disk_space)).start(30, now=False)
         self.select_lc = self.register_task('select_torrents', LoopingCall(self.select_torrents))
-        self.num_checkpoints = len(glob(os.path.join(self.session.get_downloads_pstate_dir(), '*.state')))
+        download_state_store = self.session.lm.download_state_store
+        if download_state_store:
+            self.num_checkpoints = len(download_state_store.get_infohashes())
+        else:
+            self.num_checkpoints = len(glob(os.path.join(self.session.get_downloads_pstate_dir(), '*.state')))
 
         def add_sources(_):
             for source in self.session.config.get_credit_mining_sources():
@@ -206,6 +210,15 @@ class CreditMiningManager(TaskManager):
         self._logger.error('Cannot remove non-existing source %s', source_str)
         return succeed(None)
 
+    def has_checkpoint(self, infohash):
+        """
+        Check whether we have a checkpoint for the download with the given hex infohash
+        """
+        download_state_store = self.session.lm.download_state_store
+        if download_state_store:
+            return download_state_store.has(unhexlify(infohash))
+        return os.path.exists(os.path.join(self.session.get_downloads_pstate_dir(), infohash + '.state'))
+
     def on_torrent_insert(self, source_str, infohash, name):
         """
         Callback function called by the source when a new torrent is discovered
@@ -223,8 +236,7 @@ class CreditMiningManager(TaskManager):
             return
 
         # If a download already exists or already has a checkpoint, skip this torrent
-        if self.session.get_download(unhexlify(infohash)) or \
-                os.path.exists(os.path.join(self.session.get_downloads_pstate_dir(), infohash + '.state')):
+        if self.session.get_download(unhexlify(infohash)) or self.has_checkpoint(infohash):
             self._logger.debug('Skipping torrent %s (download already running or scheduled to run)', infohash)
             return
 
@@ -7,6 +7,8 @@ from __future__ import absolute_import
 
 import logging
 
+import numpy as np
+
 from Tribler.Core.simpledefs import (DLSTATUS_ALLOCATING_DISKSPACE, DLSTATUS_CIRCUITS, DLSTATUS_DOWNLOADING,
                                      DLSTATUS_EXIT_NODES, DLSTATUS_HASHCHECKING, DLSTATUS_METADATA, DLSTATUS_SEEDING,
                                      DLSTATUS_STOPPED, DLSTATUS_STOPPED_ON_ERROR, DLSTATUS_WAITING4HASHCHECK, UPLOAD)
@@ -45,6 +47,10 @@ class DownloadState(object):
         self.error = error
         self.vod = vod or {}
 
+        # Retrieved from the download on first use, and then shared by all users of this snapshot
+        self.peerlist = None
+        self.tracker_status = None
+
     def get_download(self):
         """ Returns the Download object of which this is the state """
         return self.download
@@ -185,27 +191,29 @@ class DownloadState(object):
             return 0  # We do not have any info for this download so we cannot accurately get its availability
 
         nr_seeders_complete = 0
-        merged_bitfields = [0] * len(self.lt_status.pieces)
+        nr_pieces = len(self.lt_status.pieces)
+        leecher_bitfields = []
 
         peers = self.get_peerlist()
         for peer in peers:
             completed = peer.get('completed', 0)
-            have = peer.get('have', [])
+            have = np.array(peer.get('have') or [], dtype=bool)
 
-            if completed == 1 or have and all(have):
+            if completed == 1 or have.size and have.all():
                 nr_seeders_complete += 1
-            elif have and len(have) == len(merged_bitfields):
-                for i in range(len(have)):
-                    if have[i]:
-                        merged_bitfields[i] += 1
+            elif have.size and have.size == nr_pieces:
+                leecher_bitfields.append(have)
+
+        if nr_pieces:
+            # sum the leecher bitfields column-wise to get the number of copies of each piece
+            merged_bitfields = np.sum(leecher_bitfields, axis=0) if leecher_bitfields else np.zeros(nr_pieces)
 
-        if merged_bitfields:
             # count the number of complete copies due to overlapping leecher bitfields
-            nr_leechers_complete = min(merged_bitfields)
+            nr_leechers_complete = int(merged_bitfields.min())
 
             # detect remainder of bitfields which are > 0
-            nr_more_than_min = len([x for x in merged_bitfields if x > nr_leechers_complete])
-            fraction_additonal = float(nr_more_than_min) / len(merged_bitfields)
+            nr_more_than_min = np.count_nonzero(merged_bitfields > nr_leechers_complete)
+            fraction_additonal = float(nr_more_than_min) / nr_pieces
 
             return nr_seeders_complete + nr_leechers_complete + fraction_additonal
         return nr_seeders_complete
@@ -226,7 +234,23 @@ class DownloadState(object):
         return bool(self.vod)
 
     def get_peerlist(self):
-        """ Returns a list of dictionaries, one for each connected peer
+        """ Returns a list of read-only records, one for each connected peer
         containing the statistics for that peer.
         """
-        return self.download.get_peerlist()
+        if self.peerlist is None:
+            self.peerlist = self.download.get_peerlist()
+        return self.peerlist
+
+    def get_num_connected_seeds_peers(self):
+        """ Returns the number of connected seeders and leechers
+        @return A tuple (num seeds, num peers)
+        """
+        num_seeds = sum(1 for peer in self.get_peerlist() if peer.get('seed'))
+        return num_seeds, len(self.get_peerlist()) - num_seeds
+
+    def get_tracker_status(self):
+        """ Returns a dictionary with the number of peers and the status of every tracker of the download
+        """
+        if self.tracker_status is None:
+            self.tracker_status = self.download.get_tracker_status()
+        return self.tracker_status
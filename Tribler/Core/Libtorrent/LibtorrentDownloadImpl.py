@@ -10,14 +10,15 @@ import logging
 import os
 import shutil
 import sys
-import time
 from binascii import hexlify
+from collections import defaultdict
 from threading import RLock
 
 import libtorrent as lt
 
+import numpy as np
+
 import six
-from six.moves import xrange
 
 from twisted.internet import reactor
 from twisted.internet.defer import CancelledError, Deferred, succeed
@@ -42,69 +43,64 @@ if sys.platform == "win32":
     except ImportError:
         pass
 
-
-class VODFile(object):
-
-    def __init__(self, f, d):
-        self._logger = logging.getLogger(self.__class__.__name__)
-
-        self._file = f
-        self._download = d
-
-        pieces = self._download.tdef.get_pieces()
-        self.pieces = [pieces[x:x + 20] for x in xrange(0, len(pieces), 20)]
-        self.piecesize = self._download.tdef.get_piece_length()
-
-        self.startpiece = get_info_from_handle(self._download.handle).map_file(
-            self._download.get_vod_fileindex(), 0, 0)
-        self.endpiece = get_info_from_handle(self._download.handle).map_file(
-            self._download.get_vod_fileindex(), self._download.get_vod_filesize(), 0)
-
-    def read(self, *args):
-        oldpos = self._file.tell()
-
-        self._logger.debug('VODFile: get bytes %s - %s', oldpos, oldpos + args[0])
-
-        while not self._file.closed and self._download.get_byte_progress([
-            (self._download.get_vod_fileindex(), oldpos, oldpos + args[0])]) < 1 \
-                and self._download.vod_seekpos is not None:
-            time.sleep(1)
-
-        if self._file.closed:
-            self._logger.debug('VODFile: got no bytes, file is closed')
-            return ''
-
-        result = self._file.read(*args)
-
-        newpos = self._file.tell()
-        if self._download.vod_seekpos == oldpos:
-            self._download.vod_seekpos = newpos
-
-        self._logger.debug('VODFile: got bytes %s - %s', oldpos, newpos)
-
-        return result
-
-    def seek(self, *args):
-        self._file.seek(*args)
-        newpos = self._file.tell()
-
-        self._logger.debug('VODFile: seek %s %s', newpos, args)
-
-        if self._download.vod_seekpos is None or abs(newpos - self._download.vod_seekpos) < 1024 * 1024:
-            self._download.vod_seekpos = newpos
-        self._download.set_byte_priority([(self._download.get_vod_fileindex(), 0, newpos)], 0)
-        self._download.set_byte_priority([(self._download.get_vod_fileindex(), newpos, -1)], 1)
-
-        self._logger.debug('VODFile: seek, get pieces %s', self._download.handle.piece_priorities())
-        self._logger.debug('VODFile: seek, got pieces %s', [
-            int(piece) for piece in self._download.handle.status().pieces])
-
-    def close(self, *args):
-        self._file.close(*args)
-
-    @property
-    def closed(self):
-        return self._file.closed
+# Map from the type name of the libtorrent alerts handled by a download to the name of the handling method
+ALERT_HANDLERS = {alert_type: 'on_' + alert_type for alert_type in (
+    'tracker_reply_alert', 'tracker_error_alert', 'tracker_warning_alert', 'metadata_received_alert',
+    'file_renamed_alert', 'performance_alert', 'torrent_checked_alert', 'torrent_finished_alert',
+    'save_resume_data_alert', 'save_resume_data_failed_alert', 'piece_finished_alert')}
+LOGGED_ALERT_CATEGORIES = (lt.alert.category_t.error_notification, lt.alert.category_t.performance_warning)
+# When we change the priority of more pieces than this, we pass all piece priorities to libtorrent in a single call
+MAX_PIECE_PRIORITY_CALLS = 64
+
+
+class DownloadPeer(object):
+    """
+    Compact, read-only record with the statistics of a peer that is connected to a download. The fields can be read
+    like the keys of a dictionary, i.e. peer['ip'] or peer.get('have').
+    """
+    __slots__ = ('id', 'extended_version', 'ip', 'port', 'optimistic', 'direction', 'uprate', 'uinterested',
+                 'uchoked', 'uhasqueries', 'uflushed', 'downrate', 'dinterested', 'dchoked', 'snubbed', 'utotal',
+                 'dtotal', 'completed', 'have', 'speed', 'connection_type', 'seed', 'upload_only')
+
+    def __init__(self, peer_info):
+        self.id = hexlify(peer_info.pid.to_bytes())
+        self.extended_version = peer_info.client
+        self.ip = peer_info.ip[0]
+        self.port = peer_info.ip[1]
+        # optimistic_unchoke = 0x800 seems unavailable in python bindings
+        self.optimistic = bool(peer_info.flags & 0x800)
+        self.direction = 'L' if bool(peer_info.flags & peer_info.local_connection) else 'R'
+        self.uprate = peer_info.payload_up_speed
+        self.uinterested = bool(peer_info.flags & peer_info.remote_interested)
+        self.uchoked = bool(peer_info.flags & peer_info.remote_choked)
+        self.uhasqueries = peer_info.upload_queue_length > 0
+        self.uflushed = peer_info.used_send_buffer > 0
+        self.downrate = peer_info.payload_down_speed
+        self.dinterested = bool(peer_info.flags & peer_info.interesting)
+        self.dchoked = bool(peer_info.flags & peer_info.choked)
+        self.snubbed = bool(peer_info.flags & 0x1000)
+        self.utotal = peer_info.total_upload
+        self.dtotal = peer_info.total_download
+        self.completed = peer_info.progress
+        self.have = peer_info.pieces
+        self.speed = peer_info.remote_dl_rate
+        self.connection_type = peer_info.connection_type
+        self.seed = bool(peer_info.flags & peer_info.seed)
+        self.upload_only = bool(peer_info.flags & peer_info.upload_only)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self):
+        return list(self.__slots__)
 
 
 class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
@@ -132,8 +128,11 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         # not been started. Will set in create_engine wrapper
         self.ltmgr = None
 
-        # Libtorrent status
+        # Libtorrent status and the state snapshot that is shared until the next status update
         self.lt_status = None
+        self.cached_state = None
+        self.lt_status_pieces = None  # The pieces of lt_status as a boolean array, computed on demand
+        self.piece_priorities = None  # The piece priorities of the handle as an array, fetched on demand
         self.error = None
         self.done = False
         self.pause_after_next_hashcheck = False
@@ -156,6 +155,8 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
 
         self.deferreds_resume = []
         self.deferreds_handle = []
+        self.deferreds_piece = defaultdict(list)  # Deferreds waiting for a piece, by piece index
+        self.piece_deadline_counts = defaultdict(int)  # The number of streams that set a deadline, by piece index
         self.deferred_added = Deferred()
         self.deferred_removed = Deferred()
 
@@ -351,6 +352,9 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
             self.handle.set_sequential_download(False)
             self.handle.set_priority(0 if self.get_credit_mining() else 1)
             if self.get_vod_fileindex() >= 0:
+                self.handle.clear_piece_deadlines()
+                self.piece_deadline_counts.clear()
+                self.piece_priorities = None
                 self.set_byte_priority([(self.get_vod_fileindex(), 0, -1)], 1)
 
     def get_vod_fileindex(self):
@@ -367,24 +371,39 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
             return file_entry.size
         return 0
 
+    def get_pieces_bitfield(self, lt_status):
+        """
+        Returns the pieces of a libtorrent status as a boolean array. The array is computed only once for every
+        status update of this download.
+        """
+        if lt_status is not self.lt_status:
+            return np.array(lt_status.pieces, dtype=bool)
+
+        if self.lt_status_pieces is None:
+            self.lt_status_pieces = np.array(lt_status.pieces, dtype=bool)
+        return self.lt_status_pieces
+
     @checkHandleAndSynchronize(0.0)
     def get_piece_progress(self, pieces, consecutive=False):
-        if not pieces:
+        if pieces is None or len(pieces) == 0:
             return 1.0
-        elif consecutive:
-            pieces.sort()
 
-        status = self.handle.status()
+        status = self.lt_status or self.handle.status()
         if status:
-            pieces_have = 0
-            pieces_all = len(pieces)
-            bitfield = status.pieces
-            for pieceindex in pieces:
-                if pieceindex < len(bitfield) and bitfield[pieceindex]:
-                    pieces_have += 1
-                elif consecutive:
-                    break
-            return float(pieces_have) / pieces_all
+            pieces = np.sort(pieces) if consecutive else np.asarray(pieces)
+            bitfield = self.get_pieces_bitfield(status)
+
+            # Pieces outside of the bitfield count as pieces that we do not have
+            have = np.zeros(len(pieces), dtype=bool)
+            in_bitfield = pieces < len(bitfield)
+            have[in_bitfield] = bitfield[pieces[in_bitfield]]
+
+            if consecutive:
+                missing = np.flatnonzero(~have)
+                pieces_have = missing[0] if missing.size else len(have)
+            else:
+                pieces_have = np.count_nonzero(have)
+            return float(pieces_have) / len(pieces)
         return 0.0
 
     @checkHandleAndSynchronize('')
@@ -392,18 +411,16 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         """
         Returns a base64 encoded bitmask of the pieces that we have.
         """
-        bitstr = ""
-        for bit in self.handle.status().pieces:
-            bitstr += '1' if bit else '0'
-
-        encoded_str = ""
-        for i in range(0, len(bitstr), 8):
-            encoded_str += chr(int(bitstr[i:i + 8].ljust(8, '0'), 2))
-        return base64.b64encode(encoded_str)
+        bitfield = self.get_pieces_bitfield(self.lt_status or self.handle.status())
+        return base64.b64encode(np.packbits(bitfield).tobytes())
 
-    @checkHandleAndSynchronize(0.0)
-    def get_byte_progress(self, byteranges, consecutive=False):
-        pieces = []
+    def get_byte_pieces(self, byteranges):
+        """
+        Returns the indices of the pieces that contain the given byte ranges, as a sorted array without duplicates.
+        :param byteranges: a list of (fileindex, bytes_begin, bytes_end) tuples. Negative byte offsets are relative to
+        the end of the file.
+        """
+        spans = []
         torrent_info = get_info_from_handle(self.handle)
         if not torrent_info:
             self._logger.info("LibtorrentDownloadImpl: could not get info from download handle")
@@ -421,76 +438,106 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
                 startpiece = max(startpiece, 0)
                 endpiece = min(endpiece, torrent_info.num_pieces())
 
-                pieces += range(startpiece, endpiece)
+                spans.append(np.arange(startpiece, endpiece))
             else:
-                self._logger.info("LibtorrentDownloadImpl: could not get progress for incorrect fileindex")
+                self._logger.info("LibtorrentDownloadImpl: could not get pieces for incorrect fileindex")
+
+        return np.unique(np.concatenate(spans)) if spans else np.array([], dtype=int)
 
-        pieces = list(set(pieces))
-        return self.get_piece_progress(pieces, consecutive)
+    @checkHandleAndSynchronize(0.0)
+    def get_byte_progress(self, byteranges, consecutive=False):
+        return self.get_piece_progress(self.get_byte_pieces(byteranges), consecutive)
+
+    def get_piece_priorities(self):
+        """
+        Returns the piece priorities of the download as an array. We only ask libtorrent for the priorities of all
+        pieces when the selected files change, and keep track of the priorities that we change ourselves.
+        """
+        if self.piece_priorities is None:
+            self.piece_priorities = np.array(self.handle.piece_priorities(), dtype=np.uint8)
+        return self.piece_priorities
 
     @checkHandleAndSynchronize()
     def set_piece_priority(self, pieces_need, priority):
-        do_prio = False
-        pieces_have = self.handle.status().pieces
-        piecepriorities = self.handle.piece_priorities()
-        for piece in pieces_need:
-            if piece < len(piecepriorities):
-                if piecepriorities[piece] != priority and not pieces_have[piece]:
-                    piecepriorities[piece] = priority
-                    do_prio = True
+        """
+        Set the priority of the given pieces. Only the priorities of the pieces that we do not have yet, and that
+        have a different priority, are passed on to libtorrent.
+        """
+        piecepriorities = self.get_piece_priorities()
+        pieces = np.asarray(pieces_need, dtype=int)
+
+        existing = pieces < len(piecepriorities)
+        if not existing.all():
+            self._logger.info("LibtorrentDownloadImpl: could not set priority for non-existing pieces %s / %d",
+                              pieces[~existing], len(piecepriorities))
+            pieces = pieces[existing]
+
+        # Pieces outside of the bitfield count as pieces that we do not have
+        bitfield = self.get_pieces_bitfield(self.lt_status or self.handle.status())
+        have = np.zeros(len(pieces), dtype=bool)
+        in_bitfield = pieces < len(bitfield)
+        have[in_bitfield] = bitfield[pieces[in_bitfield]]
+
+        changed = pieces[(piecepriorities[pieces] != priority) & ~have]
+        if changed.size:
+            piecepriorities[changed] = priority
+            if changed.size > MAX_PIECE_PRIORITY_CALLS:
+                self.handle.prioritize_pieces(piecepriorities.tolist())
             else:
-                self._logger.info(
-                    "LibtorrentDownloadImpl: could not set priority for non-existing piece %d / %d", piece,
-                    len(piecepriorities))
-        if do_prio:
-            self.handle.prioritize_pieces(piecepriorities)
+                for piece in changed:
+                    self.handle.piece_priority(int(piece), priority)
         else:
             self._logger.info("LibtorrentDownloadImpl: skipping set_piece_priority")
 
     @checkHandleAndSynchronize()
     def set_byte_priority(self, byteranges, priority):
-        pieces = []
-        torrent_info = get_info_from_handle(self.handle)
-        if not torrent_info:
-            self._logger.info("LibtorrentDownloadImpl: could not get info from download handle")
+        pieces = self.get_byte_pieces(byteranges)
+        if pieces.size:
+            self.set_piece_priority(pieces, priority)
 
-        for fileindex, bytes_begin, bytes_end in byteranges:
-            if fileindex >= 0 and torrent_info:
-                # Ensure the we remain within the file's boundaries
-                file_entry = torrent_info.file_at(fileindex)
-                bytes_begin = min(
-                    file_entry.size, bytes_begin) if bytes_begin >= 0 else file_entry.size + (bytes_begin + 1)
-                bytes_end = min(file_entry.size, bytes_end) if bytes_end >= 0 else file_entry.size + (bytes_end + 1)
+    @checkHandleAndSynchronize()
+    def set_piece_deadline(self, piece, deadline):
+        """
+        Ask libtorrent to download the given piece within the given number of milliseconds. Every call should be
+        matched by a call to reset_piece_deadline once the caller no longer needs the piece.
+        """
+        self.handle.set_piece_deadline(piece, deadline)
+        self.piece_deadline_counts[piece] += 1
 
-                startpiece = torrent_info.map_file(fileindex, bytes_begin, 0).piece
-                endpiece = torrent_info.map_file(fileindex, bytes_end, 0).piece + 1
-                startpiece = max(startpiece, 0)
-                endpiece = min(endpiece, torrent_info.num_pieces())
+    @checkHandleAndSynchronize()
+    def reset_piece_deadline(self, piece):
+        """
+        Remove the deadline of the given piece, unless other streams still need it.
+        """
+        if self.piece_deadline_counts.get(piece, 0) > 1:
+            self.piece_deadline_counts[piece] -= 1
+            return
 
-                pieces += range(startpiece, endpiece)
-            else:
-                self._logger.info("LibtorrentDownloadImpl: could not set priority for incorrect fileindex")
+        self.piece_deadline_counts.pop(piece, None)
+        self.handle.reset_piece_deadline(piece)
+        # Libtorrent resets the priority of a piece that had a deadline
+        self.piece_priorities = None
 
-        if pieces:
-            pieces = list(set(pieces))
-            self.set_piece_priority(pieces, priority)
+    @checkHandleAndSynchronize()
+    def clear_piece_deadlines(self):
+        self.handle.clear_piece_deadlines()
+        self.piece_deadline_counts.clear()
+        # Libtorrent resets the priorities of the pieces that had a deadline
+        self.piece_priorities = None
 
     @checkHandleAndSynchronize()
     def process_alert(self, alert, alert_type):
-        if alert.category() in [lt.alert.category_t.error_notification, lt.alert.category_t.performance_warning]:
+        if alert.category() in LOGGED_ALERT_CATEGORIES:
             self._logger.debug("LibtorrentDownloadImpl: alert %s with message %s", alert_type, alert)
 
-        alert_types = ('tracker_reply_alert', 'tracker_error_alert', 'tracker_warning_alert', 'metadata_received_alert',
-                       'file_renamed_alert', 'performance_alert', 'torrent_checked_alert', 'torrent_finished_alert',
-                       'save_resume_data_alert', 'save_resume_data_failed_alert')
-
-        if alert_type in alert_types:
-            getattr(self, 'on_' + alert_type)(alert)
+        handler_name = ALERT_HANDLERS.get(alert_type)
+        if handler_name:
+            getattr(self, handler_name)(alert)
 
     def on_save_resume_data_alert(self, alert):
         """
         Callback for the alert that contains the resume data of a specific download.
-        This resume data will be written to a file on disk.
+        This resume data will be written to a file on disk, or to the download state store if it is enabled.
         """
         if self._checkpoint_disabled:
             return
@@ -501,13 +548,19 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         self.pstate_for_restart.set('state', 'engineresumedata', resume_data)
         self._logger.debug("%s get resume data %s", hexlify(resume_data['info-hash']), resume_data)
 
-        # save it to file
-        basename = hexlify(resume_data['info-hash']) + '.state'
-        filename = os.path.join(self.session.get_downloads_pstate_dir(), basename)
+        download_state_store = self.session.lm.download_state_store
+        if download_state_store:
+            # the store writes the state to its database on the next flush
+            self._logger.debug("tlm: network checkpointing: to download state store")
+            download_state_store.put(resume_data['info-hash'], self.pstate_for_restart)
+        else:
+            # save it to file
+            basename = hexlify(resume_data['info-hash']) + '.state'
+            filename = os.path.join(self.session.get_downloads_pstate_dir(), basename)
 
-        self._logger.debug("tlm: network checkpointing: to file %s", filename)
+            self._logger.debug("tlm: network checkpointing: to file %s", filename)
 
-        self.pstate_for_restart.write_file(filename)
+            self.pstate_for_restart.write_file(filename)
 
         # fire callback for all deferreds_resume
         for deferred_r in self.deferreds_resume:
@@ -524,6 +577,29 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         # empties the deferred list
         self.deferreds_resume = []
 
+    def wait_for_piece(self, piece):
+        """
+        Returns a deferred that fires with the index of the given piece as soon as we have the piece.
+        """
+        if self.handle and self.handle.is_valid() and self.handle.have_piece(piece):
+            return succeed(piece)
+
+        def on_cancel(deferred):
+            # Forget about the deferreds of streams that have been closed, so they do not pile up
+            deferreds = self.deferreds_piece.get(piece)
+            if deferreds and deferred in deferreds:
+                deferreds.remove(deferred)
+                if not deferreds:
+                    del self.deferreds_piece[piece]
+
+        deferred = Deferred(canceller=on_cancel)
+        self.deferreds_piece[piece].append(deferred)
+        return deferred
+
+    def on_piece_finished_alert(self, alert):
+        for deferred in self.deferreds_piece.pop(alert.piece_index, []):
+            deferred.callback(alert.piece_index)
+
     def on_tracker_reply_alert(self, alert):
         self.tracker_status[alert.url] = [alert.num_peers, 'Working']
 
@@ -652,6 +728,8 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
     def update_lt_status(self, lt_status):
         """ Update libtorrent stats and check if the download should be stopped."""
         self.lt_status = lt_status
+        self.lt_status_pieces = None
+        self.cached_state = None
         self._stop_if_finished()
 
     def _stop_if_finished(self):
@@ -690,6 +768,9 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
 
     @checkHandleAndSynchronize()
     def set_selected_files(self, selected_files=None):
+        # Changing the file priorities changes the piece priorities
+        self.piece_priorities = None
+
         if not isinstance(self.tdef, TorrentDefNoMetainfo):
 
             if selected_files is None:
@@ -774,13 +855,18 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
             self.handle.force_recheck()
 
     def get_state(self):
-        """ Returns a snapshot of the current state of the download
+        """ Returns a snapshot of the current state of the download. Unless the download is in VOD mode,
+        the same snapshot is returned until the next libtorrent status update or error.
         @return DownloadState
         """
-        vod = {'vod_prebuf_frac': self.calc_prebuf_frac(),
-               'vod_prebuf_frac_consec': self.calc_prebuf_frac(True)} if self.get_mode() == DLMODE_VOD else {}
+        if self.get_mode() == DLMODE_VOD:
+            vod = {'vod_prebuf_frac': self.calc_prebuf_frac(),
+                   'vod_prebuf_frac_consec': self.calc_prebuf_frac(True)}
+            return DownloadState(self, self.lt_status, self.error, vod)
 
-        return DownloadState(self, self.lt_status, self.error, vod)
+        if self.cached_state is None or self.cached_state.error is not self.error:
+            self.cached_state = DownloadState(self, self.lt_status, self.error)
+        return self.cached_state
 
     def _on_resume_err(self, failure):
         failure.trap(CancelledError, SaveResumeDataError)
@@ -820,9 +906,9 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
             return 0.0
 
     def get_peerlist(self):
-        """ Returns a list of dictionaries, one for each connected peer
+        """ Returns a list of DownloadPeer records, one for each connected peer
         containing the statistics for that peer. In particular, the
-        dictionary contains the keys:
+        record contains the keys:
         <pre>
         'id' = PeerID or 'http seed'
         'extended_version' = Peer client version, as received during the extend handshake message
@@ -848,34 +934,8 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         'speed' = The peer's current total download speed (estimated)
         </pre>
         """
-        peers = []
         peer_infos = self.handle.get_peer_info() if self.handle and self.handle.is_valid() else []
-        for peer_info in peer_infos:
-            peer_dict = {'id': hexlify(peer_info.pid.to_bytes()),
-                         'extended_version': peer_info.client,
-                         'ip': peer_info.ip[0],
-                         'port': peer_info.ip[1],
-                         # optimistic_unchoke = 0x800 seems unavailable in python bindings
-                         'optimistic': bool(peer_info.flags & 0x800),
-                         'direction': 'L' if bool(peer_info.flags & peer_info.local_connection) else 'R',
-                         'uprate': peer_info.payload_up_speed,
-                         'uinterested': bool(peer_info.flags & peer_info.remote_interested),
-                         'uchoked': bool(peer_info.flags & peer_info.remote_choked),
-                         'uhasqueries': peer_info.upload_queue_length > 0,
-                         'uflushed': peer_info.used_send_buffer > 0,
-                         'downrate': peer_info.payload_down_speed,
-                         'dinterested': bool(peer_info.flags & peer_info.interesting),
-                         'dchoked': bool(peer_info.flags & peer_info.choked),
-                         'snubbed': bool(peer_info.flags & 0x1000),
-                         'utotal': peer_info.total_upload,
-                         'dtotal': peer_info.total_download,
-                         'completed': peer_info.progress,
-                         'have': peer_info.pieces, 'speed': peer_info.remote_dl_rate,
-                         'connection_type': peer_info.connection_type,
-                         'seed': bool(peer_info.flags & peer_info.seed),
-                         'upload_only': bool(peer_info.flags & peer_info.upload_only)}
-            peers.append(peer_dict)
-        return peers
+        return [DownloadPeer(peer_info) for peer_info in peer_infos]
 
     def get_num_connected_seeds_peers(self):
         """ Returns number of connected seeders and leechers """
@@ -1036,9 +1096,14 @@ class LibtorrentDownloadImpl(DownloadConfigInterface, TaskManager):
         if not self.handle or not self.handle.is_valid():
             # Libtorrent hasn't received or initialized this download yet
             # 1. Check if we have data for this infohash already (don't overwrite it if we do!)
-            basename = hexlify(self.tdef.get_infohash()) + '.state'
-            filename = os.path.join(self.session.get_downloads_pstate_dir(), basename)
-            if not os.path.isfile(filename):
+            download_state_store = self.session.lm.download_state_store
+            if download_state_store:
+                has_checkpoint = download_state_store.has(self.tdef.get_infohash())
+            else:
+                basename = hexlify(self.tdef.get_infohash()) + '.state'
+                has_checkpoint = os.path.isfile(os.path.join(self.session.get_downloads_pstate_dir(), basename))
+
+            if not has_checkpoint:
                 resume_data = self.pstate_for_restart.get('state', 'engineresumedata') \
                     if self.pstate_for_restart else None
 
@@ -8,11 +8,14 @@ from __future__ import absolute_import
 import logging
 import os
 import tempfile
+from copy import deepcopy
 import threading
 import time
 from binascii import hexlify, unhexlify
-from copy import deepcopy
+from collections import deque
 from distutils.version import LooseVersion
+from heapq import heappop, heappush
+from itertools import count
 from shutil import rmtree
 
 import libtorrent as lt
@@ -28,6 +31,7 @@ from twisted.python.failure import Failure
 
 from Tribler.Core.DownloadConfig import DefaultDownloadStartupConfig
 from Tribler.Core.Modules.dht_health_manager import DHTHealthManager
+from Tribler.Core.Modules.metainfo_cache import METAINFO_CACHE_DIRNAME, MetainfoCache
 from Tribler.Core.TorrentDef import TorrentDef, TorrentDefNoMetainfo
 from Tribler.Core.Utilities.torrent_utils import get_info_from_handle
 from Tribler.Core.Utilities.utilities import fix_torrent, has_bep33_support, parse_magnetlink
@@ -38,7 +42,11 @@ from Tribler.Core.version import version_id
 from Tribler.pyipv8.ipv8.taskmanager import TaskManager
 
 LTSTATE_FILENAME = "lt.state"
-METAINFO_CACHE_PERIOD = 5 * 60
+# The maximum number of metainfo lookups that we run at the same time in the metainfo session
+MAX_METAINFO_REQUESTS = 10
+# Metainfo requests of the user go before the requests of background tasks
+METAINFO_PRIORITY_HIGH = 0
+METAINFO_PRIORITY_LOW = 1
 DHT_CHECK_RETRIES = 1
 DEFAULT_DHT_ROUTERS = [
     ("dht.libtorrent.org", 25401),
@@ -50,9 +58,49 @@ DEFAULT_LT_EXTENSIONS = [
     lt.create_ut_pex_plugin,
     lt.create_smart_ban_plugin
 ]
+# Libtorrent 1.2 moved the piece_finished_alert to a separate category, without the alerts for every block
+PIECE_ALERT_CATEGORY = getattr(lt.alert.category_t, 'piece_progress_notification',
+                               lt.alert.category_t.progress_notification)
+# Named profiles of the libtorrent settings for the disk cache, the disk threads, the send buffers and the number of
+# connections. The cache size is in blocks of 16 KiB, where -1 lets libtorrent pick a size based on the memory.
+SETTINGS_PROFILES = {
+    'desktop': {
+        'cache_size': -1,
+        'aio_threads': 4,
+        'send_buffer_low_watermark': 10 * 1024,
+        'send_buffer_watermark': 500 * 1024,
+        'send_buffer_watermark_factor': 50,
+        'max_queued_disk_bytes': 1024 * 1024,
+        'connections_limit': 200
+    },
+    'seedbox': {
+        'cache_size': 32768,
+        'aio_threads': 8,
+        'send_buffer_low_watermark': 1024 * 1024,
+        'send_buffer_watermark': 3 * 1024 * 1024,
+        'send_buffer_watermark_factor': 150,
+        'max_queued_disk_bytes': 7 * 1024 * 1024,
+        'connections_limit': 8000
+    },
+    'low_memory': {
+        'cache_size': 64,
+        'aio_threads': 1,
+        'send_buffer_low_watermark': 8 * 1024,
+        'send_buffer_watermark': 64 * 1024,
+        'send_buffer_watermark_factor': 10,
+        'max_queued_disk_bytes': 256 * 1024,
+        'connections_limit': 50
+    }
+}
+# The interval (in seconds) at which we record the session statistics, and the number of records we keep per session
+SESSION_STATS_INTERVAL = 5
+SESSION_STATS_HISTORY_SIZE = 120
+# The prefixes of the disk, cache and network counters that we record
+SESSION_STATS_PREFIXES = ('disk.', 'net.')
 
 
 class LibtorrentMgr(TaskManager):
+    METAINFO_QUEUE_TIMEOUT = 60  # Seconds that a metainfo request may wait in the queue, before it times out
 
     def __init__(self, tribler_session):
         super(LibtorrentMgr, self).__init__()
@@ -60,7 +108,8 @@ class LibtorrentMgr(TaskManager):
 
         self.tribler_session = tribler_session
         self.ltsessions = {}
-        self.ltsession_metainfo = None  # We have a dedicated libtorrent session for metainfo/DHT health lookups
+        # The libtorrent session for metainfo/DHT health lookups, either dedicated or shared with the downloads
+        self.ltsession_metainfo = None
         self.dht_health_manager = None
 
         self.notifier = tribler_session.notifier
@@ -74,19 +123,40 @@ class LibtorrentMgr(TaskManager):
 
         self.metadata_tmpdir = None
         self.metainfo_requests = {}
+        self.metainfo_queue = []  # Heap of (priority, sequence number, infohash) of the requests that wait to start
+        self.metainfo_sequence = count()
+        self.num_active_metainfo_requests = 0
         self.metainfo_lock = threading.RLock()
-        self.metainfo_cache = {}
+        self.metainfo_cache = MetainfoCache(os.path.join(tribler_session.config.get_state_dir(),
+                                                         METAINFO_CACHE_DIRNAME))
 
         self.process_alerts_lc = self.register_task("process_alerts", LoopingCall(self._task_process_alerts))
         self.check_reachability_lc = self.register_task("check_reachability", LoopingCall(self._check_reachability))
         self.request_torrent_updates_lc = self.register_task("request_torrent_updates",
                                                              LoopingCall(self._request_torrent_updates))
+        self.post_session_stats_lc = self.register_task("post_session_stats", LoopingCall(self.post_session_stats))
 
         self.default_alert_mask = lt.alert.category_t.error_notification | lt.alert.category_t.status_notification | \
                                   lt.alert.category_t.storage_notification | lt.alert.category_t.performance_warning | \
                                   lt.alert.category_t.tracker_notification | lt.alert.category_t.debug_notification
         self.alert_callback = None
-        self.session_stats_callback = None
+        self.session_stats_deferreds = {}  # Map from hop count to the deferreds waiting for the next session stats
+        self.session_stats_history = {}  # Map from hop count to a deque of (timestamp, counters)
+
+        # Alerts for finished pieces are only enabled while we are streaming, since there are a lot of them
+        self.piece_alerts_enabled = False
+
+        # Map from the type name of the libtorrent alerts we handle to their handler
+        self.alert_handlers = {
+            'state_update_alert': self.on_state_update_alert,
+            'add_torrent_alert': self.on_add_torrent_alert,
+            'torrent_removed_alert': self.on_torrent_removed_alert,
+            'peer_disconnected_alert': self.on_peer_disconnected_alert,
+            'session_stats_alert': self.on_session_stats_alert
+        }
+
+        # Whether we already scheduled the processing of alerts that libtorrent notified us about
+        self.alerts_notified = False
 
         # Status of libtorrent session to indicate if it can safely close and no pending writes to disk exists.
         self.lt_session_shutdown_ready = {}
@@ -94,23 +164,26 @@ class LibtorrentMgr(TaskManager):
     def initialize(self):
         # start upnp
         self.get_session().start_upnp()
-        self.ltsession_metainfo = self.create_session(hops=0, store_listen_port=False)
+        if self.tribler_session.config.get_libtorrent_shared_metainfo_session_enabled():
+            # Do the lookups in the session of the downloads without hops, so we do not need the memory, threads and
+            # DHT traffic of another session
+            self.ltsession_metainfo = self.get_session()
+        else:
+            self.ltsession_metainfo = self.create_session(hops=0, store_listen_port=False)
+        self.ltsession_metainfo.set_alert_mask(self.get_alert_mask(metainfo=True))
 
         if has_bep33_support():
-            # Also listen to DHT log notifications - we need the dht_pkt_alert and extract the BEP33 bloom filters
-            self.ltsession_metainfo.set_alert_mask(self.default_alert_mask | lt.alert.category_t.dht_log_notification)
             self.dht_health_manager = DHTHealthManager(self.ltsession_metainfo)
 
         # make temporary directory for metadata collecting through DHT
         self.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
 
-        # register tasks
-        self.process_alerts_lc.start(1, now=False)
+        # register tasks. If libtorrent notifies us about new alerts, we do not have to poll for them.
+        if not self.supports_alert_notify():
+            self.process_alerts_lc.start(1, now=False)
         self.check_reachability_lc.start(5, now=True)
         self.request_torrent_updates_lc.start(1, now=False)
-
-        self.register_task(u'task_cleanup_metacache',
-                           LoopingCall(self._task_cleanup_metainfo_cache)).start(60, now=True)
+        self.post_session_stats_lc.start(SESSION_STATS_INTERVAL, now=False)
 
     def shutdown(self, timeout=30):
         self.tribler_session.notify_shutdown_state("Shutting down Libtorrent Manager...")
@@ -195,8 +268,12 @@ class LibtorrentMgr(TaskManager):
             if LooseVersion(self.get_libtorrent_version()) >= LooseVersion("1.1.0"):
                 settings["listen_interfaces"] = "0.0.0.0:%d" % self.tribler_session.config.get_anon_listen_port()
 
+        settings.update(SETTINGS_PROFILES[self.tribler_session.config.get_libtorrent_settings_profile()])
+
         self.set_session_settings(ltsession, settings)
-        ltsession.set_alert_mask(self.default_alert_mask)
+        ltsession.set_alert_mask(self.get_alert_mask())
+        if self.supports_alert_notify():
+            ltsession.set_alert_notify(self._on_alert_notify)
 
         # Load proxy settings
         if hops == 0:
@@ -245,6 +322,21 @@ class LibtorrentMgr(TaskManager):
 
         return ltsession
 
+    def get_alert_mask(self, metainfo=False):
+        alert_mask = self.default_alert_mask | (PIECE_ALERT_CATEGORY if self.piece_alerts_enabled else 0)
+        if metainfo and has_bep33_support():
+            # Also listen to DHT log notifications - we need the dht_pkt_alert and extract the BEP33 bloom filters
+            alert_mask |= lt.alert.category_t.dht_log_notification
+        return alert_mask
+
+    def set_piece_alerts_enabled(self, enabled):
+        """
+        Enable or disable the piece_finished_alert for the downloads in all sessions.
+        """
+        self.piece_alerts_enabled = enabled
+        for ltsession in self.ltsessions.values():
+            ltsession.set_alert_mask(self.get_alert_mask(metainfo=ltsession is self.ltsession_metainfo))
+
     def get_session(self, hops=0):
         if hops not in self.ltsessions:
             self.ltsessions[hops] = self.create_session(hops)
@@ -313,7 +405,6 @@ class LibtorrentMgr(TaskManager):
         return 0 if libtorrent_rate == -1 else (-1 if libtorrent_rate == 1 else libtorrent_rate / 1024)
 
     def add_torrent(self, torrentdl, atp):
-        # If we are collecting the torrent for this infohash, abort this first.
         with self.metainfo_lock:
             ltsession = self.get_session(atp.pop('hops', 0))
 
@@ -324,6 +415,12 @@ class LibtorrentMgr(TaskManager):
             else:
                 raise ValueError('No ti or url key in add_torrent_params')
 
+            # If we are collecting the torrent for this infohash in the same session, abort this first.
+            request_dict = self.metainfo_requests.get(infohash)
+            if request_dict and ltsession is self.ltsession_metainfo:
+                handle = request_dict['handle']
+                self.got_metainfo(infohash, timeout=not (handle and handle.is_valid() and handle.has_metadata()))
+
             # Check if we added this torrent before
             known = {str(h.info_hash()): h for h in ltsession.get_torrents()}
             existing_handle = known.get(infohash)
@@ -377,17 +474,7 @@ class LibtorrentMgr(TaskManager):
             self._logger.warning("port mapping method not exposed in libtorrent")
 
     def process_alert(self, alert, hops=0):
-        alert_type = str(type(alert)).split("'")[1].split(".")[-1]
-
-        # Periodically, libtorrent will send us a state_update_alert, which contains the torrent status of
-        # all torrents changed since the last time we received this alert.
-        if alert_type == 'state_update_alert':
-            for status in alert.status:
-                infohash = str(status.info_hash)
-                if infohash not in self.torrents:
-                    self._logger.debug("Got state_update %s for unknown torrent %s", alert_type, infohash)
-                    continue
-                self.torrents[infohash][0].update_lt_status(status)
+        alert_type = alert.__class__.__name__
 
         handle = getattr(alert, 'handle', None)
         if handle and isinstance(handle, torrent_handle) and handle.is_valid():
@@ -397,47 +484,74 @@ class LibtorrentMgr(TaskManager):
             else:
                 self._logger.debug("Got %s for unknown torrent %s", alert_type, infohash)
 
-        if alert_type == 'add_torrent_alert':
-            infohash = str(handle.info_hash())
-            if infohash in self.torrents and not self.torrents[infohash][0].deferred_added.called:
-                if alert.error.value():
-                    self.torrents[infohash][0].deferred_added.errback(alert.error.message())
-                    self._logger.debug("Failed to add torrent (%s)", alert.error.message())
-                else:
-                    self.torrents[infohash][0].deferred_added.callback(handle)
-                    self._logger.debug("Added torrent %s", str(handle.info_hash()))
-            else:
-                self._logger.debug("Added alert for unknown torrent or Deferred already called")
+        handler = self.alert_handlers.get(alert_type)
+        if handler:
+            handler(alert, hops)
 
-        elif alert_type == 'torrent_removed_alert':
-            infohash = str(alert.info_hash)
-            if infohash in self.torrents:
-                deferred = self.torrents[infohash][0].deferred_removed
-                del self.torrents[infohash]
-                deferred.callback(None)
-                self._logger.debug("Removed torrent %s", infohash)
+        if self.alert_callback:
+            self.alert_callback(alert)
+
+    def on_state_update_alert(self, alert, _):
+        # Periodically, libtorrent will send us a state_update_alert, which contains the torrent status of
+        # all torrents changed since the last time we received this alert.
+        for status in alert.status:
+            infohash = str(status.info_hash)
+            if infohash not in self.torrents:
+                self._logger.debug("Got state_update_alert for unknown torrent %s", infohash)
+                continue
+            self.torrents[infohash][0].update_lt_status(status)
+
+    def on_add_torrent_alert(self, alert, _):
+        handle = alert.handle
+        infohash = str(handle.info_hash())
+        if infohash in self.torrents and not self.torrents[infohash][0].deferred_added.called:
+            if alert.error.value():
+                self.torrents[infohash][0].deferred_added.errback(alert.error.message())
+                self._logger.debug("Failed to add torrent (%s)", alert.error.message())
             else:
-                self._logger.debug("Removed alert for unknown torrent")
+                self.torrents[infohash][0].deferred_added.callback(handle)
+                self._logger.debug("Added torrent %s", str(handle.info_hash()))
+        else:
+            self._logger.debug("Added alert for unknown torrent or Deferred already called")
+
+    def on_torrent_removed_alert(self, alert, _):
+        infohash = str(alert.info_hash)
+        # If the torrent has not been added yet, this alert is about an aborted metainfo lookup in the same session
+        if infohash in self.torrents and self.torrents[infohash][0].deferred_added.called:
+            deferred = self.torrents[infohash][0].deferred_removed
+            del self.torrents[infohash]
+            deferred.callback(None)
+            self._logger.debug("Removed torrent %s", infohash)
+        else:
+            self._logger.debug("Removed alert for unknown torrent")
 
-        elif alert_type == 'peer_disconnected_alert' and \
-                self.tribler_session and self.tribler_session.lm.payout_manager:
+    def on_peer_disconnected_alert(self, alert, _):
+        if self.tribler_session and self.tribler_session.lm.payout_manager:
             self.tribler_session.lm.payout_manager.do_payout(alert.pid.to_string())
 
-        elif alert_type == 'session_stats_alert':
-            queued_disk_jobs = alert.values['disk.queued_disk_jobs']
-            queued_write_bytes = alert.values['disk.queued_write_bytes']
-            num_write_jobs = alert.values['disk.num_write_jobs']
+    def on_session_stats_alert(self, alert, hops):
+        queued_disk_jobs = alert.values['disk.queued_disk_jobs']
+        queued_write_bytes = alert.values['disk.queued_write_bytes']
+        num_write_jobs = alert.values['disk.num_write_jobs']
 
-            if queued_disk_jobs == queued_write_bytes == num_write_jobs == 0:
-                self.lt_session_shutdown_ready[hops] = True
+        if queued_disk_jobs == queued_write_bytes == num_write_jobs == 0:
+            self.lt_session_shutdown_ready[hops] = True
 
-            if self.session_stats_callback:
-                self.session_stats_callback(alert)
+        counters = {name: value for name, value in alert.values.items() if name.startswith(SESSION_STATS_PREFIXES)}
+        if hops not in self.session_stats_history:
+            self.session_stats_history[hops] = deque(maxlen=SESSION_STATS_HISTORY_SIZE)
+        self.session_stats_history[hops].append((time.time(), counters))
 
-        if self.alert_callback:
-            self.alert_callback(alert)
+        for deferred in self.session_stats_deferreds.pop(hops, []):
+            deferred.callback(alert.values)
 
-    def get_metainfo(self, infohash_or_magnet, callback, timeout=30, timeout_callback=None, notify=True):
+    def get_metainfo(self, infohash_or_magnet, callback, timeout=30, timeout_callback=None, notify=True,
+                     priority=METAINFO_PRIORITY_LOW):
+        """
+        Look up the metainfo of a torrent. Requests are queued by priority, and only a limited number of lookups run
+        at the same time. Every callback is called with its own copy of the metainfo. A request times out if its lookup
+        takes longer than the timeout, or if it waits in the queue for longer than METAINFO_QUEUE_TIMEOUT.
+        """
         magnet = infohash_or_magnet if infohash_or_magnet.startswith('magnet') else None
         infohash_bin = infohash_or_magnet if not magnet else parse_magnetlink(magnet)[1]
         infohash = hexlify(infohash_bin)
@@ -448,54 +562,97 @@ class LibtorrentMgr(TaskManager):
         with self.metainfo_lock:
             self._logger.debug('get_metainfo %s %s %s', infohash_or_magnet, callback, timeout)
 
-            cache_result = self._get_cached_metainfo(infohash)
+            cache_result = self.metainfo_cache.get(infohash)
             if cache_result:
                 callback(deepcopy(cache_result))
 
             elif infohash not in self.metainfo_requests:
-                # Flags = 4 (upload mode), should prevent libtorrent from creating files
-                atp = {'save_path': self.metadata_tmpdir,
-                       'flags': (lt.add_torrent_params_flags_t.flag_upload_mode)}
-                if magnet:
-                    atp['url'] = magnet
-                else:
-                    atp['info_hash'] = lt.sha1_hash(infohash_bin)
-                try:
-                    handle = self.ltsession_metainfo.add_torrent(encode_atp(atp))
-                except TypeError as e:
-                    self._logger.warning("Failed to add torrent with infohash %s, "
-                                         "attempting to use it as it is and hoping for the best",
-                                         hexlify(infohash_bin))
-                    self._logger.warning("Error was: %s", e)
-                    atp['info_hash'] = infohash_bin
-                    handle = self.ltsession_metainfo.add_torrent(encode_atp(atp))
-
                 if notify:
                     self.notifier.notify(NTFY_TORRENTS, NTFY_MAGNET_STARTED, infohash_bin)
 
-                self.metainfo_requests[infohash] = {'handle': handle,
+                self.metainfo_requests[infohash] = {'handle': None,
+                                                    'magnet': magnet,
+                                                    'priority': priority,
+                                                    'timeout': timeout,
                                                     'callbacks': [callback],
                                                     'timeout_callbacks': [timeout_callback] if timeout_callback else [],
                                                     'notify': notify}
+                heappush(self.metainfo_queue, (priority, next(self.metainfo_sequence), infohash))
+                self.start_metainfo_requests()
+                # Requests that keep being overtaken by requests with a higher priority should not wait forever
+                request_dict = self.metainfo_requests.get(infohash)
+                if request_dict and not request_dict['handle']:
+                    reactor.callFromThread(self.schedule_metainfo_timeout, infohash, None, self.METAINFO_QUEUE_TIMEOUT)
+            else:
+                request_dict = self.metainfo_requests[infohash]
+                request_dict['notify'] = request_dict['notify'] and notify
+                if priority < request_dict['priority'] and not request_dict['handle']:
+                    # The request moves up in the queue, the old queue entry is skipped
+                    request_dict['priority'] = priority
+                    heappush(self.metainfo_queue, (priority, next(self.metainfo_sequence), infohash))
+                    self.start_metainfo_requests()
+
+                callbacks = request_dict['callbacks']
+                if callback not in callbacks:
+                    callbacks.append(callback)
+                else:
+                    self._logger.debug('get_metainfo duplicate detected, ignoring')
+
+    def start_metainfo_requests(self):
+        """
+        Start the queued metainfo requests with the highest priority, until we run the maximum number of lookups.
+        """
+        with self.metainfo_lock:
+            while self.metainfo_queue and self.num_active_metainfo_requests < MAX_METAINFO_REQUESTS:
+                priority, _, infohash = heappop(self.metainfo_queue)
+                request_dict = self.metainfo_requests.get(infohash)
+                # Skip the requests that have timed out, and the entries of requests that moved up in the queue
+                if not request_dict or request_dict['handle'] or request_dict['priority'] != priority:
+                    continue
+
+                infohash_bin = unhexlify(infohash)
+                # Flags = 4 (upload mode), should prevent libtorrent from creating files. If the torrent is already in
+                # the session (e.g. as a download in a shared session), adding it fails instead of returning its handle.
+                atp = {'save_path': self.metadata_tmpdir,
+                       'flags': (lt.add_torrent_params_flags_t.flag_upload_mode |
+                                 lt.add_torrent_params_flags_t.flag_duplicate_is_error)}
+                if request_dict['magnet']:
+                    atp['url'] = request_dict['magnet']
+                else:
+                    atp['info_hash'] = lt.sha1_hash(infohash_bin)
+                try:
+                    try:
+                        handle = self.ltsession_metainfo.add_torrent(encode_atp(atp))
+                    except TypeError as e:
+                        self._logger.warning("Failed to add torrent with infohash %s, "
+                                             "attempting to use it as it is and hoping for the best", infohash)
+                        self._logger.warning("Error was: %s", e)
+                        atp['info_hash'] = infohash_bin
+                        handle = self.ltsession_metainfo.add_torrent(encode_atp(atp))
+                    request_dict['owned'] = True
+                except RuntimeError:
+                    # We use the handle of the torrent that is already present, but it is not ours to remove
+                    self._logger.debug("Torrent %s is already in the metainfo session", infohash)
+                    handle = self.ltsession_metainfo.find_torrent(lt.sha1_hash(infohash_bin))
+                    request_dict['owned'] = False
+
+                request_dict['handle'] = handle
+                self.num_active_metainfo_requests += 1
+                # The timeout of a lookup starts when the lookup starts, not while it is waiting in the queue
+                reactor.callFromThread(self.schedule_metainfo_timeout, infohash, handle, request_dict['timeout'])
 
                 # if the handle is valid and already has metadata which is the case when torrent already exists in
                 # session then metadata_received_alert is not fired so we call self.got_metainfo() directly here
                 if handle.is_valid() and handle.has_metadata():
                     self.got_metainfo(infohash, timeout=False)
-                    return
 
-                def schedule_call():
-                    self.register_anonymous_task("schedule_got_metainfo_lookup",
-                                       reactor.callLater(timeout, lambda: self.got_metainfo(infohash, timeout=True)))
-
-                reactor.callFromThread(schedule_call)
-            else:
-                self.metainfo_requests[infohash]['notify'] = self.metainfo_requests[infohash]['notify'] and notify
-                callbacks = self.metainfo_requests[infohash]['callbacks']
-                if callback not in callbacks:
-                    callbacks.append(callback)
-                else:
-                    self._logger.debug('get_metainfo duplicate detected, ignoring')
+    def schedule_metainfo_timeout(self, infohash, handle, timeout):
+        with self.metainfo_lock:
+            # The lookup may have started or finished before we got here
+            request_dict = self.metainfo_requests.get(infohash)
+            if request_dict and request_dict['handle'] is handle:
+                self.replace_task("metainfo_timeout_%s" % infohash,
+                                  reactor.callLater(timeout, self.got_metainfo, infohash, timeout=True))
 
     def got_metainfo(self, infohash, timeout=False):
         with self.metainfo_lock:
@@ -510,67 +667,55 @@ class LibtorrentMgr(TaskManager):
 
                 self._logger.debug('got_metainfo %s %s %s', infohash, handle, timeout)
 
-                assert handle
-                if handle:
-                    if callbacks and not timeout:
-                        metainfo = {"info": lt.bdecode(get_info_from_handle(handle).metadata())}
-                        trackers = [tracker.url for tracker in get_info_from_handle(handle).trackers()]
-                        peers = []
-                        leechers = 0
-                        seeders = 0
-                        for peer in handle.get_peer_info():
-                            peers.append(peer.ip)
-                            if peer.progress == 1:
-                                seeders += 1
-                            else:
-                                leechers += 1
-
-                        if trackers:
-                            if len(trackers) > 1:
-                                metainfo["announce-list"] = [trackers]
-                            metainfo["announce"] = trackers[0]
+                if handle and callbacks and not timeout:
+                    metainfo = {"info": lt.bdecode(get_info_from_handle(handle).metadata())}
+                    trackers = [tracker.url for tracker in get_info_from_handle(handle).trackers()]
+                    peers = []
+                    leechers = 0
+                    seeders = 0
+                    for peer in handle.get_peer_info():
+                        peers.append(peer.ip)
+                        if peer.progress == 1:
+                            seeders += 1
                         else:
-                            metainfo["nodes"] = []
-                        if peers and notify:
-                            self.notifier.notify(NTFY_TORRENTS, NTFY_MAGNET_GOT_PEERS, infohash_bin, len(peers))
-                        metainfo["initial peers"] = peers
-                        metainfo["leechers"] = leechers
-                        metainfo["seeders"] = seeders
-
-                        self._add_cached_metainfo(infohash, metainfo)
-
-                        for callback in callbacks:
-                            callback(deepcopy(metainfo))
-
-                        # let's not print the hashes of the pieces
-                        debuginfo = deepcopy(metainfo)
-                        del debuginfo['info']['pieces']
-                        self._logger.debug('got_metainfo result %s', debuginfo)
-
-                    elif timeout_callbacks and timeout:
-                        for callback in timeout_callbacks:
-                            callback(infohash_bin)
+                            leechers += 1
+
+                    if trackers:
+                        if len(trackers) > 1:
+                            metainfo["announce-list"] = [trackers]
+                        metainfo["announce"] = trackers[0]
+                    else:
+                        metainfo["nodes"] = []
+                    if peers and notify:
+                        self.notifier.notify(NTFY_TORRENTS, NTFY_MAGNET_GOT_PEERS, infohash_bin, len(peers))
+                    metainfo["initial peers"] = peers
+                    metainfo["leechers"] = leechers
+                    metainfo["seeders"] = seeders
+
+                    self.metainfo_cache.put(infohash, metainfo)
+
+                    # The metainfo ends up in the torrent definitions of the callers, so they should not share it
+                    for callback in callbacks:
+                        callback(deepcopy(metainfo))
+
+                    # let's not print the hashes of the pieces
+                    self._logger.debug('got_metainfo result %s',
+                                       {key: value for key, value in metainfo.items() if key != 'info'})
+
+                elif timeout_callbacks and timeout:
+                    for callback in timeout_callbacks:
+                        callback(infohash_bin)
 
                 if handle:
-                    self.ltsession_metainfo.remove_torrent(handle, 1)
-                    if notify:
-                        self.notifier.notify(NTFY_TORRENTS, NTFY_MAGNET_CLOSE, infohash_bin)
-
-    def _get_cached_metainfo(self, infohash):
-        if infohash in self.metainfo_cache:
-            return self.metainfo_cache[infohash]['meta_info']
-
-    def _add_cached_metainfo(self, infohash, metainfo):
-        self.metainfo_cache[infohash] = {'time': time.time(),
-                                         'meta_info': metainfo}
-
-    def _task_cleanup_metainfo_cache(self):
-        oldest_time = time.time() - METAINFO_CACHE_PERIOD
+                    # Only remove the torrents that this lookup added, not the downloads it borrowed the handle from
+                    if request_dict.get('owned', True):
+                        self.ltsession_metainfo.remove_torrent(handle, 1)
+                    self.num_active_metainfo_requests -= 1
+                reactor.callFromThread(self.cancel_pending_task, "metainfo_timeout_%s" % infohash)
+                if notify:
+                    self.notifier.notify(NTFY_TORRENTS, NTFY_MAGNET_CLOSE, infohash_bin)
 
-        for info_hash, values in self.metainfo_cache.items():
-            last_time, _ = values
-            if last_time < oldest_time:
-                del self.metainfo_cache[info_hash]
+                self.start_metainfo_requests()
 
     def _request_torrent_updates(self):
         for ltsession in self.ltsessions.values():
@@ -581,26 +726,77 @@ class LibtorrentMgr(TaskManager):
                 else:
                     ltsession.post_torrent_updates()
 
+    def supports_alert_notify(self):
+        """
+        Return whether libtorrent can notify us when new alerts are posted, so we do not have to poll for them.
+        """
+        return hasattr(lt.session, 'set_alert_notify')
+
+    def _on_alert_notify(self):
+        """
+        Called by libtorrent from one of its own threads when alerts are posted to an empty alert queue.
+        We cannot call into libtorrent here, so we schedule the processing of the alerts on the reactor thread.
+        """
+        if not self.alerts_notified:
+            self.alerts_notified = True
+            reactor.callFromThread(self._task_process_alerts)
+
     def _task_process_alerts(self):
+        self.alerts_notified = False
+        if self.ltsessions is None:
+            return
+
+        # The alerts are popped in batches, so a failure to process one alert should not throw away the others
         for hops, ltsession in self.ltsessions.items():
             if ltsession:
                 for alert in ltsession.pop_alerts():
-                    self.process_alert(alert, hops=hops)
-
-        # We have a separate session for metainfo requests.
-        # For this session we are only interested in the metadata_received_alert.
-        if self.ltsession_metainfo:
+                    try:
+                        self.process_alert(alert, hops=hops)
+                        if ltsession is self.ltsession_metainfo:
+                            self.process_metainfo_alert(alert)
+                    except Exception as e:
+                        self._logger.exception("Failed to process %s: %s", alert.__class__.__name__, e)
+
+        # Unless the metainfo requests share the session of the downloads, we have a separate session for them.
+        if self.ltsession_metainfo and self.ltsession_metainfo not in self.ltsessions.values():
             for alert in self.ltsession_metainfo.pop_alerts():
-                if isinstance(alert, lt.metadata_received_alert):
-                    self.got_metainfo(str(alert.handle.info_hash()))
-                elif alert.__class__.__name__ == "dht_pkt_alert":
-                    # We received a raw DHT message - decode it and check whether it is a BEP33 message.
-                    decoded = bdecode(alert.pkt_buf)
-                    if 'r' in decoded:
-                        if 'BFsd' in decoded['r'] and 'BFpe' in decoded['r']:
-                            self.dht_health_manager.received_bloomfilters(decoded['r']['id'],
-                                                                          bytearray(decoded['r']['BFsd']),
-                                                                          bytearray(decoded['r']['BFpe']))
+                try:
+                    self.process_metainfo_alert(alert)
+                except Exception as e:
+                    self._logger.exception("Failed to process %s: %s", alert.__class__.__name__, e)
+
+    def process_metainfo_alert(self, alert):
+        """
+        Process an alert of the metainfo session. We are only interested in the metadata_received_alert of our
+        lookups, and in the DHT packets for the health checks.
+        """
+        alert_type = alert.__class__.__name__
+        if alert_type == "metadata_received_alert":
+            infohash = str(alert.handle.info_hash())
+            # Downloads in a shared session also receive their metadata
+            if infohash in self.metainfo_requests:
+                self.got_metainfo(infohash)
+        elif alert_type == "dht_pkt_alert":
+            # We received a raw DHT message - decode it and check whether it is a BEP33 message.
+            # The bindings only expose the packet itself, the message of the alert starts with <== for incoming packets
+            self._process_dht_packet(bdecode(alert.pkt_buf), str(alert).startswith('<=='))
+
+    def _process_dht_packet(self, decoded, incoming):
+        """
+        Process a raw DHT packet. Outgoing BEP33 scrape queries are registered by transaction ID, so the bloom filters
+        in the incoming responses can be attributed to the right health lookup.
+        """
+        if not isinstance(decoded, dict):
+            return
+
+        if not incoming:
+            if decoded.get('y') == 'q' and decoded.get('q') == 'get_peers' and decoded.get('a', {}).get('scrape') == 1:
+                self.dht_health_manager.register_query(decoded.get('t'), decoded['a'].get('info_hash'))
+        elif 'r' in decoded:
+            if 'BFsd' in decoded['r'] and 'BFpe' in decoded['r']:
+                self.dht_health_manager.received_bloomfilters(decoded.get('t'),
+                                                              bytearray(decoded['r']['BFsd']),
+                                                              bytearray(decoded['r']['BFpe']))
 
     def _check_reachability(self):
         if self.get_session() and self.get_session().status().has_incoming_connections:
@@ -732,6 +928,16 @@ class LibtorrentMgr(TaskManager):
             ltsession_settings['upload_rate_limit'] = self.tribler_session.config.get_libtorrent_max_upload_rate()
             self.set_session_settings(lt_session, ltsession_settings)
 
+    def get_session_stats(self, hops=0):
+        """
+        Get the current counters of the libtorrent session for the given hop count.
+        :return: a deferred that fires with a dictionary of the counters.
+        """
+        deferred = Deferred()
+        self.session_stats_deferreds.setdefault(hops, []).append(deferred)
+        self.post_session_stats(hops)
+        return deferred
+
     def post_session_stats(self, hops=None):
         if hops is None:
             for lt_session in self.ltsessions.values():
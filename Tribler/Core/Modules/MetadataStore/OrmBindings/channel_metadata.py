@@ -5,8 +5,10 @@ import random
 import sys
 from binascii import hexlify
 from datetime import datetime
+from functools import wraps
+from threading import RLock
 
-from libtorrent import add_files, bencode, create_torrent, file_storage, set_piece_hashes, torrent_info
+from libtorrent import bencode, create_torrent, file_storage, torrent_info
 
 import lz4.frame
 
@@ -18,6 +20,7 @@ from Tribler.Core.Modules.MetadataStore.OrmBindings.channel_node import COMMITTE
     TODELETE, UPDATED
 from Tribler.Core.Modules.MetadataStore.serialization import CHANNEL_TORRENT, ChannelMetadataPayload
 from Tribler.Core.TorrentDef import TorrentDef
+from Tribler.Core.Utilities.torrent_utils import get_reusable_piece_hashes, set_piece_hashes
 from Tribler.Core.Utilities.tracker_utils import get_uniformed_tracker_url
 from Tribler.Core.exceptions import DuplicateChannelIdError, DuplicateTorrentFileError
 from Tribler.pyipv8.ipv8.database import database_blob
@@ -35,12 +38,21 @@ def chunks(l, n):
 
 
 def create_torrent_from_dir(directory, torrent_filename):
+    """
+    Create a torrent of the files in the directory and write it to torrent_filename. If torrent_filename contains an
+    earlier version of the torrent, we reuse the hashes of the pieces that only contain files of that version.
+    """
     fs = file_storage()
-    add_files(fs, directory)
-    t = create_torrent(fs)
-    # t = create_torrent(fs, flags=17) # piece alignment
+    # The blobs are named after their timestamp, so by adding the files in the order of their names, a new version of
+    # the channel torrent starts with the files of the previous version.
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            fs.add_file(os.path.join(os.path.basename(directory), filename), os.path.getsize(path))
+    # Do not let libtorrent reorder the files
+    t = create_torrent(fs, flags=0)
     t.set_priv(False)
-    set_piece_hashes(t, os.path.dirname(directory))
+    set_piece_hashes(t, os.path.dirname(directory), get_reusable_piece_hashes(torrent_filename, t))
     torrent = t.generate()
     with open(torrent_filename, 'wb') as f:
         f.write(bencode(torrent))
@@ -85,6 +97,17 @@ def entries_to_chunk(metadata_list, chunk_size, start_index=0):
     return chunk, last_entry_index + 1
 
 
+def commit_locked(func):
+    """
+    Run a method of a channel while holding the commit lock, so only one thread changes the channel torrent at a time.
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._commit_lock:
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
 def define_binding(db):
     class ChannelMetadata(db.TorrentMetadata):
         _discriminator_ = CHANNEL_TORRENT
@@ -102,6 +125,8 @@ def define_binding(db):
         _channels_dir = None
         _category_filter = None
         _CHUNK_SIZE_LIMIT = 1 * 1024 * 1024  # We use 1MB chunks as a workaround for Python's lack of string pointers
+        # Channels are committed on the reactor thread as well as in the thread pool, this lock serializes the commits
+        _commit_lock = RLock()
 
         @db_session
         def update_metadata(self, update_dict=None):
@@ -148,6 +173,7 @@ def define_binding(db):
             my_channel.sign()
             return my_channel
 
+        @commit_locked
         def consolidate_channel_torrent(self):
             """
             Delete the channel dir contents and create it anew.
@@ -174,6 +200,7 @@ def define_binding(db):
 
             self.commit_channel_torrent(new_start_timestamp=start_timestamp)
 
+        @commit_locked
         def update_channel_torrent(self, metadata_list):
             """
             Channel torrents are append-only to support seeding the old versions
@@ -206,6 +233,7 @@ def define_binding(db):
             return {"infohash": infohash, "num_entries": self.contents_len,
                     "timestamp": new_timestamp, "torrent_date": torrent_date}, torrent
 
+        @commit_locked
         def commit_channel_torrent(self, new_start_timestamp=None):
             """
             Collect new/uncommitted and marked for deletion metadata entries, commit them to a channel torrent and
@@ -1,16 +1,18 @@
 from __future__ import absolute_import, division
 
 import math
-from binascii import hexlify
+from binascii import hexlify, unhexlify
 
 import libtorrent as lt
 
 from twisted.internet import reactor
 from twisted.internet.defer import Deferred
 
-from Tribler.pyipv8.ipv8.dht.routing import distance, id_to_binary_string
 from Tribler.pyipv8.ipv8.taskmanager import TaskManager
 
+# Translation table that maps every byte value to the number of bits set in it
+POPCOUNT_TABLE = bytes(bytearray(bin(byte).count('1') for byte in range(256)))
+
 
 class DHTHealthManager(TaskManager):
     """
@@ -26,6 +28,8 @@ class DHTHealthManager(TaskManager):
         self.lookup_deferreds = {}  # Map from binary infohash to deferred
         self.bf_seeders = {}        # Map from infohash to (final) seeders bloomfilter
         self.bf_peers = {}          # Map from infohash to (final) peers bloomfilter
+        self.outstanding_queries = {}  # Map from DHT transaction ID to the infohash of the get_peers query
+        self.lookup_transactions = {}  # Map from infohash to the DHT transaction IDs of its get_peers queries
         self.lt_session = lt_session
 
     def get_health(self, infohash, timeout=15):
@@ -42,6 +46,7 @@ class DHTHealthManager(TaskManager):
         self.lookup_deferreds[infohash] = lookup_deferred
         self.bf_seeders[infohash] = bytearray(256)
         self.bf_peers[infohash] = bytearray(256)
+        self.lookup_transactions[infohash] = set()
 
         # Perform a get_peers request. This should result in get_peers responses with the BEP33 bloom filters.
         self.lt_session.dht_get_peers(lt.sha1_hash(infohash))
@@ -61,6 +66,9 @@ class DHTHealthManager(TaskManager):
         # Determine the seeders/peers
         bf_seeders = self.bf_seeders.pop(infohash)
         bf_peers = self.bf_peers.pop(infohash)
+        for transaction_id in self.lookup_transactions.pop(infohash, ()):
+            self.outstanding_queries.pop(transaction_id, None)
+
         seeders = DHTHealthManager.get_size_from_bloomfilter(bf_seeders)
         peers = DHTHealthManager.get_size_from_bloomfilter(bf_peers)
         self.lookup_deferreds[infohash].callback({
@@ -82,10 +90,11 @@ class DHTHealthManager(TaskManager):
         :return: A bytearray with the combined bloomfilter.
         """
         final_bf_len = min(len(bf1), len(bf2))
-        final_bf = bytearray(final_bf_len)
-        for bf_index in range(final_bf_len):
-            final_bf[bf_index] = bf1[bf_index] | bf2[bf_index]
-        return final_bf
+        if final_bf_len == 0:
+            return bytearray()
+        # OR the filters as big integers, which avoids a Python-level loop over every byte
+        combined = int(hexlify(bf1[:final_bf_len]), 16) | int(hexlify(bf2[:final_bf_len]), 16)
+        return bytearray(unhexlify('%0*x' % (final_bf_len * 2, combined)))
 
     @staticmethod
     def get_size_from_bloomfilter(bf):
@@ -94,19 +103,8 @@ class DHTHealthManager(TaskManager):
         :param bf: The bloom filter of which we estimate the size.
         :return: A rounded integer, approximating the number of items in the filter.
         """
-        def tobits(s):
-            result = []
-            for c in s:
-                bits = bin(ord(c))[2:]
-                bits = '00000000'[len(bits):] + bits
-                result.extend([int(b) for b in bits])
-            return result
-
-        bits_array = tobits(str(bf))
-        total_zeros = 0
-        for bit in bits_array:
-            if bit == 0:
-                total_zeros += 1
+        # Count the set bits with a byte-wise popcount lookup instead of expanding every bit
+        total_zeros = len(bf) * 8 - sum(bytearray(bf).translate(POPCOUNT_TABLE))
 
         if total_zeros == 0:
             return 6000  # The maximum capacity of the bloom filter used in BEP33
@@ -115,31 +113,40 @@ class DHTHealthManager(TaskManager):
         c = min(m - 1, total_zeros)
         return int(math.log(c / float(m)) / (2 * math.log(1 - 1 / float(m))))
 
-    def received_bloomfilters(self, node_id, bf_seeds=bytearray(256), bf_peers=bytearray(256)):
+    def register_query(self, transaction_id, infohash):
+        """
+        Register an outgoing DHT get_peers query, so the response can be attributed to the right lookup.
+        :param transaction_id: The DHT transaction ID of the outgoing query.
+        :param infohash: The infohash that is queried.
+        """
+        if not transaction_id or infohash not in self.lookup_deferreds:
+            return
+
+        self.outstanding_queries[transaction_id] = infohash
+        self.lookup_transactions.setdefault(infohash, set()).add(transaction_id)
+
+    def get_lookup_infohash(self, transaction_id):
+        """
+        Find the infohash of the lookup that a get_peers response belongs to.
+        :param transaction_id: The DHT transaction ID of the response.
+        :return: The infohash of the pending lookup, or None if the response does not belong to a pending lookup.
+        """
+        infohash = self.outstanding_queries.pop(transaction_id, None)
+        if infohash:
+            self.lookup_transactions.get(infohash, set()).discard(transaction_id)
+        return infohash
+
+    def received_bloomfilters(self, transaction_id, bf_seeds=bytearray(256), bf_peers=bytearray(256)):
         """
         We have received bloom filters from the libtorrent DHT. Register the bloom filters and process them.
-        :param node_id: The ID of the node that sent the bloom filter.
+        :param transaction_id: The DHT transaction ID of the get_peers response.
         :param bf_seeds: The bloom filter indicating the IP addresses of the seeders.
         :param bf_peers: The bloom filter indicating the IP addresses of the peers (leechers).
         """
-        min_distance = -1
-        closest_infohash = None
-
-        # We do not know to which infohash the received get_peers response belongs so we have to manually go through
-        # the infohashes and find the infohash that is the closest to the node id that sent us the message.
-        for infohash in self.lookup_deferreds:
-            infohash_bin = id_to_binary_string(infohash)
-            node_id_bin = id_to_binary_string(node_id)
-            ih_distance = distance(infohash_bin, node_id_bin)
-            if ih_distance < min_distance or min_distance == -1:
-                min_distance = ih_distance
-                closest_infohash = infohash
-
-        if not closest_infohash:
+        infohash = self.get_lookup_infohash(transaction_id)
+        if not infohash:
             self._logger.info("Could not find lookup infohash for incoming BEP33 bloomfilters")
             return
 
-        self.bf_seeders[closest_infohash] = DHTHealthManager.combine_bloomfilters(
-            self.bf_seeders[closest_infohash], bf_seeds)
-        self.bf_peers[closest_infohash] = DHTHealthManager.combine_bloomfilters(
-            self.bf_peers[closest_infohash], bf_peers)
+        self.bf_seeders[infohash] = DHTHealthManager.combine_bloomfilters(self.bf_seeders[infohash], bf_seeds)
+        self.bf_peers[infohash] = DHTHealthManager.combine_bloomfilters(self.bf_peers[infohash], bf_peers)
@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+
+import logging
+import sqlite3
+from binascii import hexlify
+from threading import RLock
+
+from six import StringIO
+
+from Tribler.Core.Utilities.configparser import CallbackConfigParser
+
+DOWNLOAD_STATE_DB_FILENAME = u"download_states.db"
+
+
+class DownloadStateStore(object):
+    """
+    This class stores the persistent state of downloads (their configuration and libtorrent resume data) in a single
+    SQLite database, instead of a separate .state file per download.
+
+    Writes are buffered in memory and committed to the database in a single transaction when flush() is called.
+    Reads take the buffered writes into account.
+    """
+
+    def __init__(self, db_path):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.db_path = db_path
+        self.lock = RLock()
+        self.pending_writes = {}  # Map from hex infohash to a serialized pstate, or None if the state is removed
+
+        # The store is flushed from the thread pool, so we allow access to the connection from other threads
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS download_state ("
+                                    "infohash TEXT PRIMARY KEY, "
+                                    "pstate TEXT NOT NULL)")
+
+    @staticmethod
+    def serialize_pstate(pstate):
+        pstate_io = StringIO()
+        pstate.write(pstate_io)
+        return pstate_io.getvalue()
+
+    @staticmethod
+    def deserialize_pstate(serialized_pstate):
+        pstate = CallbackConfigParser()
+        pstate.readfp(StringIO(serialized_pstate))
+        return pstate
+
+    def put(self, infohash, pstate):
+        """
+        Store the persistent state of a download. The state is written to the database on the next flush.
+        :param infohash: The binary infohash of the download.
+        :param pstate: The persistent state of the download, a CallbackConfigParser.
+        """
+        serialized_pstate = DownloadStateStore.serialize_pstate(pstate)
+        with self.lock:
+            self.pending_writes[hexlify(infohash)] = serialized_pstate
+
+    def remove(self, infohash):
+        """
+        Remove the persistent state of a download. The state is removed from the database on the next flush.
+        :param infohash: The binary infohash of the download.
+        """
+        with self.lock:
+            self.pending_writes[hexlify(infohash)] = None
+
+    def _get_serialized(self, hex_infohash):
+        with self.lock:
+            if hex_infohash in self.pending_writes:
+                return self.pending_writes[hex_infohash]
+            row = self.connection.execute("SELECT pstate FROM download_state WHERE infohash = ?",
+                                          (hex_infohash, )).fetchone()
+        return row[0] if row else None
+
+    def has(self, infohash):
+        return self._get_serialized(hexlify(infohash)) is not None
+
+    def get(self, infohash):
+        """
+        Return the persistent state of a download, or None if we have no state for this download.
+        :param infohash: The binary infohash of the download.
+        """
+        serialized_pstate = self._get_serialized(hexlify(infohash))
+        return DownloadStateStore.deserialize_pstate(serialized_pstate) if serialized_pstate is not None else None
+
+    def get_infohashes(self):
+        """
+        Return the hex infohashes of all downloads of which we have a persistent state.
+        """
+        with self.lock:
+            infohashes = set(row[0] for row in self.connection.execute("SELECT infohash FROM download_state"))
+            for hex_infohash, serialized_pstate in self.pending_writes.items():
+                if serialized_pstate is None:
+                    infohashes.discard(hex_infohash)
+                else:
+                    infohashes.add(hex_infohash)
+        return sorted(infohashes)
+
+    def flush(self):
+        """
+        Write all buffered changes to the database in a single transaction.
+        """
+        with self.lock:
+            if not self.pending_writes:
+                return
+
+            pending_writes, self.pending_writes = self.pending_writes, {}
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO download_state (infohash, pstate) VALUES (?, ?)",
+                                            [(hex_infohash, serialized_pstate)
+                                             for hex_infohash, serialized_pstate in pending_writes.items()
+                                             if serialized_pstate is not None])
+                self.connection.executemany("DELETE FROM download_state WHERE infohash = ?",
+                                            [(hex_infohash, )
+                                             for hex_infohash, serialized_pstate in pending_writes.items()
+                                             if serialized_pstate is None])
+            self._logger.debug("Flushed %d download states", len(pending_writes))
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.connection.close()
@@ -0,0 +1,114 @@
+from __future__ import absolute_import
+
+import logging
+import os
+from collections import OrderedDict
+
+from libtorrent import bdecode, bencode
+
+METAINFO_CACHE_DIRNAME = u"metainfo_cache"
+METAINFO_EXTENSION = u".metainfo"
+# The keys of the metainfo that we store on disk. The peers are only meaningful at the time of the lookup.
+PERSISTENT_METAINFO_KEYS = ('info', 'announce', 'announce-list', 'nodes')
+
+
+class MetainfoCache(object):
+    """
+    This class caches the metainfo of the torrents that we looked up, keyed by hex infohash. The most recently used
+    entries are kept in memory, and the torrents are also stored on disk as bencoded files, so we do not have to look
+    up the same torrent again after a restart. Both levels evict the least recently used entries when they are full.
+
+    The cached metainfo dictionaries are shared between all users of the cache, and must not be modified.
+    """
+
+    def __init__(self, cache_dir, max_memory_entries=100, max_disk_entries=1000):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        # Both maps are ordered from the least to the most recently used entry
+        self.memory_entries = OrderedDict()  # Map from hex infohash to metainfo
+        self.disk_entries = OrderedDict()  # Map from hex infohash to None
+
+        if os.path.isdir(cache_dir):
+            filenames = [filename for filename in os.listdir(cache_dir) if filename.endswith(METAINFO_EXTENSION)]
+            filenames.sort(key=lambda filename: os.path.getmtime(os.path.join(cache_dir, filename)))
+            for filename in filenames:
+                self.disk_entries[filename[:-len(METAINFO_EXTENSION)]] = None
+
+    def get_path(self, infohash):
+        return os.path.join(self.cache_dir, infohash + METAINFO_EXTENSION)
+
+    def __contains__(self, infohash):
+        return infohash in self.memory_entries or infohash in self.disk_entries
+
+    def get(self, infohash):
+        """
+        Return the cached metainfo of the torrent with the given hex infohash, or None if we do not have it.
+        """
+        metainfo = self.memory_entries.pop(infohash, None)
+        if metainfo is None and infohash in self.disk_entries:
+            metainfo = self.read(infohash)
+
+        if metainfo is not None:
+            self.memory_entries[infohash] = metainfo
+            self.evict_memory_entries()
+        return metainfo
+
+    def read(self, infohash):
+        path = self.get_path(infohash)
+        try:
+            with open(path, 'rb') as metainfo_file:
+                metainfo = bdecode(metainfo_file.read())
+            # Keep the order of the entries on disk, for the next time we start
+            os.utime(path, None)
+        except (IOError, OSError) as e:
+            self._logger.warning("Could not read cached metainfo %s: %s", path, e)
+            metainfo = None
+
+        if not isinstance(metainfo, dict) or 'info' not in metainfo:
+            self.remove(infohash)
+            return None
+
+        self.disk_entries.pop(infohash)
+        self.disk_entries[infohash] = None
+
+        metainfo.update({'initial peers': [], 'leechers': 0, 'seeders': 0})
+        return metainfo
+
+    def put(self, infohash, metainfo):
+        """
+        Cache the metainfo of the torrent with the given hex infohash, both in memory and on disk.
+        """
+        self.memory_entries.pop(infohash, None)
+        self.memory_entries[infohash] = metainfo
+        self.evict_memory_entries()
+
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(self.get_path(infohash), 'wb') as metainfo_file:
+                metainfo_file.write(bencode({key: metainfo[key] for key in PERSISTENT_METAINFO_KEYS
+                                             if key in metainfo}))
+        except (IOError, OSError) as e:
+            self._logger.warning("Could not write metainfo of %s to the cache: %s", infohash, e)
+            return
+
+        self.disk_entries.pop(infohash, None)
+        self.disk_entries[infohash] = None
+        while len(self.disk_entries) > self.max_disk_entries:
+            self.remove(next(iter(self.disk_entries)))
+
+    def remove(self, infohash):
+        self.memory_entries.pop(infohash, None)
+        if infohash in self.disk_entries:
+            del self.disk_entries[infohash]
+            try:
+                os.remove(self.get_path(infohash))
+            except OSError as e:
+                self._logger.warning("Could not remove cached metainfo of %s: %s", infohash, e)
+
+    def evict_memory_entries(self):
+        while len(self.memory_entries) > self.max_memory_entries:
+            self.memory_entries.popitem(last=False)
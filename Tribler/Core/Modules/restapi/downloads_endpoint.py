@@ -12,6 +12,7 @@ from six import unichr  # pylint: disable=redefined-builtin
 from six.moves.urllib.parse import unquote_plus
 from six.moves.urllib.request import url2pathname
 
+from twisted.internet.defer import gatherResults
 from twisted.web import http, resource
 from twisted.web.server import NOT_DONE_YET
 
@@ -224,11 +225,11 @@ class DownloadsEndpoint(DownloadBaseEndpoint):
 
             # Create tracker information of the download
             tracker_info = []
-            for url, url_info in download.get_tracker_status().items():
+            for url, url_info in state.get_tracker_status().items():
                 tracker_info.append({"url": url, "peers": url_info[0], "status": url_info[1]})
 
             num_seeds, num_peers = state.get_num_seeds_peers()
-            num_connected_seeds, num_connected_peers = download.get_num_connected_seeds_peers()
+            num_connected_seeds, num_connected_peers = state.get_num_connected_seeds_peers()
 
             download_name = self.session.lm.mds.ChannelMetadata.get_channel_name(
                 tdef.get_name_utf8(), tdef.get_infohash()) if download.get_channel_download() else tdef.get_name_utf8()
@@ -270,12 +271,14 @@ class DownloadsEndpoint(DownloadBaseEndpoint):
 
             # Add peers information if requested
             if get_peers:
-                peer_list = state.get_peerlist()
-                for peer_info in peer_list:  # Remove have field since it is very large to transmit.
-                    del peer_info['have']
-                    if 'extended_version' in peer_info:
-                        peer_info['extended_version'] = _safe_extended_peer_info(peer_info['extended_version'])
-                    peer_info['id'] = hexlify(peer_info['id'])
+                peer_list = []
+                for peer_info in state.get_peerlist():  # The peers are shared with other users of the state
+                    peer_json = dict(peer_info)
+                    del peer_json['have']  # Remove have field since it is very large to transmit.
+                    if 'extended_version' in peer_json:
+                        peer_json['extended_version'] = _safe_extended_peer_info(peer_json['extended_version'])
+                    peer_json['id'] = hexlify(peer_json['id'])
+                    peer_list.append(peer_json)
 
                 download_json["peers"] = peer_list
 
@@ -368,6 +371,151 @@ class DownloadsEndpoint(DownloadBaseEndpoint):
 
         return NOT_DONE_YET
 
+    def get_downloads_from_params(self, request, parameters):
+        """
+        Get the downloads with the infohashes in the infohashes[] parameter.
+        :return: a tuple of the list of downloads, and the error response if some of the downloads do not exist.
+        """
+        if 'infohashes[]' not in parameters or len(parameters['infohashes[]']) == 0:
+            request.setResponseCode(http.BAD_REQUEST)
+            return None, json.dumps({"error": "infohashes parameter missing"})
+
+        downloads = []
+        for infohash in parameters['infohashes[]']:
+            try:
+                download = self.session.get_download(unhexlify(infohash))
+            except TypeError:
+                download = None
+            if not download:
+                return None, DownloadsEndpoint.return_404(request, "download %s does not exist" % infohash)
+            downloads.append(download)
+        return downloads, None
+
+    def render_PATCH(self, request):
+        """
+        .. http:patch:: /downloads
+
+        A PATCH request to this endpoint will update multiple downloads in Tribler at once. The infohashes[]
+        parameter lists the infohashes of the downloads, which must all exist.
+
+        A state parameter can be passed to modify the state of the downloads. Valid states are "resume", "stop" and
+        "recheck", like for a specific download. The anonymity of the downloads can be changed by passing the
+        anon_hops parameter, however, this must be the only other parameter in this request.
+
+        The downloads are checkpointed together when all of them have been updated.
+
+            **Example request**:
+
+                .. sourcecode:: none
+
+                    curl -X PATCH http://localhost:8085/downloads
+                    --data "infohashes[]=4344503b7e797ebf31582327a5baae35b11bda01&infohashes[]=...&anon_hops=1"
+
+            **Example response**:
+
+                .. sourcecode:: javascript
+
+                    {"modified": True, "infohashes": ["4344503b7e797ebf31582327a5baae35b11bda01", ...]}
+        """
+        parameters = http.parse_qs(request.content.read(), 1)
+        downloads, error = self.get_downloads_from_params(request, parameters)
+        if error:
+            return error
+
+        infohashes = [hexlify(download.get_def().get_infohash()) for download in downloads]
+
+        def on_downloads_updated(_):
+            request.write(json.dumps({"modified": True, "infohashes": infohashes}))
+            request.finish()
+
+        def on_update_failure(failure):
+            self._logger.exception(failure)
+            request.write(return_handled_exception(request, failure.value))
+            # If the above request.write failed, the request will have already been finished
+            if not request.finished:
+                request.finish()
+
+        if len(parameters) > 2 and 'anon_hops' in parameters:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "anon_hops must be the only other parameter in this request"})
+        elif 'anon_hops' in parameters:
+            anon_hops = int(parameters['anon_hops'][0])
+            deferred = self.session.lm.update_downloads_hops(downloads, anon_hops)
+            deferred.addCallbacks(on_downloads_updated, on_update_failure)
+            return NOT_DONE_YET
+
+        if 'state' not in parameters or len(parameters['state']) == 0:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "state parameter missing"})
+
+        state = parameters['state'][0]
+        if state == "resume":
+            for download in downloads:
+                download.restart()
+        elif state == "stop":
+            for download in downloads:
+                download.stop()
+        elif state == "recheck":
+            for download in downloads:
+                download.force_recheck()
+        else:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "unknown state parameter"})
+
+        self.session.lm.checkpoint_downloads(downloads).addCallbacks(on_downloads_updated, on_update_failure)
+        return NOT_DONE_YET
+
+    def render_DELETE(self, request):
+        """
+        .. http:delete:: /downloads
+
+        A DELETE request to this endpoint removes multiple downloads from Tribler at once. The infohashes[]
+        parameter lists the infohashes of the downloads, which must all exist. Like for a specific download, the
+        remove_data parameter specifies whether the downloaded data is removed as well.
+
+            **Example request**:
+
+                .. sourcecode:: none
+
+                    curl -X DELETE http://localhost:8085/downloads
+                    --data "infohashes[]=4344503b7e797ebf31582327a5baae35b11bda01&infohashes[]=...&remove_data=1"
+
+            **Example response**:
+
+                .. sourcecode:: javascript
+
+                    {"removed": True, "infohashes": ["4344503b7e797ebf31582327a5baae35b11bda01", ...]}
+        """
+        parameters = http.parse_qs(request.content.read(), 1)
+
+        if 'remove_data' not in parameters or len(parameters['remove_data']) == 0:
+            request.setResponseCode(http.BAD_REQUEST)
+            return json.dumps({"error": "remove_data parameter missing"})
+
+        downloads, error = self.get_downloads_from_params(request, parameters)
+        if error:
+            return error
+
+        remove_data = parameters['remove_data'][0] == "1"
+        infohashes = [hexlify(download.get_def().get_infohash()) for download in downloads]
+
+        def on_torrents_removed(_):
+            request.write(json.dumps({"removed": True, "infohashes": infohashes}))
+            request.finish()
+
+        def on_remove_failure(failure):
+            self._logger.exception(failure)
+            request.write(return_handled_exception(request, failure.value.subFailure.value))
+            # If the above request.write failed, the request will have already been finished
+            if not request.finished:
+                request.finish()
+
+        deferred = gatherResults([self.session.remove_download(download, remove_content=remove_data)
+                                  for download in downloads], consumeErrors=True)
+        deferred.addCallbacks(on_torrents_removed, on_remove_failure)
+
+        return NOT_DONE_YET
+
 
 class DownloadSpecificEndpoint(DownloadBaseEndpoint):
     """
@@ -21,6 +21,7 @@ class LibTorrentEndpoint(resource.Resource):
 
         self.putChild("settings", LibTorrentSettingsEndpoint(self.session))
         self.putChild("session", LibTorrentSessionEndpoint(self.session))
+        self.putChild("stats", LibTorrentStatsEndpoint(self.session))
 
 
 class LibTorrentSettingsEndpoint(resource.Resource):
@@ -112,8 +113,8 @@ class LibTorrentSessionEndpoint(resource.Resource):
                         }
                     }
         """
-        def on_session_stats_alert_received(alert):
-            request.write(json.dumps({'hop': hop, 'session': alert.values}))
+        def on_session_stats(values):
+            request.write(json.dumps({'hop': hop, 'session': values}))
             request.finish()
 
         hop = 0
@@ -124,7 +125,60 @@ class LibTorrentSessionEndpoint(resource.Resource):
                 not hasattr(self.session.lm.ltmgr.ltsessions[hop], "post_session_stats"):
             return json.dumps({'hop': hop, 'session': {}})
 
-        self.session.lm.ltmgr.session_stats_callback = on_session_stats_alert_received
-        self.session.lm.ltmgr.ltsessions[hop].post_session_stats()
+        self.session.lm.ltmgr.get_session_stats(hop).addCallback(on_session_stats)
 
         return NOT_DONE_YET
+
+
+class LibTorrentStatsEndpoint(resource.Resource):
+    """
+    This endpoint is responsible for handing all requests regarding the recorded statistics of libtorrent sessions.
+    """
+
+    def __init__(self, session):
+        resource.Resource.__init__(self)
+        self.session = session
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def render_GET(self, request):
+        """
+        .. http:get:: /libtorrent/stats
+
+        A GET request to this endpoint will return the recent history of the disk, cache and network counters of a
+        libtorrent session. The counters are recorded every few seconds, and every counter has a value for each of
+        the timestamps.
+
+            **Example request**:
+
+                .. sourcecode:: none
+
+                    curl -X GET http://localhost:8085/libtorrent/stats?hop=0
+
+            **Example response**:
+
+                .. sourcecode:: javascript
+
+                    {
+                        "hop": 0,
+                        "timestamps": [1546300800.0, 1546300805.0, ...],
+                        "counters": {
+                            "disk.num_blocks_read": [1043, 1107, ...],
+                            "net.recv_bytes": [5230212, 5981122, ...],
+                            ...
+                            "disk.read_cache_blocks": [512, 530, ...]
+                        }
+                    }
+        """
+        hop = 0
+        if 'hop' in request.args and request.args['hop']:
+            hop = int(request.args['hop'][0])
+
+        history = self.session.lm.ltmgr.session_stats_history.get(hop, [])
+        timestamps = [timestamp for timestamp, _ in history]
+        counters = {}
+        for index, (_, values) in enumerate(history):
+            for name, value in values.items():
+                # Counters that were not recorded yet at a timestamp have no value
+                counters.setdefault(name, [None] * len(history))[index] = value
+
+        return json.dumps({'hop': hop, 'timestamps': timestamps, 'counters': counters})
@@ -12,10 +12,12 @@ from six import viewitems
 from six.moves.urllib.parse import unquote
 
 from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThread
 from twisted.web import http, resource
 from twisted.web.error import SchemeNotSupported
 from twisted.web.server import NOT_DONE_YET
 
+from Tribler.Core.Libtorrent.LibtorrentMgr import METAINFO_PRIORITY_HIGH
 from Tribler.Core.Modules.restapi.metadata_endpoint import SpecificChannelTorrentsEndpoint
 from Tribler.Core.TorrentDef import TorrentDef
 from Tribler.Core.Utilities.utilities import http_get
@@ -267,7 +269,8 @@ class MyChannelTorrentsEndpoint(BaseMyChannelEndpoint):
             elif uri.startswith("magnet:"):
                 try:
                     self.session.lm.ltmgr.get_metainfo(uri, callback=deferred.callback,
-                                                       timeout=30, timeout_callback=_on_timeout, notify=True)
+                                                       timeout=30, timeout_callback=_on_timeout, notify=True,
+                                                       priority=METAINFO_PRIORITY_HIGH)
                 except Exception as ex:
                     deferred.errback(ex)
 
@@ -388,6 +391,10 @@ class MyChannelSpecificTorrentEndpoint(BaseMyChannelEndpoint):
 
 class MyChannelCommitEndpoint(BaseMyChannelEndpoint):
 
+    def __init__(self, session):
+        BaseMyChannelEndpoint.__init__(self, session)
+        self.commit_deferred = None  # Fires when the commit that is in progress has finished
+
     def render_POST(self, request):
         with db_session:
             my_channel = self.session.lm.mds.ChannelMetadata.get_my_channel()
@@ -395,8 +402,30 @@ class MyChannelCommitEndpoint(BaseMyChannelEndpoint):
                 request.setResponseCode(http.NOT_FOUND)
                 return json.dumps({"error": "your channel has not been created"})
 
-            torrent_dict = my_channel.commit_channel_torrent()
+        # Committing the channel twice at the same time would create the same channel torrent twice
+        if self.commit_deferred:
+            request.setResponseCode(http.CONFLICT)
+            return json.dumps({"error": "your channel is already being committed"})
+
+        def commit_channel():
+            # Hashing the channel torrent can take a while, so we do not commit on the reactor thread
+            with db_session:
+                return self.session.lm.mds.ChannelMetadata.get_my_channel().commit_channel_torrent()
+
+        def on_committed(torrent_dict):
             if torrent_dict:
                 self.session.lm.gigachannel_manager.updated_my_channel(TorrentDef.load_from_dict(torrent_dict))
+            request.write(json.dumps({"success": True}))
+            request.finish()
 
-        return json.dumps({"success": True})
+        def on_commit_failed(failure):
+            request.write(self.return_500(request, failure.value))
+            request.finish()
+
+        def on_commit_finished(result):
+            self.commit_deferred = None
+            return result
+
+        self.commit_deferred = deferToThread(commit_channel).addBoth(on_commit_finished)
+        self.commit_deferred.addCallbacks(on_committed, on_commit_failed)
+        return NOT_DONE_YET
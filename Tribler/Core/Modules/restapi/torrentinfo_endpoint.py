@@ -15,6 +15,7 @@ from twisted.web import http, resource
 from twisted.web.server import NOT_DONE_YET
 
 import Tribler.Core.Utilities.json_util as json
+from Tribler.Core.Libtorrent.LibtorrentMgr import METAINFO_PRIORITY_HIGH
 from Tribler.Core.Modules.MetadataStore.OrmBindings.channel_metadata import BLOB_EXTENSION
 from Tribler.Core.Modules.MetadataStore.serialization import CHANNEL_TORRENT, \
     REGULAR_TORRENT, read_payload
@@ -71,8 +72,8 @@ class TorrentInfoEndpoint(resource.Resource):
             # TODO(Martijn): store the stuff in a database!!!
             infohash = hashlib.sha1(bencode(metainfo['info'])).digest()
 
-            # Check if the torrent is already in the downloads
-            metainfo['download_exists'] = infohash in self.session.lm.downloads
+            # Check if the torrent is already in the downloads. The metainfo itself is shared, so we do not modify it.
+            metainfo = dict(metainfo, download_exists=infohash in self.session.lm.downloads)
             encoded_metainfo = hexlify(json.dumps(metainfo, ensure_ascii=False))
 
             request.write(json.dumps({"metainfo": encoded_metainfo}))
@@ -97,7 +98,8 @@ class TorrentInfoEndpoint(resource.Resource):
                 _, infohash, _ = parse_magnetlink(response)
                 if infohash:
                     self.session.lm.ltmgr.get_metainfo(response, callback=metainfo_deferred.callback, timeout=20,
-                                                       timeout_callback=on_metainfo_timeout, notify=True)
+                                                       timeout_callback=on_metainfo_timeout, notify=True,
+                                                       priority=METAINFO_PRIORITY_HIGH)
                     return
             metainfo_deferred.callback(bdecode(response))
 
@@ -134,7 +136,8 @@ class TorrentInfoEndpoint(resource.Resource):
                 return json.dumps({"error": "missing infohash"})
 
             self.session.lm.ltmgr.get_metainfo(mlink or uri, callback=metainfo_deferred.callback, timeout=20,
-                                               timeout_callback=on_metainfo_timeout, notify=True)
+                                               timeout_callback=on_metainfo_timeout, notify=True,
+                                               priority=METAINFO_PRIORITY_HIGH)
             return NOT_DONE_YET
 
         metainfo_deferred = Deferred()
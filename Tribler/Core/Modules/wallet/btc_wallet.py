@@ -5,8 +5,7 @@ import time
 # Important import, do not remove
 from binascii import hexlify
 
-from twisted.internet.defer import Deferred, fail, inlineCallbacks, succeed
-from twisted.internet.task import LoopingCall
+from twisted.internet.defer import fail, succeed
 from twisted.python.failure import Failure
 
 import Tribler.Core.Modules.bitcoinlib_main as bitcoinlib_main
@@ -22,6 +21,7 @@ class BitcoinWallet(Wallet):
           we can only import bitcoinlib *after* patching the bitcoinlib main file.
     """
     TESTNET = False
+    MONITOR_DELAY = 5
 
     def __init__(self, wallet_dir):
         super(BitcoinWallet, self).__init__()
@@ -93,27 +93,6 @@ class BitcoinWallet(Wallet):
 
         return self.get_balance().addCallback(on_balance)
 
-    def monitor_transaction(self, txid):
-        """
-        Monitor a given transaction ID. Returns a Deferred that fires when the transaction is present.
-        """
-        monitor_deferred = Deferred()
-
-        @inlineCallbacks
-        def monitor_loop():
-            transactions = yield self.get_transactions()
-            for transaction in transactions:
-                if transaction['id'] == txid:
-                    self._logger.debug("Found transaction with id %s", txid)
-                    monitor_deferred.callback(None)
-                    monitor_lc.stop()
-
-        self._logger.debug("Start polling for transaction %s", txid)
-        monitor_lc = self.register_task("btc_poll_%s" % txid, LoopingCall(monitor_loop))
-        monitor_lc.start(5)
-
-        return monitor_deferred
-
     def get_address(self):
         if not self.created:
             return ''
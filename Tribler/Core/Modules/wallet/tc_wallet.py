@@ -3,8 +3,7 @@ from __future__ import absolute_import, division
 from base64 import b64encode
 from binascii import hexlify, unhexlify
 
-from twisted.internet.defer import succeed, fail, Deferred
-from twisted.internet.task import LoopingCall
+from twisted.internet.defer import succeed, fail
 
 from Tribler.Core.Modules.wallet.bandwidth_block import TriblerBandwidthBlock
 from Tribler.Core.Modules.wallet.wallet import Wallet, InsufficientFunds
@@ -22,6 +21,8 @@ class TrustchainWallet(Wallet, BlockListener):
     This class is responsible for handling your wallet of Tribler tokens.
     """
     MONITOR_DELAY = 1
+    # Looking up payments is a query on our local TrustChain database, so we keep polling every second
+    MAX_MONITOR_DELAY = 1
     BLOCK_CLASS = TriblerBandwidthBlock
 
     def __init__(self, trustchain):
@@ -114,31 +115,17 @@ class TrustchainWallet(Wallet, BlockListener):
 
         return succeed(txid)
 
-    def monitor_transaction(self, payment_id):
+    def find_transactions(self, transaction_ids):
         """
-        Monitor an incoming transaction with a specific id.
+        Look up the blocks of the monitored incoming payments in our TrustChain database.
         """
-        pub_key, sequence_number = payment_id.split(b'.')[:2]
-        pub_key = unhexlify(pub_key)
-        sequence_number = int(sequence_number)
-
-        block = self.trustchain.persistence.get(pub_key, sequence_number)
-
-        monitor_deferred = Deferred()
-
-        def check_has_block():
-            self._logger.info("Checking for block with id %s and num %d", hexlify(pub_key), sequence_number)
-            db_block = self.trustchain.persistence.get(pub_key, sequence_number)
-            if db_block:
-                monitor_lc.stop()
-                monitor_deferred.callback(db_block)
-
-        if block:
-            return succeed(block)
-
-        monitor_lc = self.register_task("poll_%s" % payment_id, LoopingCall(check_has_block))
-        monitor_lc.start(self.MONITOR_DELAY)
-        return monitor_deferred
+        found_blocks = {}
+        for payment_id in transaction_ids:
+            pub_key, sequence_number = payment_id.split(b'.')[:2]
+            block = self.trustchain.persistence.get(unhexlify(pub_key), int(sequence_number))
+            if block:
+                found_blocks[payment_id] = block
+        return succeed(found_blocks)
 
     def get_address(self):
         return b64encode(self.trustchain.my_peer.public_key.key_to_bin())
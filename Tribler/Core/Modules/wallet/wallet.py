@@ -7,6 +7,9 @@ import string
 
 import six
 
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, maybeDeferred
+
 from Tribler.pyipv8.ipv8.taskmanager import TaskManager
 
 
@@ -21,12 +24,22 @@ class Wallet(six.with_metaclass(abc.ABCMeta, TaskManager)):
     """
     This is the base class of a wallet and contains various methods that every wallet should implement.
     To create your own wallet, subclass this class and implement the required methods.
+
+    Incoming transactions are monitored in a single loop per wallet, which looks up all monitored transactions at once.
+    The loop backs off exponentially, from MONITOR_DELAY to MAX_MONITOR_DELAY seconds, while no transaction shows up.
+    Wallets that look up transactions locally can set MAX_MONITOR_DELAY to MONITOR_DELAY, so they do not back off.
     """
+    MONITOR_DELAY = 1
+    MAX_MONITOR_DELAY = 60
+
     def __init__(self):
         super(Wallet, self).__init__()
         self._logger = logging.getLogger(self.__class__.__name__)
         self.created = False
         self.unlocked = False
+        self.monitored_transactions = {}  # Map from transaction id -> deferreds that fire when it is present
+        self.monitor_delay = self.MONITOR_DELAY
+        self.monitor_polling = False
 
     def generate_txid(self, length=10):
         """
@@ -34,6 +47,65 @@ class Wallet(six.with_metaclass(abc.ABCMeta, TaskManager)):
         """
         return ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(length))
 
+    def monitor_transaction(self, transaction_id):
+        """
+        Monitor an incoming transaction with a specific id.
+        :return: A Deferred that fires when the transaction is present.
+        """
+        self._logger.debug("Start monitoring transaction %s", transaction_id)
+        monitor_deferred = Deferred()
+        self.monitored_transactions.setdefault(transaction_id, []).append(monitor_deferred)
+
+        # Look for the new transaction right away, and poll often again until we have found it
+        self.monitor_delay = self.MONITOR_DELAY
+        if not self.monitor_polling:
+            self.replace_task("monitor_transactions", reactor.callLater(0, self.poll_monitored_transactions))
+        return monitor_deferred
+
+    def find_transactions(self, transaction_ids):
+        """
+        Look up the monitored transactions with the given ids. Wallets can override this method to look up all
+        transactions with a single query.
+        :return: A Deferred that fires with a dictionary from the id of every transaction that is present to the value
+                 with which its monitor deferreds should fire.
+        """
+        def on_transactions(transactions):
+            present_ids = set(transaction['id'] for transaction in transactions)
+            return {transaction_id: None for transaction_id in transaction_ids if transaction_id in present_ids}
+
+        return self.get_transactions().addCallback(on_transactions)
+
+    def poll_monitored_transactions(self):
+        if not self.monitored_transactions:
+            return
+
+        def on_found_transactions(found_transactions):
+            for transaction_id, result in found_transactions.items():
+                self._logger.debug("Found transaction with id %s", transaction_id)
+                for monitor_deferred in self.monitored_transactions.pop(transaction_id, []):
+                    monitor_deferred.callback(result)
+            return found_transactions
+
+        def on_poll_error(failure):
+            self._logger.warning("Could not look up the monitored transactions: %s", failure.getErrorMessage())
+            return {}
+
+        def schedule_next_poll(found_transactions):
+            self.monitor_polling = False
+            if not self.monitored_transactions:
+                return
+            if found_transactions:
+                self.monitor_delay = self.MONITOR_DELAY
+            delay = self.monitor_delay
+            self.monitor_delay = min(delay * 2, self.MAX_MONITOR_DELAY)
+            self.replace_task("monitor_transactions", reactor.callLater(delay, self.poll_monitored_transactions))
+
+        self.monitor_polling = True
+        return maybeDeferred(self.find_transactions, list(self.monitored_transactions))\
+            .addCallback(on_found_transactions)\
+            .addErrback(on_poll_error)\
+            .addCallback(schedule_next_poll)
+
     @abc.abstractmethod
     def get_identifier(self):
         return
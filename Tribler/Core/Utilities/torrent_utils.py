@@ -2,13 +2,24 @@ from __future__ import absolute_import
 
 import logging
 import os
+import threading
 from hashlib import sha1
+from multiprocessing.pool import ThreadPool
 
 import libtorrent
-from libtorrent import bencode
+from libtorrent import bdecode, bencode
+
+from six.moves import xrange
 
 logger = logging.getLogger(__name__)
 
+# The number of threads that read and hash the pieces of the torrents that we create
+HASH_THREADS = 4
+
+# The pool of hash threads is shared by all torrents that we create, and started when we first need it
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
 
 def commonprefix(l):
     # this unlike the os.path.commonprefix version always returns path prefixes as it compares
@@ -99,9 +110,9 @@ def create_torrent_file(file_path_list, params, torrent_filepath=None):
 
     # read the files and calculate the hashes
     if len(file_path_list) == 1:
-        libtorrent.set_piece_hashes(torrent, base_path)
+        set_piece_hashes(torrent, base_path)
     else:
-        libtorrent.set_piece_hashes(torrent, base_dir)
+        set_piece_hashes(torrent, base_dir)
 
     t1 = torrent.generate()
     torrent = libtorrent.bencode(t1)
@@ -120,6 +131,159 @@ def create_torrent_file(file_path_list, params, torrent_filepath=None):
     }
 
 
+def _hash_piece_range(file_list, piece_length, first_piece, last_piece):
+    """
+    Hash the pieces from first_piece up to last_piece (exclusive) of the concatenation of the files in file_list.
+    """
+    hashes = []
+    piece = sha1()
+    piece_size = 0
+    position = first_piece * piece_length
+    end = last_piece * piece_length
+
+    file_start = 0
+    for path, size in file_list:
+        file_end = file_start + size
+        if file_end > position and file_start < end:
+            # Pad files are not on disk, and consist of zeros
+            handle = open(path, 'rb') if path else None
+            try:
+                if handle:
+                    handle.seek(position - file_start)
+                while position < min(file_end, end):
+                    nbytes = min(file_end - position, end - position, piece_length - piece_size)
+                    data = handle.read(nbytes) if handle else b'\x00' * nbytes
+                    if len(data) != nbytes:
+                        raise IOError('File is shorter than expected: %s' % path)
+
+                    piece.update(data)
+                    piece_size += nbytes
+                    position += nbytes
+                    if piece_size == piece_length:
+                        hashes.append(piece.digest())
+                        piece = sha1()
+                        piece_size = 0
+            finally:
+                if handle:
+                    handle.close()
+        file_start = file_end
+
+    if piece_size:
+        hashes.append(piece.digest())
+    return hashes
+
+
+def get_hash_pool():
+    """
+    Get the pool of threads that hash the pieces of the torrents that we create.
+    """
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ThreadPool(HASH_THREADS)
+        return _hash_pool
+
+
+def close_hash_pool():
+    """
+    Stop the threads that hash the pieces, after they have finished their work. A new pool is started when needed.
+    """
+    global _hash_pool
+    with _hash_pool_lock:
+        pool, _hash_pool = _hash_pool, None
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+
+def hash_pieces(file_list, piece_length, first_piece=0, num_threads=HASH_THREADS):
+    """
+    Calculate the SHA1 hashes of the pieces of the concatenation of a list of files, using multiple threads.
+    :param file_list: a list of (path, size) tuples, in the order of the torrent. Pad files have None as path.
+    :param piece_length: the piece length of the torrent.
+    :param first_piece: the index of the first piece to hash, so we can skip pieces of which we know the hash.
+    :param num_threads: the number of ranges of pieces that the hash threads read and hash in parallel.
+    :return: the list of hashes of the pieces from first_piece up to the last piece.
+    """
+    total_size = sum(size for _, size in file_list)
+    num_pieces = (total_size + piece_length - 1) // piece_length
+    if first_piece >= num_pieces:
+        return []
+
+    # Every thread hashes a contiguous range of pieces, so it reads its part of the files sequentially
+    pieces_per_thread = (num_pieces - first_piece + num_threads - 1) // num_threads
+    piece_ranges = [(start, min(start + pieces_per_thread, num_pieces))
+                    for start in xrange(first_piece, num_pieces, pieces_per_thread)]
+    if len(piece_ranges) == 1:
+        return _hash_piece_range(file_list, piece_length, *piece_ranges[0])
+
+    try:
+        results = get_hash_pool().map(lambda piece_range: _hash_piece_range(file_list, piece_length, *piece_range),
+                                      piece_ranges)
+    except Exception:
+        # Do not keep the threads around after an error, we start a new pool the next time
+        close_hash_pool()
+        raise
+    return [piece_hash for result in results for piece_hash in result]
+
+
+def get_file_list(torrent):
+    """
+    Get the (path, size) tuples of the files in a libtorrent create_torrent object, in the order of the torrent.
+    The paths are relative to the parent directory of the torrent content, and pad files have None as path.
+    """
+    fs = torrent.files()
+    return [(None if fs.file_flags(index) & libtorrent.file_storage.flag_pad_file else fs.file_path(index),
+             fs.file_size(index)) for index in xrange(fs.num_files())]
+
+
+def set_piece_hashes(torrent, base_dir, reused_hashes=()):
+    """
+    Read the files of a libtorrent create_torrent object and set the hashes of its pieces. Unlike
+    libtorrent.set_piece_hashes, the files are hashed by multiple threads, and we can skip the first pieces.
+    :param torrent: the libtorrent create_torrent object.
+    :param base_dir: the parent directory of the torrent content.
+    :param reused_hashes: the already known hashes of the first pieces of the torrent.
+    """
+    file_list = [(os.path.join(base_dir, path) if path else None, size) for path, size in get_file_list(torrent)]
+    hashes = list(reused_hashes) + hash_pieces(file_list, torrent.piece_length(), first_piece=len(reused_hashes))
+    for index, piece_hash in enumerate(hashes):
+        torrent.set_hash(index, piece_hash)
+
+
+def get_reusable_piece_hashes(torrent_filename, torrent):
+    """
+    Get the hashes of the pieces of an earlier version of a torrent, that are also pieces of the new version. This is
+    only the case if the new version starts with the same files as the earlier version, and has the same piece length.
+    The files of the earlier version are assumed to be unchanged, so only use this for content that is never
+    modified once written.
+    :param torrent_filename: the path of the .torrent file of the earlier version.
+    :param torrent: the libtorrent create_torrent object of the new version.
+    :return: the list of hashes of the pieces that we can reuse, which is empty if we cannot reuse anything.
+    """
+    try:
+        with open(torrent_filename, 'rb') as torrent_file:
+            info = (bdecode(torrent_file.read()) or {}).get('info')
+    except IOError:
+        return []
+
+    if not info or info.get('piece length') != torrent.piece_length():
+        return []
+
+    if 'files' in info:
+        old_file_list = [(os.path.join(info['name'], *file_info['path']), file_info['length'])
+                         for file_info in info['files']]
+    else:
+        old_file_list = [(info['name'], info['length'])]
+
+    if get_file_list(torrent)[:len(old_file_list)] != old_file_list:
+        return []
+
+    # Only the complete pieces of the earlier version do not contain data of the new files
+    num_pieces = sum(size for _, size in old_file_list) // info['piece length']
+    return [info['pieces'][index * 20:(index + 1) * 20] for index in xrange(num_pieces)]
+
+
 def get_info_from_handle(handle):
     # In libtorrent 0.16.18, the torrent_handle.torrent_file method is not available.
     # this method checks whether the torrent_file method is available on a given handle.
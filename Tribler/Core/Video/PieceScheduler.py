@@ -0,0 +1,116 @@
+"""
+Piece scheduler for video-on-demand.
+"""
+from __future__ import absolute_import
+
+import logging
+import time
+
+from six.moves import xrange
+
+from Tribler.Core.Utilities.torrent_utils import get_info_from_handle
+
+# The bitrate (in bytes per second) that we assume until we have measured the bitrate of the video
+DEFAULT_BITRATE = 512 * 1024
+# We never assume a lower bitrate than this, so a paused player does not shrink the window to nothing
+MIN_BITRATE = 64 * 1024
+# The number of seconds of video after the playback position for which we set piece deadlines
+DEADLINE_WINDOW = 30
+# The minimum number of pieces after the playback position that have a deadline
+MIN_DEADLINE_PIECES = 4
+# The minimum number of seconds over which we measure the bitrate
+BITRATE_INTERVAL = 5
+
+
+class PieceScheduler(object):
+    """
+    This class makes libtorrent download the pieces that a video player needs next in time, by giving the pieces in
+    a window after the playback position a deadline. The size of the window and the deadlines depend on the bitrate
+    of the video, which we estimate from how fast the player reads the file.
+
+    The window slides forward while the player reads the file, and only the pieces that enter the window are scheduled.
+    When the player jumps to a position outside of the window, the deadlines in the window are removed and the window
+    starts over. Every stream has its own scheduler, and the download only removes the deadline of a piece once none
+    of the schedulers that set a deadline for it need it anymore.
+    """
+
+    def __init__(self, download, fileindex):
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self.download = download
+        self.fileindex = fileindex
+        self.bitrate = DEFAULT_BITRATE
+        self.position = None
+        self.window_start = None  # The first piece that has a deadline
+        self.window_end = 0  # The first piece after the pieces that have a deadline
+        self.bitrate_start = None  # The time and the position at which we started measuring the bitrate
+
+    def set_position(self, position):
+        """
+        Update the position in the file that the player is reading, and schedule the pieces that it needs next.
+        """
+        torrent_info = get_info_from_handle(self.download.handle)
+        if not torrent_info:
+            return
+
+        if self.position is None or position < self.position or \
+                torrent_info.map_file(self.fileindex, position, 0).piece >= self.window_end:
+            self.seek(position)
+        else:
+            self.update_bitrate(position)
+            self.position = position
+
+        self.schedule(torrent_info)
+
+    def seek(self, position):
+        self._logger.debug("Seeking to %d in file %d", position, self.fileindex)
+        self.clear_window()
+        # Once the window has been downloaded, continue with the remainder of the file
+        self.download.set_byte_priority([(self.fileindex, position, -1)], 1)
+
+        self.position = position
+        self.bitrate_start = (time.time(), position)
+
+    def clear_window(self):
+        """
+        Remove the deadlines of the pieces in the window, except for the pieces that other streams have a deadline for.
+        """
+        if self.window_start is not None:
+            for piece in xrange(self.window_start, self.window_end):
+                self.download.reset_piece_deadline(piece)
+        self.window_start = None
+        self.window_end = 0
+
+    def update_bitrate(self, position):
+        now = time.time()
+        start_time, start_position = self.bitrate_start
+        if now - start_time >= BITRATE_INTERVAL:
+            bitrate = (position - start_position) / (now - start_time)
+            # Smooth out the periods in which the player fills its buffer, or waits for pieces
+            self.bitrate = max(MIN_BITRATE, (self.bitrate + bitrate) / 2)
+            self.bitrate_start = (now, position)
+
+    def schedule(self, torrent_info):
+        """
+        Set a deadline for the pieces that have entered the window since the last time we scheduled.
+        """
+        file_entry = torrent_info.file_at(self.fileindex)
+        if self.position >= file_entry.size:
+            return
+
+        piece_length = torrent_info.piece_length()
+        first_piece = torrent_info.map_file(self.fileindex, self.position, 0).piece
+        file_last_piece = torrent_info.map_file(self.fileindex, file_entry.size - 1, 0).piece
+        window_last_byte = min(file_entry.size - 1, self.position + int(self.bitrate * DEADLINE_WINDOW))
+        last_piece = max(torrent_info.map_file(self.fileindex, window_last_byte, 0).piece,
+                         min(first_piece + MIN_DEADLINE_PIECES - 1, file_last_piece))
+
+        if self.window_start is None:
+            self.window_start = first_piece
+        for piece in xrange(max(first_piece, self.window_end), last_piece + 1):
+            # The offset of the piece in the file, which is negative for the piece in which the file starts
+            piece_position = piece * piece_length - file_entry.offset
+            deadline = int(max(0, piece_position - self.position) * 1000 / self.bitrate)
+            self.download.set_piece_deadline(piece, deadline)
+
+        self.window_end = max(self.window_end, last_piece + 1)
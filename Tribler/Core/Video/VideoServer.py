@@ -8,79 +8,51 @@ from __future__ import absolute_import
 import logging
 import mimetypes
 import os
-import socket
-import time
 from binascii import unhexlify
-from collections import defaultdict
-from threading import Event, RLock, Thread
-from traceback import print_exc
 
 from cherrypy.lib.httputil import get_ranges
 
 from six.moves import xrange
-from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
-from six.moves.socketserver import ThreadingMixIn
 
-from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import VODFile
+from twisted.internet import reactor
+from twisted.internet.defer import CancelledError, maybeDeferred, succeed
+from twisted.internet.error import CannotListenError
+from twisted.internet.interfaces import IPushProducer
+from twisted.web import http, resource, server
+
+from zope.interface import implementer
+
+from Tribler.Core.Utilities.torrent_utils import get_info_from_handle
+from Tribler.Core.Video.PieceScheduler import PieceScheduler
 from Tribler.Core.simpledefs import DLMODE_NORMAL, DLMODE_VOD
 
 
-class VideoServer(ThreadingMixIn, HTTPServer):
+class VideoServer(object):
+    """
+    HTTP server that streams the files of downloads while they are being downloaded. The server runs on the reactor
+    and the streams write the data of a piece as soon as libtorrent has finished it.
+    """
 
     def __init__(self, port, session):
         self._logger = logging.getLogger(self.__class__.__name__)
 
         self.port = port
         self.session = session
-        self.vod_fileindex = None
-        self.vod_download = None
-        self.vod_info = defaultdict(dict)  # A dictionary containing info about the requested VOD streams.
+        self.listening_port = None
+        self.vod_downloads = {}  # Map from the infohash of a download in VOD mode to the index of the streamed file
+        self.vod_selected_files = {}  # Map from the infohash of a download in VOD mode to its previous file selection
+        self.streams = set()
 
+    def start(self):
+        site = server.Site(VideoResource(self))
         for _ in xrange(10000):
             try:
-                HTTPServer.__init__(self, ("127.0.0.1", self.port), VideoRequestHandler)
+                self.listening_port = reactor.listenTCP(self.port, site, interface="127.0.0.1")
                 self._logger.debug("Listening at %d", self.port)
                 break
-            except socket.error:
+            except CannotListenError:
                 self._logger.debug("Listening failed at %d", self.port)
                 self.port += 1
-                continue
-
-        self.server_thread = None
-
-        self.daemon_threads = True
-        self.allow_reuse_address = True
-
-    def get_vod_download(self):
-        """
-        Return the current Video-On-Demand download that is being requested.
-        """
-        return self.vod_download
-
-    def set_vod_download(self, new_download):
-        """
-        Set a new Video-On-Demand download. Set the mode of old download to normal and close the file stream of
-        the old download.
-        """
-        if self.vod_download:
-            self.vod_download.set_mode(DLMODE_NORMAL)
-            vi_dict = self.vod_info.pop(self.vod_download.get_def().get_infohash(), None)
-            if vi_dict and 'stream' in vi_dict:
-                vi_dict['stream'][0].close()
-
-        self.vod_download = new_download
-
-    def get_vod_stream(self, dl_hash, wait=False):
-        if 'stream' not in self.vod_info[dl_hash] and self.session.get_download(dl_hash):
-            download = self.session.get_download(dl_hash)
-            vod_filename = self.get_vod_destination(download)
-            while wait and not os.path.exists(vod_filename):
-                time.sleep(1)
-            self.vod_info[dl_hash]['stream'] = (VODFile(open(vod_filename, 'rb'), download), RLock())
-
-        if 'stream' in self.vod_info[dl_hash]:
-            return self.vod_info[dl_hash]['stream']
-        return None, None
 
     @staticmethod
     def get_vod_destination(download):
@@ -92,151 +64,255 @@ class VideoServer(ThreadingMixIn, HTTPServer):
         else:
             return download.get_content_dest()
 
-    def start(self):
-        self.server_thread = Thread(target=self.serve_forever, name="VideoHTTPServerThread-1")
-        self.server_thread.setDaemon(True)
-        self.server_thread.start()
+    def start_vod(self, download, fileindex):
+        """
+        Put a download in VOD mode for the file with the given index, unless we are streaming that file already.
+        :return: a deferred that fires when the download is ready for streaming.
+        """
+        infohash = download.get_def().get_infohash()
 
-    def process_request_thread(self, request, client_address):
-        try:
-            self.finish_request(request, client_address)
-            self.close_request(request)
-        except socket.error:
-            pass
-        except Exception:
-            print_exc()
+        def on_handle(_):
+            if self.vod_downloads.get(infohash) != fileindex or download.get_mode() != DLMODE_VOD:
+                self.vod_downloads[infohash] = fileindex
+
+                # Put download in sequential mode + trigger initial buffering.
+                if download.get_def().is_multifile_torrent():
+                    if infohash not in self.vod_selected_files:
+                        self.vod_selected_files[infohash] = download.get_selected_files()
+                    download.set_selected_files([download.get_def().get_files_with_length()[fileindex][0]])
+                download.set_mode(DLMODE_VOD)
+                download.restart()
+            return download
+
+        return download.get_handle().addCallback(on_handle)
+
+    def stop_vod(self, download):
+        """
+        Put a download that we were streaming back in normal mode, and restore the files it had selected before.
+        """
+        infohash = download.get_def().get_infohash()
+        if infohash not in self.vod_downloads:
+            return
+
+        del self.vod_downloads[infohash]
+        selected_files = self.vod_selected_files.pop(infohash, None)
+        download.set_mode(DLMODE_NORMAL)
+        if selected_files is not None:
+            download.set_selected_files(selected_files)
+        download.restart()
+
+    def is_streaming_other_file(self, download, fileindex):
+        """
+        Check whether we are streaming another file of the download, as a download can only stream one file at a time.
+        """
+        infohash = download.get_def().get_infohash()
+        return any(stream.fileindex != fileindex for stream in self.streams
+                   if stream.download.get_def().get_infohash() == infohash)
+
+    def add_stream(self, stream):
+        # We only need to know about finished pieces while we are streaming
+        if not self.streams and self.session.lm.ltmgr:
+            self.session.lm.ltmgr.set_piece_alerts_enabled(True)
+        self.streams.add(stream)
+
+    def remove_stream(self, stream):
+        self.streams.discard(stream)
+        if not self.streams and self.session.lm.ltmgr:
+            self.session.lm.ltmgr.set_piece_alerts_enabled(False)
+
+        # Once the last stream of a download is closed, the download no longer needs to be in VOD mode
+        infohash = stream.download.get_def().get_infohash()
+        if not any(other.download.get_def().get_infohash() == infohash for other in self.streams):
+            self.stop_vod(stream.download)
 
     def shutdown_server(self):
         """
-        Shutdown the video HTTP server.
+        Shutdown the video HTTP server. Returns a deferred that fires when the server has stopped listening.
         """
-        self.shutdown()
-        self.server_close()
-        self.set_vod_download(None)
+        for stream in list(self.streams):
+            stream.stopProducing()
 
+        for infohash in self.vod_downloads:
+            download = self.session.get_download(infohash)
+            if download:
+                download.set_mode(DLMODE_NORMAL)
+        self.vod_downloads = {}
+        self.vod_selected_files = {}
 
-class VideoRequestHandler(BaseHTTPRequestHandler):
+        return maybeDeferred(self.listening_port.stopListening) if self.listening_port else succeed(None)
 
-    def __init__(self, request, client_address, video_server):
-        self._logger = logging.getLogger(self.__class__.__name__)
-        self.event = None
-        self.video_server = video_server
-        BaseHTTPRequestHandler.__init__(self, request, client_address, video_server)
 
-    def log_message(self, f, *args):
-        pass
+class VideoResource(resource.Resource):
+    """
+    This resource serves the files of downloads at /<hex infohash>/<file index>, with support for range requests.
+    """
+    isLeaf = True
 
-    def do_GET(self):
-        if self.request_version == 'HTTP/1.1':
-            self.protocol_version = 'HTTP/1.1'
+    def __init__(self, video_server):
+        resource.Resource.__init__(self)
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.video_server = video_server
 
-        self._logger.debug("VOD request %s %s", self.client_address, self.path)
-        downloadhash, fileindex = self.path.strip('/').split('/')
-        downloadhash = unhexlify(downloadhash)
-        download = self.server.session.get_download(downloadhash)
+    def render_GET(self, request):
+        self._logger.debug("VOD request %s %s", request.getClientIP(), request.path)
+        try:
+            downloadhash, fileindex = request.path.strip('/').split('/')
+            download = self.video_server.session.get_download(unhexlify(downloadhash))
+        except (TypeError, ValueError):
+            download = None
 
-        if not download or not fileindex.isdigit() or int(fileindex) > len(download.get_def().get_files()):
-            self.send_error(404, "Not Found")
-            return
+        if not download or not fileindex.isdigit() or int(fileindex) >= len(download.get_def().get_files()):
+            request.setResponseCode(http.NOT_FOUND)
+            return "Not Found"
 
         fileindex = int(fileindex)
+        if self.video_server.is_streaming_other_file(download, fileindex):
+            request.setResponseCode(http.CONFLICT)
+            return "Another file of this download is being streamed"
+
         filename, length = download.get_def().get_files_with_length()[fileindex]
 
-        requested_range = get_ranges(self.headers.getheader('range'), length)
+        requested_range = get_ranges(request.getHeader('range'), length)
         if requested_range is not None and len(requested_range) != 1:
-            self.send_error(416, "Requested Range Not Satisfiable")
-            return
-
-        has_changed = self.video_server.vod_fileindex != fileindex or\
-            self.video_server.get_vod_download() != download
-        if has_changed:
-            self.video_server.vod_fileindex = fileindex
-            self.video_server.set_vod_download(download)
-
-            # Put download in sequential mode + trigger initial buffering.
-            self.wait_for_handle(download)
-            if download.get_def().is_multifile_torrent():
-                download.set_selected_files([filename])
-            download.set_mode(DLMODE_VOD)
-            download.restart()
-
-        piecelen = download.get_def().get_piece_length()
-        blocksize = piecelen
+            request.setResponseCode(http.REQUESTED_RANGE_NOT_SATISFIABLE)
+            request.setHeader('Content-Range', 'bytes */%d' % length)
+            return "Requested Range Not Satisfiable"
 
         if requested_range is not None:
             firstbyte, lastbyte = requested_range[0]
-            nbytes2send = lastbyte - firstbyte
-            self.send_response(206)
-            self.send_header('Content-Range', 'bytes %d-%d/%d' % (firstbyte, lastbyte - 1, length))
+            request.setResponseCode(http.PARTIAL_CONTENT)
+            request.setHeader('Content-Range', 'bytes %d-%d/%d' % (firstbyte, lastbyte - 1, length))
         else:
-            firstbyte = 0
-            nbytes2send = length
-            self.send_response(200)
+            firstbyte, lastbyte = 0, length
 
-        self._logger.debug("requested range %d - %d", firstbyte, firstbyte + nbytes2send)
+        self._logger.debug("requested range %d - %d", firstbyte, lastbyte)
 
         mimetype = mimetypes.guess_type(filename)[0]
         if mimetype:
-            self.send_header('Content-Type', mimetype)
-        self.send_header('Accept-Ranges', 'bytes')
+            request.setHeader('Content-Type', mimetype)
+        request.setHeader('Accept-Ranges', 'bytes')
+        request.setHeader('Content-Length', str(lastbyte - firstbyte))
 
-        if length is not None:
-            self.send_header('Content-Length', nbytes2send)
-        else:
-            self.send_header('Transfer-Encoding', 'chunked')
+        VideoStream(self.video_server, request, download, fileindex, firstbyte, lastbyte).start()
+        return server.NOT_DONE_YET
 
-        if self.request_version == 'HTTP/1.1' and self.headers.get('Connection', '').lower() != 'close':
-            self.send_header('Connection', 'Keep-Alive')
-            self.send_header('Keep-Alive', 'timeout=300, max=1')
 
-        self.end_headers()
+@implementer(IPushProducer)
+class VideoStream(object):
+    """
+    Writes a byte range of a file in a download to a HTTP request. The data of a piece is written as soon as we have
+    the piece, and writing pauses while the client is not reading.
+    """
 
-        if has_changed:
-            self.wait_for_buffer(download)
+    def __init__(self, video_server, request, download, fileindex, firstbyte, lastbyte):
+        self._logger = logging.getLogger(self.__class__.__name__)
 
-        stream, lock = self.video_server.get_vod_stream(downloadhash, wait=True)
+        self.video_server = video_server
+        self.request = request
+        self.download = download
+        self.fileindex = fileindex
+        self.position = firstbyte
+        self.lastbyte = lastbyte  # Exclusive
+        self.file = None
+        self.piece_scheduler = None
+        self.waiting_deferred = None  # The deferred that we are waiting for before we can continue writing
+        self.paused = False
+        self.stopped = False
 
-        with lock:
-            if stream.closed:
+    def start(self):
+        self.video_server.add_stream(self)
+        self.request.notifyFinish().addBoth(lambda _: self.stopProducing())
+        self.request.registerProducer(self, True)
+
+        self.waiting_deferred = self.video_server.start_vod(self.download, self.fileindex)
+        self.waiting_deferred.addCallbacks(self.on_vod_started, self.on_wait_cancelled)
+
+    def on_vod_started(self, _):
+        self.waiting_deferred = None
+        if self.download.vod_seekpos is None or abs(self.position - self.download.vod_seekpos) < 1024 * 1024:
+            self.download.vod_seekpos = self.position
+        # Every stream schedules the pieces after its own position, so streams of the same file do not interfere
+        self.piece_scheduler = PieceScheduler(self.download, self.fileindex)
+        self.resumeProducing()
+
+    def on_piece_finished(self, _):
+        self.waiting_deferred = None
+        if not self.paused:
+            self.write_pieces()
+
+    def on_wait_cancelled(self, failure):
+        failure.trap(CancelledError)
+
+    def write_pieces(self):
+        """
+        Write the requested data until the client is busy, or until we have to wait for the next piece.
+        """
+        torrent_info = get_info_from_handle(self.download.handle)
+        if not torrent_info:
+            self.finish()
+            return
+
+        while not self.paused and not self.stopped and self.position < self.lastbyte:
+            # Let the scheduler know where we are, so it can request the pieces after this position in time
+            self.piece_scheduler.set_position(self.position)
+
+            peer_request = torrent_info.map_file(self.fileindex, self.position, 0)
+            piece_deferred = self.download.wait_for_piece(peer_request.piece)
+            if not piece_deferred.called:
+                self.waiting_deferred = piece_deferred
+                piece_deferred.addCallbacks(self.on_piece_finished, self.on_wait_cancelled)
                 return
 
-            stream.seek(firstbyte)
-            nbyteswritten = 0
-            while True:
-                data = stream.read(blocksize)
-
-                if len(data) == 0:
-                    break
-                elif length is not None and nbyteswritten + len(data) > nbytes2send:
-                    endlen = nbytes2send - nbyteswritten
-                    if endlen != 0:
-                        self.wfile.write(data[:endlen])
-                        nbyteswritten += endlen
-                    break
-                else:
-                    self.wfile.write(data)
-                    nbyteswritten += len(data)
-
-            if nbyteswritten != nbytes2send:
-                self._logger.error("sent wrong amount, wanted %s got %s", nbytes2send, nbyteswritten)
-
-            if not requested_range:
-                stream.close()
-
-    def wait_for_handle(self, download):
-        # TODO(Martijn): Ugly time.sleep required, should be refactored when we Twistify the video server
-        while not (download.handle and download.handle.is_valid()):
-            time.sleep(1)
-
-    def wait_for_buffer(self, download):
-        self.event = Event()
-
-        def wait_for_buffer(ds):
-            if download.vod_seekpos is None or download != self.video_server.get_vod_download()\
-                    or ds.get_vod_prebuffering_progress() == 1.0:
-                self.event.set()
-                return 0
-            return 1.0
-        download.set_state_callback(wait_for_buffer)
-        self.event.wait()
-        self.event.clear()
+            # Write the remainder of the piece in one go
+            nbytes = min(torrent_info.piece_length() - peer_request.start, self.lastbyte - self.position)
+            data = self.read(nbytes)
+            if not data:
+                break
+
+            oldpos = self.position
+            self.position += len(data)
+            if self.download.vod_seekpos == oldpos:
+                self.download.vod_seekpos = self.position
+            self.request.write(data)
+
+        if not self.stopped and (self.position >= self.lastbyte or not self.paused):
+            if self.position != self.lastbyte:
+                self._logger.error("sent wrong amount, wanted %s got %s", self.lastbyte, self.position)
+            self.finish()
+
+    def read(self, nbytes):
+        try:
+            if self.file is None:
+                self.file = open(VideoServer.get_vod_destination(self.download), 'rb')
+            self.file.seek(self.position)
+            return self.file.read(nbytes)
+        except IOError as e:
+            self._logger.error("Could not read from VOD file: %s", e)
+            return ''
+
+    def finish(self):
+        self.request.unregisterProducer()
+        self.request.finish()
+        self.stopProducing()
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        if self.waiting_deferred is None and not self.stopped:
+            self.write_pieces()
+
+    def stopProducing(self):
+        if self.stopped:
+            return
+        self.stopped = True
+
+        if self.waiting_deferred:
+            self.waiting_deferred.cancel()
+            self.waiting_deferred = None
+        if self.file:
+            self.file.close()
+        if self.piece_scheduler:
+            self.piece_scheduler.clear_window()
+        self.video_server.remove_stream(self)
@@ -65,6 +65,13 @@ class SaveResumeDataError(TriblerException):
     pass
 
 
+class DownloadHopsUpdateError(TriblerException):
+    """The hop count of some of the downloads could not be updated."""
+    def __init__(self, infohashes):
+        TriblerException.__init__(self, "Could not update the hop count of download(s) %s" % ", ".join(infohashes))
+        self.infohashes = infohashes
+
+
 class DuplicateDownloadException(TriblerException):
     """
     The Download already exists in the Session, i.e., a Download for
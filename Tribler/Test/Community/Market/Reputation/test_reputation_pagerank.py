@@ -1,6 +1,7 @@
 from Tribler.Test.Community.Market.Reputation.test_reputation_base import TestReputationBase
 from Tribler.community.market.core.assetamount import AssetAmount
 from Tribler.community.market.core.assetpair import AssetPair
+from Tribler.community.market.reputation.temporal_pagerank_manager import TemporalPagerankReputationManager
 
 
 class TestReputationPagerank(TestReputationBase):
@@ -63,3 +64,22 @@ class TestReputationPagerank(TestReputationBase):
         rep_dict = self.compute_reputations()
         self.assertTrue(b'c' in rep_dict)
         self.assertTrue(b'd' in rep_dict)
+
+    def test_pagerank_incremental(self):
+        """
+        Test whether adding blocks to an existing computation gives the same scores as computing them from scratch
+        """
+        self.insert_transaction(b'a', b'b', AssetPair(AssetAmount(1, 'BTC'), AssetAmount(1, 'MB')))
+        self.insert_transaction(b'b', b'c', AssetPair(AssetAmount(2, 'BTC'), AssetAmount(2, 'MB')))
+        rep_manager = TemporalPagerankReputationManager(self.market_db.get_all_blocks())
+        rep_manager.compute(own_public_key=b'a')
+
+        self.insert_transaction(b'c', b'a', AssetPair(AssetAmount(3, 'BTC'), AssetAmount(3, 'MB')))
+        self.insert_transaction(b'a', b'd', AssetPair(AssetAmount(4, 'BTC'), AssetAmount(4, 'MB')))
+        rep_manager.add_blocks(self.market_db.get_all_blocks())
+        rep_dict = rep_manager.compute(own_public_key=b'a')
+
+        expected_rep_dict = self.compute_reputations()
+        self.assertEqual(set(rep_dict), set(expected_rep_dict))
+        for public_key, rep in rep_dict.items():
+            self.assertAlmostEqual(rep, expected_rep_dict[public_key], places=4)
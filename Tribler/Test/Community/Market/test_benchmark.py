@@ -0,0 +1,43 @@
+from __future__ import absolute_import
+
+import unittest
+
+from Tribler.community.market.benchmark import Options, format_results, parse_asset_pairs, run_benchmark
+
+
+class MarketBenchmarkTestSuite(unittest.TestCase):
+    """Market benchmark test cases."""
+
+    def test_parse_asset_pairs(self):
+        """
+        Test parsing asset pairs, which are put in alphabetical order
+        """
+        self.assertEqual(parse_asset_pairs("BTC/MB, MB/DUM1"), [("BTC", "MB"), ("DUM1", "MB")])
+        self.assertRaises(ValueError, parse_asset_pairs, "BTC")
+
+    def test_options(self):
+        """
+        Test parsing the options of the benchmark
+        """
+        options = Options()
+        options.parseOptions(["--asset-pairs", "BTC/MB,DUM1/DUM2", "--cancel-rate", "0.5"])
+        self.assertEqual(options["asset-pairs"], [("BTC", "MB"), ("DUM1", "DUM2")])
+        self.assertEqual(options["cancel-rate"], 0.5)
+
+    def test_run_benchmark(self):
+        """
+        Test running a small benchmark, which should be reproducible with the same seed
+        """
+        results = run_benchmark(num_orders=500, asset_pairs=[("BTC", "MB"), ("DUM1", "DUM2")], cancel_rate=0.2,
+                                num_traders=10, seed=1)
+        self.assertEqual(results["insert"]["count"], 500)
+        self.assertEqual(results["match"]["count"], 500)
+        self.assertGreater(results["cancel"]["count"], 0)
+        self.assertGreater(results["matches"], 0)
+        self.assertLessEqual(results["insert"]["p50"], results["insert"]["p99"])
+        self.assertIn("insert", format_results(results))
+
+        other_results = run_benchmark(num_orders=500, asset_pairs=[("BTC", "MB"), ("DUM1", "DUM2")],
+                                      cancel_rate=0.2, num_traders=10, seed=1)
+        for key in ("matches", "traded_quantity", "ticks_in_book"):
+            self.assertEqual(results[key], other_results[key])
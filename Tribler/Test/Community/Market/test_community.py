@@ -2,7 +2,7 @@ from __future__ import absolute_import
 
 from nose.tools import raises
 
-from twisted.internet.defer import fail, inlineCallbacks
+from twisted.internet.defer import fail, inlineCallbacks, returnValue
 from twisted.python.failure import Failure
 
 from Tribler.Core.Modules.wallet.dummy_wallet import DummyWallet1, DummyWallet2
@@ -19,6 +19,7 @@ from Tribler.community.market.core.tick import Ask, Bid
 from Tribler.community.market.core.timeout import Timeout
 from Tribler.community.market.core.timestamp import Timestamp
 from Tribler.community.market.core.transaction import Transaction, TransactionId, TransactionNumber
+from Tribler.community.market.payload import MatchPayload
 from Tribler.pyipv8.ipv8.test.base import TestBase
 from Tribler.pyipv8.ipv8.test.mocking.ipv8 import MockIPv8
 
@@ -158,8 +159,9 @@ class TestMarketCommunity(TestMarketCommunityBase):
 
         yield self.sleep(0.5)  # Give it some time to complete the trade
 
-        # Compute reputation
+        # Compute reputation, from the tx_done blocks that we have received
         self.nodes[0].overlay.compute_reputation()
+        self.assertTrue(self.nodes[0].overlay.reputation_dict)
 
         # Verify that the trade has been made
         self.assertTrue(list(self.nodes[0].overlay.transaction_manager.find_all()))
@@ -328,6 +330,22 @@ class TestMarketCommunity(TestMarketCommunityBase):
         self.assertTrue(self.nodes[4].overlay.order_book.get_tick(ask_order.order_id))
         self.assertTrue(self.nodes[4].overlay.order_book.get_tick(bid_order.order_id))
 
+    @trial_timeout(4)
+    @inlineCallbacks
+    def test_orderbook_sync_expire(self):
+        """
+        Test whether the order book sync state is kept per peer and forgotten after the full sync interval
+        """
+        matchmaker = self.nodes[2].overlay
+        matchmaker.orderbook_sync_versions[b'a' * 20] = (0, 0)
+
+        self.add_node_to_experiment(self.create_node())
+        self.nodes[3].overlay.send_orderbook_sync(matchmaker.my_peer)
+        yield self.deliver_messages(timeout=.5)
+
+        self.assertEqual(list(matchmaker.orderbook_sync_versions.keys()), [self.nodes[3].overlay.my_peer.mid])
+
+
     @trial_timeout(4)
     @inlineCallbacks
     def test_partial_trade(self):
@@ -529,6 +547,81 @@ class TestMarketCommunitySingle(TestMarketCommunityBase):
         self.assertEqual(len(self.nodes[0].overlay.order_book.asks), 0)
         self.assertEqual(len(self.nodes[0].overlay.order_book.bids), 0)
 
+    @inlineCallbacks
+    def queue_match(self):
+        """
+        Create an order of which all quantity is reserved, and let it receive a match that gets queued
+        """
+        order = yield self.nodes[0].overlay.create_ask(AssetPair(AssetAmount(10, 'DUM1'),
+                                                                 AssetAmount(10, 'DUM2')), 3600)
+        other_trader_id = TraderId(b'1' * 40)
+        order.reserve_quantity_for_tick(OrderId(other_trader_id, OrderNumber(1)), 10)
+
+        payload = MatchPayload(other_trader_id, Timestamp.now(), OrderNumber(2),
+                               AssetPair(AssetAmount(10, 'DUM1'), AssetAmount(10, 'DUM2')), Timeout(3600), 0,
+                               order.order_id.order_number, 10, other_trader_id, TraderId(b'2' * 40), 'a' * 20)
+        self.nodes[0].overlay.process_match_payload(payload)
+        self.assertEqual(len(self.nodes[0].overlay.queued_matches[order.order_id]), 1)
+        returnValue((order, payload))
+
+    @inlineCallbacks
+    def test_queue_match(self):
+        """
+        Test whether a match is queued when all quantity of our order is reserved, and declined when the order is
+        cancelled
+        """
+        order, payload = yield self.queue_match()
+
+        declined_match_ids = []
+        self.nodes[0].overlay.send_decline_match_message = lambda match_id, *_: declined_match_ids.append(match_id)
+        yield self.nodes[0].overlay.cancel_order(order.order_id)
+        self.assertEqual(declined_match_ids, [payload.match_id])
+        self.assertFalse(self.nodes[0].overlay.queued_matches)
+
+    @inlineCallbacks
+    def test_queued_match_timeout(self):
+        """
+        Test whether a queued match is declined when the quantity of our order is not released in time
+        """
+        self.nodes[0].overlay.QUEUED_MATCH_TIMEOUT = 0.1
+        order, payload = yield self.queue_match()
+
+        declined_match_ids = []
+        self.nodes[0].overlay.send_decline_match_message = lambda match_id, *_: declined_match_ids.append(match_id)
+        yield self.sleep(0.2)
+        self.assertEqual(declined_match_ids, [payload.match_id])
+        self.assertNotIn(order.order_id, self.nodes[0].overlay.queued_matches)
+
+    @inlineCallbacks
+    def test_queue_match_duplicate(self):
+        """
+        Test whether we ignore a match that is queued already
+        """
+        order, payload = yield self.queue_match()
+
+        declined_match_ids = []
+        self.nodes[0].overlay.send_decline_match_message = lambda match_id, *_: declined_match_ids.append(match_id)
+        self.nodes[0].overlay.process_match_payload(payload)
+        self.assertEqual(len(self.nodes[0].overlay.queued_matches[order.order_id]), 1)
+        self.assertFalse(declined_match_ids)
+
+    @inlineCallbacks
+    def test_requeued_match_timeout(self):
+        """
+        Test whether a match that is queued again keeps its original expiry time
+        """
+        self.nodes[0].overlay.QUEUED_MATCH_TIMEOUT = 0.3
+        order, payload = yield self.queue_match()
+
+        declined_match_ids = []
+        self.nodes[0].overlay.send_decline_match_message = lambda match_id, *_: declined_match_ids.append(match_id)
+        yield self.sleep(0.2)
+        # All quantity of the order is still reserved, so the match is queued again
+        self.nodes[0].overlay.process_queued_matches(order.order_id)
+        self.assertEqual(len(self.nodes[0].overlay.queued_matches[order.order_id]), 1)
+        yield self.sleep(0.2)
+        self.assertEqual(declined_match_ids, [payload.match_id])
+
     @raises(RuntimeError)
     def test_order_invalid_timeout(self):
         """
@@ -60,6 +60,16 @@ class TestDatabase(AbstractServer):
         orders = self.database.get_all_orders()
         self.assertEqual(len(orders), 2)
 
+    def test_get_all_orders_reserved_ticks(self):
+        """
+        Test whether the reserved ticks of the orders are retrieved together with the orders
+        """
+        self.database.add_order(self.order1)
+        self.database.add_order(self.order2)
+        orders = {order.order_id: order for order in self.database.get_all_orders()}
+        self.assertFalse(orders[self.order_id1].reserved_ticks)
+        self.assertEqual(orders[self.order_id2].reserved_ticks, {OrderId(TraderId(b'3'), OrderNumber(4)): 3})
+
     def test_get_specific_order(self):
         """
         Test the retrieval of a specific order
@@ -177,6 +187,19 @@ class TestDatabase(AbstractServer):
         self.database.delete_all_ticks()
         self.assertEqual(len(self.database.get_ticks()), 0)
 
+    def test_add_delete_ticks(self):
+        """
+        Test the addition and deletion of multiple ticks at once
+        """
+        ask = Tick.from_order(self.order1)
+        bid = Tick.from_order(self.order2)
+        self.database.add_ticks([ask, bid])
+        self.database.add_ticks([ask])
+        self.assertEqual(len(self.database.get_ticks()), 2)
+
+        self.database.delete_ticks([ask.order_id])
+        self.assertEqual([tick.order_id for tick in self.database.get_ticks()], [bid.order_id])
+
     def test_add_get_trader_identity(self):
         """
         Test the addition and retrieval of a trader identity in the database
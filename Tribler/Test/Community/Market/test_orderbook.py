@@ -1,8 +1,11 @@
 from __future__ import absolute_import
 
 import os
+import time
 
+from twisted.internet import reactor
 from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import deferLater
 
 from Tribler.Test.test_as_server import AbstractServer
 from Tribler.Test.tools import trial_timeout
@@ -10,12 +13,14 @@ from Tribler.community.market.core.assetamount import AssetAmount
 from Tribler.community.market.core.assetpair import AssetPair
 from Tribler.community.market.core.message import TraderId
 from Tribler.community.market.core.order import OrderId, OrderNumber
-from Tribler.community.market.core.orderbook import OrderBook
+from Tribler.community.market.core.orderbook import DatabaseOrderBook, ORDER_IDS_BLOOMFILTER_MIN_SLACK, OrderBook, \
+    TICK_TIMEOUT_INTERVAL
 from Tribler.community.market.core.price import Price
 from Tribler.community.market.core.tick import Ask, Bid
 from Tribler.community.market.core.timeout import Timeout
 from Tribler.community.market.core.timestamp import Timestamp
 from Tribler.community.market.core.trade import Trade
+from Tribler.community.market.database import MarketDB
 
 
 class AbstractTestOrderBook(AbstractServer):
@@ -66,6 +71,41 @@ class TestOrderBook(AbstractTestOrderBook):
 
         self.order_book.on_invalid_tick_insert(None)
 
+    @trial_timeout(10)
+    @inlineCallbacks
+    def test_check_tick_timeouts(self):
+        """
+        Test whether ticks are removed from the order book when they time out, unless they have been removed earlier
+        """
+        ask = Ask(OrderId(TraderId(b'0'), OrderNumber(1)), AssetPair(AssetAmount(100, 'BTC'), AssetAmount(30, 'MB')),
+                  Timeout(100), Timestamp(time.time() - 99.5))
+        timed_out_ticks = []
+        self.order_book.insert_ask(ask).addCallback(timed_out_ticks.append)
+        self.order_book.insert_bid(self.bid).addCallback(timed_out_ticks.append)
+        self.order_book.remove_tick(self.bid.order_id)
+        self.assertEqual(timed_out_ticks, [None])
+
+        self.order_book.check_tick_timeouts()
+        self.assertTrue(self.order_book.tick_exists(ask.order_id))
+
+        yield deferLater(reactor, TICK_TIMEOUT_INTERVAL + 0.1, lambda: None)
+        self.assertFalse(self.order_book.tick_exists(ask.order_id))
+        self.assertEqual(timed_out_ticks, [None, ask])
+
+    def test_compact_tick_timeouts(self):
+        """
+        Test whether the timeouts of removed ticks are removed from the heap once they make up more than half of it
+        """
+        self.order_book.insert_ask(self.ask)
+        self.order_book.insert_ask(self.ask2)
+        self.order_book.insert_bid(self.bid)
+        self.order_book.remove_tick(self.ask.order_id)
+        self.assertEqual(len(self.order_book._tick_timeouts), 3)
+
+        self.order_book.remove_tick(self.ask2.order_id)
+        self.assertEqual([entry[2] for entry in self.order_book._tick_timeouts], [self.bid.order_id])
+        self.assertEqual(self.order_book._stale_tick_timeouts, 0)
+
     def test_ask_insertion(self):
         # Test for ask insertion
         self.order_book.insert_ask(self.ask2)
@@ -153,6 +193,70 @@ class TestOrderBook(AbstractTestOrderBook):
         self.assertEquals([(Price(0.1, 'MB', 'BTC'), 300), (Price(0.15, 'MB', 'BTC'), 200)],
                           self.order_book.get_bid_side_depth_profile('MB', 'BTC'))
 
+    def test_get_crossing_tick_entries(self):
+        """
+        Test whether we only get the tick entries on the other side that cross the price of a tick
+        """
+        self.order_book.insert_bid(self.bid)
+        self.order_book.insert_bid(self.bid2)
+        self.assertFalse(self.order_book.get_crossing_tick_entries(self.ask))
+        self.assertEqual([tick_entry.order_id for tick_entry in self.order_book.get_crossing_tick_entries(self.ask2)],
+                         [self.bid.order_id, self.bid2.order_id])
+
+        self.order_book.insert_ask(self.ask)
+        self.order_book.insert_ask(self.ask2)
+        self.assertEqual([tick_entry.order_id for tick_entry in self.order_book.get_crossing_tick_entries(self.bid2)],
+                         [self.ask2.order_id])
+
+    def test_get_order_ids_since(self):
+        """
+        Test whether we get the IDs of the orders that have been inserted after a version of the order book
+        """
+        self.order_book.insert_ask(self.ask)
+        version = self.order_book.version
+        self.order_book.insert_ask(self.ask2)
+        self.order_book.insert_bid(self.bid)
+        self.assertEqual(set(self.order_book.get_order_ids_since(version)), {self.ask2.order_id, self.bid.order_id})
+
+        self.order_book.remove_tick(self.bid.order_id)
+        self.assertEqual(self.order_book.get_order_ids_since(version), [self.ask2.order_id])
+        self.assertFalse(self.order_book.get_order_ids_since(self.order_book.version))
+
+    def test_get_order_ids_bloomfilter(self):
+        """
+        Test whether the bloom filter with the order ids is kept up to date
+        """
+        self.order_book.insert_ask(self.ask)
+        bloomfilter = self.order_book.get_order_ids_bloomfilter()
+        self.assertIn(str(self.ask.order_id), bloomfilter)
+
+        self.order_book.insert_bid(self.bid)
+        self.assertIs(self.order_book.get_order_ids_bloomfilter(), bloomfilter)
+        self.assertIn(str(self.bid.order_id), bloomfilter)
+
+        # The filter is rebuilt when it contains too many removed orders
+        self.order_book.remove_tick(self.ask.order_id)
+        self.order_book.remove_tick(self.bid.order_id)
+        self.assertNotIn(str(self.ask.order_id), self.order_book.get_order_ids_bloomfilter())
+
+    def test_get_order_ids_bloomfilter_full(self):
+        """
+        Test whether the bloom filter with the order ids is rebuilt when it is full
+        """
+        self.order_book.insert_ask(self.ask)
+        bloomfilter = self.order_book.get_order_ids_bloomfilter()
+        self.assertEqual(self.order_book._order_ids_bloomfilter_capacity, 1 + ORDER_IDS_BLOOMFILTER_MIN_SLACK)
+
+        for order_number in range(ORDER_IDS_BLOOMFILTER_MIN_SLACK):
+            self.order_book.insert_bid(Bid(OrderId(TraderId(b'4'), OrderNumber(order_number)),
+                                           AssetPair(AssetAmount(30, 'BTC'), AssetAmount(30, 'MB')),
+                                           Timeout(100), Timestamp.now()))
+        self.assertIs(self.order_book.get_order_ids_bloomfilter(), bloomfilter)
+
+        self.order_book.insert_bid(self.bid)
+        self.assertIsNot(self.order_book.get_order_ids_bloomfilter(), bloomfilter)
+        self.assertIn(str(self.bid.order_id), self.order_book.get_order_ids_bloomfilter())
+
     def test_remove_tick(self):
         # Test for tick removal
         self.order_book.insert_ask(self.ask2)
@@ -219,3 +323,48 @@ class TestOrderBook(AbstractTestOrderBook):
                           '200 BTC\t@\t0.15 MB (R: 0)\n\n'
                           '------ Asks -------\n'
                           '100 BTC\t@\t0.3 MB (R: 0)\n\n', str(self.order_book))
+
+
+class TestDatabaseOrderBook(AbstractTestOrderBook):
+    """DatabaseOrderBook test cases."""
+
+    @inlineCallbacks
+    def setUp(self):
+        yield super(TestDatabaseOrderBook, self).setUp()
+        os.makedirs(os.path.join(self.getStateDir(), 'sqlite'))
+        self.database = MarketDB(self.getStateDir(), 'market')
+        self.order_book.shutdown_task_manager()
+        self.order_book = DatabaseOrderBook(self.database)
+
+    def tearDown(self):
+        self.database.close()
+        return super(TestDatabaseOrderBook, self).tearDown()
+
+    def test_save_to_database(self):
+        """
+        Test whether only the changed ticks are written to the database
+        """
+        self.order_book.insert_ask(self.ask)
+        self.order_book.insert_bid(self.bid)
+        self.order_book.save_to_database()
+        self.assertEqual(len(self.database.get_ticks()), 2)
+        self.assertFalse(self.order_book.dirty_order_ids)
+
+        self.order_book.remove_tick(self.ask.order_id)
+        self.order_book.insert_bid(self.bid2)
+        self.assertEqual(self.order_book.dirty_order_ids, {self.bid2.order_id})
+        self.order_book.save_to_database()
+        self.assertEqual({tick.order_id for tick in self.database.get_ticks()}, {self.bid.order_id, self.bid2.order_id})
+
+    def test_restore_from_database(self):
+        """
+        Test whether the ticks are restored from the database
+        """
+        timed_out_bid = Bid(OrderId(TraderId(b'2'), OrderNumber(2)),
+                            AssetPair(AssetAmount(100, 'BTC'), AssetAmount(30, 'MB')), Timeout(0), Timestamp(0.0))
+        self.database.add_ticks([self.ask, self.bid, timed_out_bid])
+        self.order_book.restore_from_database()
+        self.assertTrue(self.order_book.tick_exists(self.ask.order_id))
+        self.assertTrue(self.order_book.tick_exists(self.bid.order_id))
+        self.assertFalse(self.order_book.dirty_order_ids)
+        self.assertEqual(self.order_book.removed_order_ids, {timed_out_bid.order_id})
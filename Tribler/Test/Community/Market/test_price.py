@@ -1,4 +1,5 @@
 import unittest
+from fractions import Fraction
 
 from Tribler.community.market.core.price import Price
 
@@ -27,3 +28,23 @@ class TestPrice(unittest.TestCase):
         self.assertNotEqual(self.price1, self.price2)
         self.assertNotEqual(self.price1, 2)
         self.assertFalse(self.price1 == 2)
+
+    def test_hash(self):
+        """
+        Test whether prices that are equal have the same hash, also when they are expressed by different fractions
+        """
+        price = Price(Fraction(1, 3), 'MB', 'BTC')
+        other_price = Price(Fraction(2, 6), 'MB', 'BTC')
+        self.assertEqual(price, other_price)
+        self.assertEqual(hash(price), hash(other_price))
+        self.assertLess(other_price, Price(Fraction(1, 3) + Fraction(1, 10 ** 18), 'MB', 'BTC'))
+
+    def test_small_prices(self):
+        """
+        Test whether small prices, like a few satoshi per MB, are not rounded to the same price
+        """
+        price = Price(Fraction(1, 10 ** 8), 'BTC', 'MB')
+        other_price = Price(Fraction(2, 10 ** 8), 'BTC', 'MB')
+        self.assertNotEqual(price, other_price)
+        self.assertLess(price, other_price)
+        self.assertEqual(price.amount, 1e-8)
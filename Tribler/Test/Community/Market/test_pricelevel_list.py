@@ -100,3 +100,22 @@ class PriceLevelListTestSuite(unittest.TestCase):
     def test_items_reverse_empty(self):
         # Test for items when empty with reverse attribute
         self.assertEquals([], self.price_level_list2.items(reverse=True))
+
+    def test_insert_unsorted(self):
+        # Test whether the price levels are linked in the order of their price when inserted in any order
+        self.price_level_list2.insert(self.price_level3)
+        self.price_level_list2.insert(self.price_level)
+        self.price_level_list2.insert(self.price_level4)
+        self.price_level_list2.insert(self.price_level2)
+        self.assertEquals(
+            [self.price_level, self.price_level2, self.price_level3, self.price_level4], self.price_level_list2.items())
+        self.assertEquals(self.price_level3, self.price_level_list2.succ_item(self.price2))
+        self.assertEquals(self.price_level2, self.price_level_list2.prev_item(self.price3))
+
+    def test_succ_prev_item_after_remove(self):
+        # Test whether the neighbours of a removed price level are linked to each other
+        self.price_level_list.remove(self.price2)
+        self.assertEquals(self.price_level3, self.price_level_list.succ_item(self.price))
+        self.assertEquals(self.price_level, self.price_level_list.prev_item(self.price3))
+        with self.assertRaises(ValueError):
+            self.price_level_list.succ_item(self.price2)
@@ -74,3 +74,14 @@ class TickEntryTestSuite(AbstractServer):
         # Try to add it again - should be ignored
         self.tick_entry.block_for_matching(OrderId(TraderId(b"abc"), OrderNumber(3)))
         self.assertEqual(len(self.tick_entry._blocked_for_matching), 1)
+
+    def test_shutdown_unblocks(self):
+        """
+        Test whether the order ids that are blocked for matching are unblocked when the tick entry is shut down
+        """
+        order_id = OrderId(TraderId(b"abc"), OrderNumber(3))
+        self.tick_entry.block_for_matching(order_id)
+        self.assertTrue(self.tick_entry.is_blocked_for_matching(order_id))
+
+        self.tick_entry.shutdown_task_manager()
+        self.assertFalse(self.tick_entry.is_blocked_for_matching(order_id))
@@ -195,6 +195,12 @@ class TestTriblerConfig(TriblerCoreTest):
         self.assertEqual(self.tribler_config.get_libtorrent_max_download_rate(), True)
         self.tribler_config.set_libtorrent_dht_enabled(False)
         self.assertFalse(self.tribler_config.get_libtorrent_dht_enabled())
+        self.tribler_config.set_libtorrent_download_state_db_enabled(True)
+        self.assertTrue(self.tribler_config.get_libtorrent_download_state_db_enabled())
+        self.tribler_config.set_libtorrent_shared_metainfo_session_enabled(True)
+        self.assertTrue(self.tribler_config.get_libtorrent_shared_metainfo_session_enabled())
+        self.tribler_config.set_libtorrent_settings_profile('seedbox')
+        self.assertEqual(self.tribler_config.get_libtorrent_settings_profile(), 'seedbox')
 
     def test_get_set_methods_video_server(self):
         """
@@ -252,6 +252,7 @@ class TestLibtorrentDownloadImplNoSession(TriblerCoreTest):
         mock_handle.set_sequential_download = lambda _: None
         mock_handle.set_priority = lambda _: None
         mock_handle.prioritize_pieces = lambda _: None
+        mock_handle.piece_priority = lambda *_: None
 
         self.libtorrent_download_impl.handle = mock_handle
 
@@ -341,6 +342,93 @@ class TestLibtorrentDownloadImplNoSession(TriblerCoreTest):
         self.libtorrent_download_impl.set_share_mode(True)
         self.assertTrue(mocked_set_share_mode.called)
 
+    def test_get_peerlist(self):
+        """
+        Test whether the connected peers are returned as read-only records
+        """
+        peer_info = MockObject()
+        peer_info.pid = MockObject()
+        peer_info.pid.to_bytes = lambda: 'a' * 20
+        peer_info.client = 'Tribler 7.2'
+        peer_info.ip = ('1.2.3.4', 1234)
+        peer_info.flags = peer_info.seed = 1024
+        peer_info.local_connection = peer_info.remote_interested = peer_info.remote_choked = 0
+        peer_info.interesting = peer_info.choked = peer_info.upload_only = 0
+        peer_info.payload_up_speed = peer_info.payload_down_speed = peer_info.remote_dl_rate = 0
+        peer_info.upload_queue_length = peer_info.used_send_buffer = 0
+        peer_info.total_upload = peer_info.total_download = 0
+        peer_info.progress = 1.0
+        peer_info.pieces = [True]
+        peer_info.connection_type = 0
+        self.libtorrent_download_impl.handle.get_peer_info = lambda: [peer_info]
+
+        peer = self.libtorrent_download_impl.get_peerlist()[0]
+        self.assertEqual(peer['id'], binascii.hexlify('a' * 20))
+        self.assertEqual(peer['ip'], '1.2.3.4')
+        self.assertTrue(peer.get('seed'))
+        self.assertIsNone(peer.get('unknown'))
+        self.assertRaises(KeyError, lambda: peer['unknown'])
+        self.assertEqual(dict(peer)['completed'], 1.0)
+        self.assertRaises(AttributeError, setattr, peer, 'unknown', 1)
+
+    def test_get_state_cached(self):
+        """
+        Test whether the state of a download is shared until the next status update
+        """
+        self.libtorrent_download_impl.get_mode = lambda: 0
+        self.libtorrent_download_impl._stop_if_finished = lambda: None
+        state = self.libtorrent_download_impl.get_state()
+        self.assertIs(self.libtorrent_download_impl.get_state(), state)
+
+        self.libtorrent_download_impl.update_lt_status(MockObject())
+        self.assertIsNot(self.libtorrent_download_impl.get_state(), state)
+
+        state = self.libtorrent_download_impl.get_state()
+        self.libtorrent_download_impl.error = "error"
+        self.assertEqual(self.libtorrent_download_impl.get_state().get_error(), "error")
+
+    def test_wait_for_piece(self):
+        """
+        Test whether waiting for a piece fires when the piece is finished
+        """
+        self.libtorrent_download_impl.handle.have_piece = lambda piece: piece == 1
+        self.assertTrue(self.libtorrent_download_impl.wait_for_piece(1).called)
+
+        piece_deferred = self.libtorrent_download_impl.wait_for_piece(2)
+        cancelled_deferred = self.libtorrent_download_impl.wait_for_piece(2)
+        cancelled_deferred.addErrback(lambda _: None)
+        cancelled_deferred.cancel()
+        self.assertFalse(piece_deferred.called)
+        self.assertEqual(self.libtorrent_download_impl.deferreds_piece[2], [piece_deferred])
+
+        forgotten_deferred = self.libtorrent_download_impl.wait_for_piece(3)
+        forgotten_deferred.addErrback(lambda _: None)
+        forgotten_deferred.cancel()
+        self.assertNotIn(3, self.libtorrent_download_impl.deferreds_piece)
+
+        mock_alert = MockObject()
+        mock_alert.piece_index = 2
+        self.libtorrent_download_impl.on_piece_finished_alert(mock_alert)
+        self.assertTrue(piece_deferred.called)
+        self.assertFalse(self.libtorrent_download_impl.deferreds_piece)
+
+    def test_reset_piece_deadline(self):
+        """
+        Test whether the deadline of a piece is only removed once no stream needs it anymore
+        """
+        deadlines = {}
+        self.libtorrent_download_impl.handle.set_piece_deadline = deadlines.__setitem__
+        self.libtorrent_download_impl.handle.reset_piece_deadline = deadlines.pop
+
+        self.libtorrent_download_impl.set_piece_deadline(1, 0)
+        self.libtorrent_download_impl.set_piece_deadline(1, 100)
+        self.libtorrent_download_impl.reset_piece_deadline(1)
+        self.assertIn(1, deadlines)
+
+        self.libtorrent_download_impl.reset_piece_deadline(1)
+        self.assertNotIn(1, deadlines)
+        self.assertFalse(self.libtorrent_download_impl.piece_deadline_counts)
+
     def test_get_num_connected_seeds_peers(self):
         """
         Test whether connected peers and seeds are correctly returned
@@ -618,6 +706,34 @@ class TestLibtorrentDownloadImplNoSession(TriblerCoreTest):
         self.libtorrent_download_impl.handle.get_torrent_info().map_file = map_file
         self.assertEqual(self.libtorrent_download_impl.get_byte_progress([(0, 10, 270)], True), 0.5)
 
+    def test_set_byte_priority(self):
+        """
+        Testing whether only the changed priorities of the pieces we do not have are passed to libtorrent
+        """
+        def map_file(_dummy1, start_byte, _dummy2):
+            res = MockObject()
+            res.piece = int(start_byte / 250)
+            return res
+
+        torrent_info = self.libtorrent_download_impl.handle.get_torrent_info()
+        torrent_info.map_file = map_file
+        torrent_info.file_at(0).size = 1250
+
+        fetched = []
+        changed = []
+        self.libtorrent_download_impl.handle.piece_priorities = lambda: fetched.append(True) or [1, 1, 1, 1, 0]
+        self.libtorrent_download_impl.handle.piece_priority = lambda piece, prio: changed.append((piece, prio))
+
+        self.libtorrent_download_impl.set_byte_priority([(0, 300, -1)], 0)
+        self.assertEqual(changed, [(1, 0)])
+
+        self.libtorrent_download_impl.set_byte_priority([(0, 0, -1)], 0)
+        self.assertEqual(changed, [(1, 0)])
+
+        self.libtorrent_download_impl.set_byte_priority([(0, 0, 200), (0, 900, 1000)], 1)
+        self.assertEqual(changed, [(1, 0), (4, 1)])
+        self.assertEqual(len(fetched), 1)
+
     def test_setup_exception(self):
         """
         Testing whether an exception in the setup method of LibtorrentDownloadImpl is handled correctly
@@ -695,6 +811,26 @@ class TestLibtorrentDownloadImplNoSession(TriblerCoreTest):
         self.libtorrent_download_impl.handle.status().pieces = [True * 16]
         self.assertEqual(self.libtorrent_download_impl.get_pieces_base64(), "gA==")
 
+    def test_get_pieces_bitfield_cached(self):
+        """
+        Testing whether the pieces of the last status update are only converted once
+        """
+        lt_status = MockObject()
+        lt_status.pieces = [True, False, True]
+        self.libtorrent_download_impl.lt_status = lt_status
+
+        bitfield = self.libtorrent_download_impl.get_pieces_bitfield(lt_status)
+        self.assertEqual(bitfield.tolist(), [True, False, True])
+        self.assertIs(self.libtorrent_download_impl.get_pieces_bitfield(lt_status), bitfield)
+        self.assertEqual(self.libtorrent_download_impl.get_piece_progress([0, 1, 2, 3]), 0.5)
+        self.assertEqual(self.libtorrent_download_impl.get_piece_progress([2, 0, 1], True), 1.0 / 3)
+        self.assertEqual(self.libtorrent_download_impl.get_pieces_base64(), "oA==")
+
+        # A new status update should invalidate the cached bitfield
+        self.libtorrent_download_impl.lt_status_pieces = None
+        lt_status.pieces = [True, True, True]
+        self.assertEqual(self.libtorrent_download_impl.get_piece_progress([0, 1, 2], True), 1.0)
+
     @trial_timeout(10)
     def test_resume_data_failed(self):
         """
@@ -12,7 +12,8 @@ from twisted.internet.defer import Deferred, inlineCallbacks
 from twisted.internet.task import deferLater
 
 from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import LibtorrentDownloadImpl
-from Tribler.Core.Libtorrent.LibtorrentMgr import LibtorrentMgr
+from Tribler.Core.Libtorrent.LibtorrentMgr import LibtorrentMgr, MAX_METAINFO_REQUESTS, METAINFO_PRIORITY_HIGH, \
+    PIECE_ALERT_CATEGORY, SETTINGS_PROFILES
 from Tribler.Core.Notifier import Notifier
 from Tribler.Core.exceptions import TorrentFileException
 from Tribler.Test.Core.base_test import MockObject
@@ -48,6 +49,8 @@ class TestLibtorrentMgr(AbstractServer):
         self.tribler_session.config.get_libtorrent_max_upload_rate = lambda: 100
         self.tribler_session.config.get_libtorrent_max_download_rate = lambda: 120
         self.tribler_session.config.get_libtorrent_dht_enabled = lambda: False
+        self.tribler_session.config.get_libtorrent_shared_metainfo_session_enabled = lambda: False
+        self.tribler_session.config.get_libtorrent_settings_profile = lambda: 'desktop'
         self.tribler_session.config.set_libtorrent_port_runtime = lambda _: None
 
         self.ltmgr = LibtorrentMgr(self.tribler_session)
@@ -84,6 +87,47 @@ class TestLibtorrentMgr(AbstractServer):
         ltsession = self.ltmgr.get_session(0)
         self.assertTrue(ltsession)
 
+    def test_shared_metainfo_session(self):
+        """
+        Testing whether the metainfo lookups can share the session of the downloads without hops
+        """
+        self.tribler_session.config.get_libtorrent_shared_metainfo_session_enabled = lambda: True
+        self.ltmgr.initialize()
+        self.assertIs(self.ltmgr.ltsession_metainfo, self.ltmgr.get_session(0))
+
+        dht_packets = []
+        self.ltmgr._process_dht_packet = lambda decoded, *_: dht_packets.append(decoded)
+        dht_pkt_alert = type('dht_pkt_alert', (object,), dict(pkt_buf=bencode({'y': 'r'})))()
+        self.ltmgr.get_session(0).pop_alerts = lambda: [dht_pkt_alert]
+        self.ltmgr._task_process_alerts()
+        self.assertEqual(dht_packets, [{'y': 'r'}])
+
+    def test_process_dht_packet_direction(self):
+        """
+        Testing whether we only register outgoing scrape queries, and only process incoming responses
+        """
+        queries = []
+        bloomfilters = []
+        self.ltmgr.dht_health_manager = MockObject()
+        self.ltmgr.dht_health_manager.register_query = lambda *args: queries.append(args)
+        self.ltmgr.dht_health_manager.received_bloomfilters = lambda *args: bloomfilters.append(args[0])
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+
+        def dht_pkt_alert(message, packet):
+            # The alerts of the bindings only have the packet, and a message that tells the direction
+            return type('dht_pkt_alert', (object,), dict(pkt_buf=bencode(packet), __str__=lambda _: message))()
+
+        query = {'y': 'q', 't': 'aa', 'q': 'get_peers', 'a': {'info_hash': 'a' * 20, 'scrape': 1}}
+        self.ltmgr.process_metainfo_alert(dht_pkt_alert('<== 1.2.3.4:5', query))
+        self.ltmgr.process_metainfo_alert(dht_pkt_alert('==> 1.2.3.4:5', query))
+        self.ltmgr.process_metainfo_alert(dht_pkt_alert('==> 1.2.3.4:5', dict(query, t='bb', a={'info_hash': 'b'})))
+        self.assertEqual(queries, [('aa', 'a' * 20)])
+
+        response = {'y': 'r', 't': 'aa', 'r': {'id': 'b' * 20, 'BFsd': 'a' * 256, 'BFpe': 'b' * 256}}
+        self.ltmgr.process_metainfo_alert(dht_pkt_alert('==> 1.2.3.4:5', response))
+        self.ltmgr.process_metainfo_alert(dht_pkt_alert('<== 1.2.3.4:5', response))
+        self.assertEqual(bloomfilters, ['aa'])
+
     def test_get_metainfo_not_ready(self):
         """
         Testing the metainfo fetching method when the DHT is not ready
@@ -132,16 +176,107 @@ class TestLibtorrentMgr(AbstractServer):
         """
         test_deferred = Deferred()
 
-        def metainfo_cb(metainfo):
-            self.assertEqual(metainfo, "test")
+        metainfo = {'info': {'name': 'test'}}
+
+        def metainfo_cb(cached_metainfo):
+            self.assertEqual(cached_metainfo, metainfo)
             test_deferred.callback(None)
 
         self.ltmgr.initialize()
-        self.ltmgr.metainfo_cache[hexlify("a" * 20)] = {'meta_info': 'test'}
+        self.ltmgr.metainfo_cache.put(hexlify("a" * 20), metainfo)
         self.ltmgr.get_metainfo("a" * 20, metainfo_cb)
 
         return test_deferred
 
+    @inlineCallbacks
+    def test_get_metainfo_queue(self):
+        """
+        Testing whether metainfo requests wait for a free slot, and whether requests with a high priority go first
+        """
+        added = []
+
+        def add_torrent(atp):
+            handle = MockObject()
+            handle.is_valid = lambda: True
+            handle.has_metadata = lambda: False
+            added.append(atp['info_hash'])
+            return handle
+
+        self.ltmgr.ltsession_metainfo = MockObject()
+        self.ltmgr.ltsession_metainfo.add_torrent = add_torrent
+        self.ltmgr.ltsession_metainfo.remove_torrent = lambda *_: None
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.num_active_metainfo_requests = MAX_METAINFO_REQUESTS - 1
+
+        self.ltmgr.get_metainfo("a" * 20, lambda _: None, notify=False)
+        self.ltmgr.get_metainfo("b" * 20, lambda _: None, notify=False)
+        self.ltmgr.get_metainfo("c" * 20, lambda _: None, notify=False, priority=METAINFO_PRIORITY_HIGH)
+        self.assertEqual(len(added), 1)
+
+        # When a lookup times out, the request with the highest priority is started
+        self.ltmgr.got_metainfo(hexlify("a" * 20), timeout=True)
+        self.assertEqual(len(added), 2)
+        self.assertIsNotNone(self.ltmgr.metainfo_requests[hexlify("c" * 20)]['handle'])
+        self.assertIsNone(self.ltmgr.metainfo_requests[hexlify("b" * 20)]['handle'])
+
+        # Wait until the timeouts are scheduled, so they are cancelled when the manager shuts down
+        yield deferLater(reactor, 0, lambda: None)
+
+    @inlineCallbacks
+    def test_get_metainfo_timeout_when_started(self):
+        """
+        Testing whether the timeout of a metainfo request starts when the lookup starts, instead of when it is queued
+        """
+        timed_out = []
+        handle = MockObject()
+        handle.is_valid = lambda: True
+        handle.has_metadata = lambda: False
+
+        self.ltmgr.ltsession_metainfo = MockObject()
+        self.ltmgr.ltsession_metainfo.add_torrent = lambda _: handle
+        self.ltmgr.ltsession_metainfo.remove_torrent = lambda *_: None
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.num_active_metainfo_requests = MAX_METAINFO_REQUESTS
+
+        self.ltmgr.get_metainfo("a" * 20, lambda _: None, timeout=0.1, timeout_callback=timed_out.append,
+                                notify=False)
+        yield deferLater(reactor, 0.2, lambda: None)
+        self.assertFalse(timed_out)
+
+        self.ltmgr.num_active_metainfo_requests -= 1
+        self.ltmgr.start_metainfo_requests()
+        yield deferLater(reactor, 0.2, lambda: None)
+        self.assertEqual(timed_out, ["a" * 20])
+        self.assertNotIn(hexlify("a" * 20), self.ltmgr.metainfo_requests)
+
+    @inlineCallbacks
+    def test_get_metainfo_queue_timeout(self):
+        """
+        Testing whether a metainfo request times out when it waits in the queue for too long
+        """
+        timed_out = []
+        self.ltmgr.METAINFO_QUEUE_TIMEOUT = 0.1
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.num_active_metainfo_requests = MAX_METAINFO_REQUESTS
+
+        self.ltmgr.get_metainfo("a" * 20, lambda _: None, timeout_callback=timed_out.append, notify=False)
+        yield deferLater(reactor, 0.2, lambda: None)
+        self.assertEqual(timed_out, ["a" * 20])
+        self.assertNotIn(hexlify("a" * 20), self.ltmgr.metainfo_requests)
+
+    def test_got_metainfo_copies(self):
+        """
+        Testing whether every callback gets its own copy of the metainfo
+        """
+        metainfos = []
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.metainfo_cache.put(hexlify("a" * 20), {'info': {'pieces': ['a']}})
+        self.ltmgr.get_metainfo("a" * 20, metainfos.append)
+        self.ltmgr.get_metainfo("a" * 20, metainfos.append)
+        metainfos[0]['info']['name'] = 'changed'
+        self.assertEqual(metainfos[1], {'info': {'pieces': ['a']}})
+        self.assertEqual(self.ltmgr.metainfo_cache.get(hexlify("a" * 20)), {'info': {'pieces': ['a']}})
+
     @trial_timeout(20)
     def test_got_metainfo(self):
         """
@@ -231,6 +366,36 @@ class TestLibtorrentMgr(AbstractServer):
         self.ltmgr.get_metainfo(magnet_link, lambda _: None)
         return test_deferred
 
+    def test_get_metainfo_does_not_remove_download(self):
+        """
+        Testing whether a lookup does not remove a torrent that was already in the session when it finishes
+        """
+        magnet_link = "magnet:?xt=urn:btih:f72636475a375653083e49d501601675ce3e6619&dn=ubuntu-16.04.3-server-i386.iso"
+        removed = []
+
+        mock_handle = MockObject()
+        mock_handle.is_valid = lambda: True
+        mock_handle.has_metadata = lambda: False
+
+        def add_torrent(_):
+            raise RuntimeError("duplicate torrent")
+
+        mock_ltsession = MockObject()
+        mock_ltsession.add_torrent = add_torrent
+        mock_ltsession.find_torrent = lambda _: mock_handle
+        mock_ltsession.remove_torrent = lambda *args: removed.append(args)
+
+        self.ltmgr.ltsession_metainfo = mock_ltsession
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+
+        self.ltmgr.get_metainfo(magnet_link, lambda _: None)
+        infohash = "f72636475a375653083e49d501601675ce3e6619"
+        self.assertIs(self.ltmgr.metainfo_requests[infohash]['handle'], mock_handle)
+
+        self.ltmgr.got_metainfo(infohash, timeout=True)
+        self.assertFalse(removed)
+        self.assertEqual(self.ltmgr.num_active_metainfo_requests, 0)
+
     @trial_timeout(20)
     def test_add_torrent(self):
         """
@@ -301,6 +466,48 @@ class TestLibtorrentMgr(AbstractServer):
             lambda handle: self.assertEqual(handle, mock_handle)
         )
 
+    def test_add_torrent_abort_metainfo_request(self):
+        """
+        Testing whether adding a torrent aborts the lookup of its metainfo in the same session
+        """
+        timed_out = []
+        mock_handle = MockObject()
+        mock_handle.info_hash = lambda: 'a' * 20
+        mock_handle.is_valid = lambda: True
+        mock_handle.has_metadata = lambda: False
+
+        mock_ltsession = MockObject()
+        mock_ltsession.async_add_torrent = lambda _: None
+        mock_ltsession.remove_torrent = lambda *_: None
+        mock_ltsession.get_torrents = lambda: []
+        mock_ltsession.stop_upnp = lambda: None
+        mock_ltsession.save_state = lambda: None
+
+        self.ltmgr.get_session = lambda *_: mock_ltsession
+        self.ltmgr.ltsession_metainfo = mock_ltsession
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.metainfo_requests['a' * 20] = {'handle': mock_handle,
+                                                  'callbacks': [],
+                                                  'timeout_callbacks': [timed_out.append],
+                                                  'notify': False}
+        self.ltmgr.num_active_metainfo_requests = 1
+
+        infohash = MockObject()
+        infohash.info_hash = lambda: 'a' * 20
+        mock_download = MockObject()
+        mock_download.deferred_added = Deferred()
+        self.ltmgr.add_torrent(mock_download, {'ti': infohash})
+
+        self.assertEqual(timed_out, [unhexlify('a' * 20)])
+        self.assertNotIn('a' * 20, self.ltmgr.metainfo_requests)
+        self.assertEqual(self.ltmgr.num_active_metainfo_requests, 0)
+        self.assertIs(self.ltmgr.torrents['a' * 20][0], mock_download)
+
+        # The removal of the aborted lookup does not remove the download
+        removed_alert = type('torrent_removed_alert', (object,), dict(handle=mock_handle, info_hash='a' * 20))()
+        self.ltmgr.on_torrent_removed_alert(removed_alert, 0)
+        self.assertIn('a' * 20, self.ltmgr.torrents)
+
     def test_remove_invalid_torrent(self):
         """
         Tests a successful removal status of torrents without a handle
@@ -386,6 +593,19 @@ class TestLibtorrentMgr(AbstractServer):
         self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
         self.ltmgr.set_proxy_settings(mock_lt_session, 0, ('a', "1234"), ('abc', 'def'))
 
+    def test_set_piece_alerts_enabled(self):
+        """
+        Test whether the piece alerts are enabled and disabled in all sessions
+        """
+        mock_lt_session = MockObject()
+        mock_lt_session.set_alert_mask = lambda mask: setattr(mock_lt_session, 'alert_mask', mask)
+        self.ltmgr.ltsessions[1] = mock_lt_session
+
+        self.ltmgr.set_piece_alerts_enabled(True)
+        self.assertTrue(mock_lt_session.alert_mask & PIECE_ALERT_CATEGORY)
+        self.ltmgr.set_piece_alerts_enabled(False)
+        self.assertEqual(mock_lt_session.alert_mask, self.ltmgr.default_alert_mask)
+
     def test_save_resume_preresolved_magnet(self):
         """
         Test whether a magnet link correctly writes save-resume data before it is resolved.
@@ -405,6 +625,7 @@ class TestLibtorrentMgr(AbstractServer):
         mock_lm = MockObject()
         mock_lm.ltmgr = self.ltmgr
         mock_lm.tunnel_community = None
+        mock_lm.download_state_store = None
         self.tribler_session.lm = mock_lm
 
         def dl_from_tdef(tdef, _):
@@ -481,3 +702,86 @@ class TestLibtorrentMgr(AbstractServer):
 
         # Wait sometime to get the alert and check the status
         return deferLater(reactor, 0.01, check_if_session_shutdown_is_ready)
+
+    def test_session_stats_history(self):
+        """
+        Test whether the disk and network counters of the session stats are recorded, and passed to the requesters
+        """
+        self.ltmgr.initialize()
+        values = {'disk.queued_disk_jobs': 1, 'disk.queued_write_bytes': 0, 'disk.num_write_jobs': 0,
+                  'net.recv_bytes': 1024, 'ses.num_seeding_torrents': 2}
+        session_stats_alert = type('session_stats_alert', (object,), dict(values=values))()
+
+        requested_stats = []
+        self.ltmgr.get_session_stats(0).addCallback(requested_stats.append)
+        self.ltmgr.process_alert(session_stats_alert, hops=0)
+        self.ltmgr.process_alert(session_stats_alert, hops=0)
+
+        self.assertEqual(requested_stats, [values])
+        self.assertEqual(len(self.ltmgr.session_stats_history[0]), 2)
+        self.assertEqual(self.ltmgr.session_stats_history[0][-1][1],
+                         {'disk.queued_disk_jobs': 1, 'disk.queued_write_bytes': 0, 'disk.num_write_jobs': 0,
+                          'net.recv_bytes': 1024})
+        self.assertFalse(self.ltmgr.lt_session_shutdown_ready[0])
+
+    def test_settings_profile(self):
+        """
+        Test whether the settings of the configured profile are applied to new sessions
+        """
+        applied_settings = []
+        self.ltmgr.set_session_settings = lambda _, settings: applied_settings.append(settings)
+        self.tribler_session.config.get_libtorrent_settings_profile = lambda: 'seedbox'
+        self.ltmgr.initialize()
+
+        self.assertEqual(applied_settings[0]['connections_limit'], SETTINGS_PROFILES['seedbox']['connections_limit'])
+        self.assertEqual(applied_settings[0]['cache_size'], SETTINGS_PROFILES['seedbox']['cache_size'])
+
+    def test_alert_notify(self):
+        """
+        Test whether alert notifications from libtorrent only schedule a single round of alert processing
+        """
+        scheduled_calls = []
+        self.ltmgr.ltsessions = {}
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        original_call_from_thread = reactor.callFromThread
+        reactor.callFromThread = lambda func, *args: scheduled_calls.append(func)
+        try:
+            self.ltmgr._on_alert_notify()
+            self.ltmgr._on_alert_notify()
+        finally:
+            reactor.callFromThread = original_call_from_thread
+
+        self.assertEqual(scheduled_calls, [self.ltmgr._task_process_alerts])
+        self.ltmgr._task_process_alerts()
+        self.assertFalse(self.ltmgr.alerts_notified)
+
+    def test_process_alerts_failure(self):
+        """
+        Test whether the other alerts of a batch are processed when processing one of them fails
+        """
+        processed_alerts = []
+
+        def process_alert(alert, hops=0):
+            if alert == 'bad':
+                raise AttributeError("bad alert")
+            processed_alerts.append(alert)
+
+        ltsession = MockObject()
+        ltsession.pop_alerts = lambda: ['bad', 'good']
+        self.ltmgr.ltsessions = {0: ltsession}
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.process_alert = process_alert
+        self.ltmgr._task_process_alerts()
+        self.assertEqual(processed_alerts, ['good'])
+        self.ltmgr.ltsessions = {}
+
+    def test_process_unhandled_alert(self):
+        """
+        Test whether alerts without a registered handler are only passed to the alert callback
+        """
+        received_alerts = []
+        self.ltmgr.metadata_tmpdir = tempfile.mkdtemp(suffix=u'tribler_metainfo_tmpdir')
+        self.ltmgr.alert_callback = received_alerts.append
+        alert = type('unknown_alert', (object, ), {})()
+        self.ltmgr.process_alert(alert)
+        self.assertEqual(received_alerts, [alert])
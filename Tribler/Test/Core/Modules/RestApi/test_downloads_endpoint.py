@@ -7,7 +7,7 @@ from pony.orm import db_session
 
 from six.moves.urllib.request import pathname2url
 
-from twisted.internet.defer import fail
+from twisted.internet.defer import fail, succeed
 
 import Tribler.Core.Utilities.json_util as json
 from Tribler.Core import TorrentDef
@@ -474,6 +474,104 @@ class TestDownloadsEndpoint(AbstractApiTest):
         return self.do_request('downloads/%s' % get_hex_infohash(video_tdef), expected_code=400,
                                post_data={"state": "abc"}, request_type='PATCH')
 
+    def start_downloads(self, filenames):
+        downloads = []
+        for filename in filenames:
+            tdef, _ = self.create_local_torrent(os.path.join(TESTS_DATA_DIR, filename))
+            downloads.append(self.session.start_download_from_tdef(tdef, DownloadStartupConfig()))
+        return downloads
+
+    @trial_timeout(10)
+    def test_stop_downloads(self):
+        """
+        Testing whether the API returns 200 if multiple downloads are being stopped at once
+        """
+        downloads = self.start_downloads(['video.avi', 'ubuntu-logo14.png'])
+        infohashes = [get_hex_infohash(download.get_def()) for download in downloads]
+        stopped_downloads = []
+        checkpointed_downloads = []
+
+        for download in downloads:
+            download.stop = lambda download=download: stopped_downloads.append(download)
+        self.session.lm.checkpoint_downloads = \
+            lambda downloads=None: checkpointed_downloads.append(downloads) or succeed(None)
+
+        def verify_stopped(_):
+            self.assertEqual(stopped_downloads, downloads)
+            self.assertEqual(checkpointed_downloads, [downloads])
+
+        post_data = '&'.join('infohashes[]=%s' % infohash for infohash in infohashes) + '&state=stop'
+        request_deferred = self.do_request('downloads', raw_data=post_data, expected_code=200, request_type='PATCH',
+                                           expected_json={"modified": True, "infohashes": infohashes})
+        return request_deferred.addCallback(verify_stopped)
+
+    @trial_timeout(10)
+    def test_change_hops_downloads(self):
+        """
+        Testing whether the API changes the hops of multiple downloads at once
+        """
+        downloads = self.start_downloads(['video.avi', 'ubuntu-logo14.png'])
+        infohashes = [get_hex_infohash(download.get_def()) for download in downloads]
+        updated_hops = []
+
+        def mocked_update_downloads_hops(downloads, hops):
+            updated_hops.append((downloads, hops))
+            return succeed(downloads)
+
+        self.session.lm.update_downloads_hops = mocked_update_downloads_hops
+
+        post_data = '&'.join('infohashes[]=%s' % infohash for infohash in infohashes) + '&anon_hops=1'
+        request_deferred = self.do_request('downloads', raw_data=post_data, expected_code=200, request_type='PATCH',
+                                           expected_json={"modified": True, "infohashes": infohashes})
+        return request_deferred.addCallback(lambda _: self.assertEqual(updated_hops, [(downloads, 1)]))
+
+    @trial_timeout(10)
+    def test_change_hops_downloads_error(self):
+        """
+        Testing whether the API returns 400 if we supply both anon_hops and another parameter for multiple downloads
+        """
+        infohash = get_hex_infohash(self.start_downloads(['video.avi'])[0].get_def())
+
+        self.should_check_equality = False
+        return self.do_request('downloads', raw_data='infohashes[]=%s&state=resume&anon_hops=1' % infohash,
+                               expected_code=400, request_type='PATCH')
+
+    @trial_timeout(10)
+    def test_modify_downloads_wrong_infohash(self):
+        """
+        Testing whether the API returns 404 if one of the downloads does not exist, without modifying the others
+        """
+        download = self.start_downloads(['video.avi'])[0]
+        download.stop = lambda: self.fail("download should not be stopped")
+
+        self.should_check_equality = False
+        post_data = 'infohashes[]=%s&infohashes[]=abcd&state=stop' % get_hex_infohash(download.get_def())
+        return self.do_request('downloads', raw_data=post_data, expected_code=404, request_type='PATCH')
+
+    @trial_timeout(10)
+    def test_modify_downloads_no_infohashes(self):
+        """
+        Testing whether the API returns 400 if no infohashes are passed when modifying multiple downloads
+        """
+        self.should_check_equality = False
+        return self.do_request('downloads', post_data={"state": "stop"}, expected_code=400, request_type='PATCH')
+
+    @trial_timeout(10)
+    def test_remove_downloads(self):
+        """
+        Testing whether the API returns 200 if multiple downloads are being removed at once
+        """
+        downloads = self.start_downloads(['video.avi', 'ubuntu-logo14.png'])
+        infohashes = [get_hex_infohash(download.get_def()) for download in downloads]
+
+        def verify_removed(_):
+            self.assertEqual(len(self.session.get_downloads()), 0)
+
+        post_data = '&'.join('infohashes[]=%s' % infohash for infohash in infohashes) + '&remove_data=1'
+        request_deferred = self.do_request('downloads', raw_data=post_data, expected_code=200, request_type='DELETE',
+                                           expected_json={"removed": True, "infohashes": infohashes})
+        return request_deferred.addCallback(verify_removed)
+
     @trial_timeout(10)
     def test_export_unknown_download(self):
         """
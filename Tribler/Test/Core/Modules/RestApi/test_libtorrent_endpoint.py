@@ -133,3 +133,35 @@ class TestLibTorrentSessionEndpoint(AbstractApiTest):
 
         self.should_check_equality = False
         return self.do_request('libtorrent/session?hop=%d' % hop, expected_code=200).addCallback(verify_stats)
+
+
+class TestLibTorrentStatsEndpoint(AbstractApiTest):
+
+    def setUpPreSession(self):
+        super(TestLibTorrentStatsEndpoint, self).setUpPreSession()
+        self.config.set_libtorrent_enabled(True)
+
+    @trial_timeout(5)
+    def test_get_stats_history(self):
+        """
+        Tests getting the recorded counters of the zero hop session as time series.
+        """
+        self.session.lm.ltmgr.session_stats_history[0] = [(1.0, {'net.recv_bytes': 10}),
+                                                          (2.0, {'net.recv_bytes': 20, 'disk.num_read_ops': 1})]
+
+        def verify_stats(result):
+            result_json = json.loads(result)
+            self.assertEqual(result_json['hop'], 0)
+            self.assertEqual(result_json['timestamps'], [1.0, 2.0])
+            self.assertEqual(result_json['counters'], {'net.recv_bytes': [10, 20], 'disk.num_read_ops': [None, 1]})
+
+        self.should_check_equality = False
+        return self.do_request('libtorrent/stats?hop=0', expected_code=200).addCallback(verify_stats)
+
+    @trial_timeout(5)
+    def test_get_stats_history_for_uninitialized_session(self):
+        """
+        Tests getting the recorded counters of a session that does not exist.
+        """
+        expected_json = {'hop': 1, 'timestamps': [], 'counters': {}}
+        return self.do_request('libtorrent/stats?hop=1', expected_code=200, expected_json=expected_json)
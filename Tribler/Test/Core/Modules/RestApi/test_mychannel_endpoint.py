@@ -10,7 +10,7 @@ from pony.orm import db_session
 
 from six.moves import xrange
 
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import Deferred, inlineCallbacks
 
 from Tribler.Core.Modules.MetadataStore.OrmBindings.channel_node import NEW, TODELETE, UPDATED
 from Tribler.Core.TorrentDef import TorrentDef
@@ -149,6 +149,17 @@ class TestMyChannelCommitEndpoint(BaseTestMyChannelEndpoint):
         self.create_my_channel()
         return self.do_request('mychannel/commit', expected_code=200, request_type='POST')
 
+    @trial_timeout(10)
+    def test_commit_in_progress(self):
+        """
+        Test whether we get an error if we try to commit a channel while it is being committed
+        """
+        self.should_check_equality = False
+        self.create_my_channel()
+        commit_endpoint = self.session.lm.api_manager.root_endpoint.children['mychannel'].children['commit']
+        commit_endpoint.commit_deferred = Deferred()
+        return self.do_request('mychannel/commit', expected_code=409, request_type='POST')
+
 
 class TestMyChannelTorrentsEndpoint(BaseTestMyChannelEndpoint):
 
@@ -2,7 +2,7 @@ from __future__ import absolute_import
 
 from binascii import hexlify
 
-from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.defer import Deferred, inlineCallbacks, succeed
 
 from Tribler.Core.Modules.wallet.tc_wallet import TrustchainWallet
 from Tribler.Core.Modules.wallet.wallet import InsufficientFunds
@@ -120,6 +120,28 @@ class TestTrustchainWallet(TestBase):
                                                block_type=b'tribler_bandwidth', transaction=transaction)
         yield self.tc_wallet.monitor_transaction(b'%s.1' % hexlify(his_pubkey))
 
+    @inlineCallbacks
+    def test_monitor_backoff(self):
+        """
+        Test whether monitored transactions are looked up together, and less often while they do not show up
+        """
+        looked_up_ids = []
+
+        def find_transactions(transaction_ids):
+            looked_up_ids.append(sorted(transaction_ids))
+            return succeed({})
+
+        self.tc_wallet.find_transactions = find_transactions
+        self.tc_wallet.monitor_transaction(b'a.1')
+        self.tc_wallet.monitor_transaction(b'b.1')
+
+        yield self.sleep(0.1)
+
+        self.assertTrue(looked_up_ids)
+        self.assertTrue(all(transaction_ids == [b'a.1', b'b.1'] for transaction_ids in looked_up_ids))
+        self.assertGreater(self.tc_wallet.monitor_delay, self.tc_wallet.MONITOR_DELAY)
+        self.tc_wallet.shutdown_task_manager()
+
     def test_address(self):
         """
         Test the address of a Trustchain wallet
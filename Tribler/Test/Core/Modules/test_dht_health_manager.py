@@ -59,6 +59,10 @@ class TestDHTHealthManager(TriblerCoreTest):
         bf2 = bytearray('b' * 256)
         self.assertEqual(self.dht_health_manager.combine_bloomfilters(bf1, bf2), bf2)
 
+        bf1 = bytearray('\x0f' * 256)
+        bf2 = bytearray('\xf0' * 256)
+        self.assertEqual(self.dht_health_manager.combine_bloomfilters(bf1, bf2), bytearray('\xff' * 256))
+
     @trial_timeout(10)
     def test_get_size_from_bloom_filter(self):
         """
@@ -79,21 +83,63 @@ class TestDHTHealthManager(TriblerCoreTest):
         bf = bytearray('\xff' * 256)
         self.assertEqual(self.dht_health_manager.get_size_from_bloomfilter(bf), 6000)
 
+        # Empty bloom filter
+        bf = bytearray(256)
+        self.assertEqual(self.dht_health_manager.get_size_from_bloomfilter(bf), 0)
+
     @trial_timeout(10)
     def test_receive_bloomfilters(self):
         """
         Test whether the right operations happen when receiving a bloom filter
         """
         infohash = 'a' * 20
-        self.dht_health_manager.received_bloomfilters(infohash)  # It should not do anything
+        self.dht_health_manager.received_bloomfilters('aa')  # It should not do anything
         self.assertFalse(self.dht_health_manager.bf_seeders)
         self.assertFalse(self.dht_health_manager.bf_peers)
 
         self.dht_health_manager.lookup_deferreds[infohash] = Deferred()
         self.dht_health_manager.bf_seeders[infohash] = bytearray(256)
         self.dht_health_manager.bf_peers[infohash] = bytearray(256)
-        self.dht_health_manager.received_bloomfilters('b' * 20,
+        self.dht_health_manager.register_query('aa', infohash)
+        self.dht_health_manager.received_bloomfilters('aa',
                                                       bf_seeds=bytearray('\xee' * 256),
                                                       bf_peers=bytearray('\xff' * 256))
         self.assertEqual(self.dht_health_manager.bf_seeders[infohash], bytearray('\xee' * 256))
         self.assertEqual(self.dht_health_manager.bf_peers[infohash], bytearray('\xff' * 256))
+
+    @trial_timeout(10)
+    def test_receive_bloomfilters_transaction_id(self):
+        """
+        Test whether bloom filters are attributed to the lookup of the query with the same transaction ID
+        """
+        self.dht_health_manager.get_health('a' * 20, timeout=0.1)
+        lookup_deferred = self.dht_health_manager.get_health('b' * 20, timeout=0.1)
+        self.dht_health_manager.register_query('aa', 'a' * 20)
+        self.dht_health_manager.register_query('bb', 'b' * 20)
+        self.dht_health_manager.register_query('cc', 'c' * 20)  # Not a pending lookup, should be ignored
+        self.assertEqual(self.dht_health_manager.outstanding_queries, {'aa': 'a' * 20, 'bb': 'b' * 20})
+
+        self.dht_health_manager.received_bloomfilters('aa',
+                                                      bf_seeds=bytearray('\xee' * 256),
+                                                      bf_peers=bytearray('\xff' * 256))
+        self.assertEqual(self.dht_health_manager.bf_seeders['a' * 20], bytearray('\xee' * 256))
+        self.assertEqual(self.dht_health_manager.bf_seeders['b' * 20], bytearray(256))
+        self.assertEqual(self.dht_health_manager.outstanding_queries, {'bb': 'b' * 20})
+
+        # Responses with an unknown transaction ID are not attributed to any lookup
+        self.dht_health_manager.received_bloomfilters('dd',
+                                                      bf_seeds=bytearray('\xee' * 256),
+                                                      bf_peers=bytearray('\xff' * 256))
+        self.assertEqual(self.dht_health_manager.bf_seeders['b' * 20], bytearray(256))
+        return lookup_deferred
+
+    @trial_timeout(10)
+    def test_finalize_lookup_transactions(self):
+        """
+        Test whether outstanding queries of a lookup are removed when the lookup is finalized
+        """
+        self.dht_health_manager.get_health('a' * 20, timeout=0.1)
+        self.dht_health_manager.register_query('aa', 'a' * 20)
+        self.dht_health_manager.finalize_lookup('a' * 20)
+        self.assertFalse(self.dht_health_manager.outstanding_queries)
+        self.assertFalse(self.dht_health_manager.lookup_transactions)
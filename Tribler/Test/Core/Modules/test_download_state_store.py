@@ -0,0 +1,77 @@
+from __future__ import absolute_import
+
+import os
+
+from twisted.internet.defer import inlineCallbacks
+
+from Tribler.Core.Modules.download_state_store import DownloadStateStore
+from Tribler.Core.Utilities.configparser import CallbackConfigParser
+from Tribler.Test.Core.base_test import TriblerCoreTest
+
+
+class TestDownloadStateStore(TriblerCoreTest):
+    """
+    This class contains tests for the download state store.
+    """
+
+    @inlineCallbacks
+    def setUp(self):
+        yield super(TestDownloadStateStore, self).setUp()
+        self.db_path = os.path.join(self.session_base_dir, 'download_states.db')
+        self.store = DownloadStateStore(self.db_path)
+
+    @inlineCallbacks
+    def tearDown(self):
+        self.store.close()
+        yield super(TestDownloadStateStore, self).tearDown()
+
+    @staticmethod
+    def create_pstate(name):
+        pstate = CallbackConfigParser()
+        pstate.add_section('state')
+        pstate.set('state', 'metainfo', {'infohash': 'a' * 20, 'name': name})
+        pstate.set('state', 'engineresumedata', None)
+        return pstate
+
+    def test_put_get(self):
+        """
+        Test whether a stored download state can be read back, both before and after flushing
+        """
+        self.assertIsNone(self.store.get('a' * 20))
+        self.assertFalse(self.store.has('a' * 20))
+
+        self.store.put('a' * 20, self.create_pstate('test'))
+        self.assertTrue(self.store.has('a' * 20))
+        self.assertEqual(self.store.get('a' * 20).get('state', 'metainfo')['name'], 'test')
+
+        self.store.flush()
+        self.assertFalse(self.store.pending_writes)
+        self.assertEqual(self.store.get('a' * 20).get('state', 'metainfo')['name'], 'test')
+        self.assertIsNone(self.store.get('a' * 20).get('state', 'engineresumedata'))
+
+    def test_remove(self):
+        """
+        Test whether a download state can be removed from the store
+        """
+        self.store.put('a' * 20, self.create_pstate('test'))
+        self.store.put('b' * 20, self.create_pstate('test'))
+        self.store.flush()
+
+        self.store.remove('a' * 20)
+        self.assertFalse(self.store.has('a' * 20))
+        self.assertEqual(self.store.get_infohashes(), ['62' * 20])
+
+        self.store.flush()
+        self.assertFalse(self.store.has('a' * 20))
+        self.assertEqual(self.store.get_infohashes(), ['62' * 20])
+
+    def test_persistence(self):
+        """
+        Test whether download states are written to the database when the store is closed
+        """
+        self.store.put('a' * 20, self.create_pstate('test'))
+        self.store.close()
+
+        self.store = DownloadStateStore(self.db_path)
+        self.assertEqual(self.store.get_infohashes(), ['61' * 20])
+        self.assertEqual(self.store.get('a' * 20).get('state', 'metainfo')['name'], 'test')
@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+import os
+
+from twisted.internet.defer import inlineCallbacks
+
+from Tribler.Core.Modules.metainfo_cache import MetainfoCache
+from Tribler.Test.Core.base_test import TriblerCoreTest
+
+
+class TestMetainfoCache(TriblerCoreTest):
+    """
+    This class contains tests for the metainfo cache.
+    """
+
+    @inlineCallbacks
+    def setUp(self):
+        yield super(TestMetainfoCache, self).setUp()
+        self.cache_dir = os.path.join(self.session_base_dir, 'metainfo_cache')
+        self.cache = MetainfoCache(self.cache_dir, max_memory_entries=2, max_disk_entries=3)
+
+    @staticmethod
+    def create_metainfo(name):
+        return {'info': {'name': name}, 'nodes': [], 'initial peers': [('1.2.3.4', 5)], 'seeders': 1, 'leechers': 0}
+
+    def test_put_get(self):
+        """
+        Test whether the cached metainfo is shared, and not copied
+        """
+        metainfo = self.create_metainfo('a')
+        self.assertIsNone(self.cache.get('a' * 40))
+        self.cache.put('a' * 40, metainfo)
+        self.assertIn('a' * 40, self.cache)
+        self.assertIs(self.cache.get('a' * 40), metainfo)
+
+    def test_read_from_disk(self):
+        """
+        Test whether metainfo that is evicted from memory, or cached before a restart, is read from disk
+        """
+        for infohash in ['a' * 40, 'b' * 40, 'c' * 40]:
+            self.cache.put(infohash, self.create_metainfo(infohash[0]))
+        self.assertNotIn('a' * 40, self.cache.memory_entries)
+
+        cache = MetainfoCache(self.cache_dir)
+        for infohash in ['a' * 40, 'b' * 40, 'c' * 40]:
+            metainfo = cache.get(infohash)
+            self.assertEqual(metainfo['info']['name'], infohash[0])
+            self.assertEqual(metainfo['initial peers'], [])
+
+    def test_lru_eviction(self):
+        """
+        Test whether the least recently used metainfo is removed from disk when the cache is full
+        """
+        for infohash in ['a' * 40, 'b' * 40, 'c' * 40]:
+            self.cache.put(infohash, self.create_metainfo(infohash[0]))
+        self.cache.get('a' * 40)
+        self.cache.put('d' * 40, self.create_metainfo('d'))
+
+        self.assertNotIn('b' * 40, self.cache)
+        self.assertFalse(os.path.exists(self.cache.get_path('b' * 40)))
+        self.assertEqual(list(self.cache.disk_entries), ['c' * 40, 'a' * 40, 'd' * 40])
+
+    def test_corrupt_file(self):
+        """
+        Test whether a corrupt file in the cache is removed
+        """
+        self.cache.put('a' * 40, self.create_metainfo('a'))
+        with open(self.cache.get_path('a' * 40), 'wb') as metainfo_file:
+            metainfo_file.write('garbage')
+
+        cache = MetainfoCache(self.cache_dir)
+        self.assertIsNone(cache.get('a' * 40))
+        self.assertNotIn('a' * 40, cache)
@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+from Tribler.Core.Video import PieceScheduler as piece_scheduler_module
+from Tribler.Core.Video.PieceScheduler import PieceScheduler
+from Tribler.Test.Core.base_test import MockObject, TriblerCoreTest
+
+
+class TestPieceScheduler(TriblerCoreTest):
+    """
+    This class contains tests for the scheduler of the pieces of a streamed file.
+    """
+
+    def setUp(self):
+        TriblerCoreTest.setUp(self)
+        # A file of 1000 bytes that starts halfway the first piece of 100 bytes
+        self.file_entry = MockObject()
+        self.file_entry.size = 1000
+        self.file_entry.offset = 50
+
+        torrent_info = MockObject()
+        torrent_info.piece_length = lambda: 100
+        torrent_info.file_at = lambda _: self.file_entry
+        torrent_info.map_file = self.map_file
+
+        self.deadlines = {}
+        self.priorities = []
+        self.download = MockObject()
+        self.download.handle = MockObject()
+        self.download.handle.torrent_file = lambda: torrent_info
+        self.download.set_piece_deadline = self.deadlines.__setitem__
+        self.download.reset_piece_deadline = lambda piece: self.deadlines.pop(piece, None)
+        self.download.set_byte_priority = lambda byteranges, priority: self.priorities.append((byteranges, priority))
+
+        self.scheduler = PieceScheduler(self.download, 0)
+        self.scheduler.bitrate = 100
+
+    def map_file(self, _, offset, __):
+        peer_request = MockObject()
+        peer_request.piece = (self.file_entry.offset + offset) // 100
+        return peer_request
+
+    def test_schedule_window(self):
+        """
+        Test whether the pieces in the window after the position get a deadline
+        """
+        piece_scheduler_module.DEADLINE_WINDOW = 2
+        self.addCleanup(setattr, piece_scheduler_module, 'DEADLINE_WINDOW', 30)
+
+        self.scheduler.set_position(0)
+        self.assertEqual(self.deadlines, {0: 0, 1: 500, 2: 1500, 3: 2500})
+        self.assertEqual(self.priorities, [([(0, 0, -1)], 1)])
+        self.assertEqual(self.scheduler.window_end, 4)
+
+    def test_slide_window(self):
+        """
+        Test whether only the pieces that enter the window are scheduled when the position advances
+        """
+        self.scheduler.bitrate = 10
+        self.scheduler.set_position(0)
+        self.deadlines.clear()
+
+        self.scheduler.set_position(250)
+        self.assertEqual(self.deadlines, {4: 10000, 5: 20000, 6: 30000})
+        self.assertEqual(len(self.priorities), 1)
+
+    def test_seek(self):
+        """
+        Test whether the deadlines are cleared when jumping to a position outside of the window
+        """
+        self.scheduler.bitrate = 10
+        self.scheduler.set_position(0)
+        self.scheduler.set_position(800)
+        self.assertEqual(sorted(self.deadlines.keys()), [8, 9, 10])
+        self.assertEqual(self.priorities[-1], ([(0, 800, -1)], 1))
+
+        self.scheduler.set_position(100)
+        self.assertEqual(sorted(self.deadlines.keys()), [1, 2, 3, 4])
+
+    def test_seek_keeps_other_deadlines(self):
+        """
+        Test whether seeking only removes the deadlines that the scheduler has set itself
+        """
+        self.scheduler.bitrate = 10
+        self.deadlines[9] = 0
+        self.scheduler.set_position(0)
+        self.scheduler.set_position(400)
+        self.assertEqual(sorted(self.deadlines.keys()), [4, 5, 6, 7, 9])
+
+    def test_clear_window(self):
+        """
+        Test whether all deadlines of the window are removed when the window is cleared
+        """
+        self.scheduler.set_position(0)
+        self.scheduler.clear_window()
+        self.assertFalse(self.deadlines)
+        self.assertIsNone(self.scheduler.window_start)
+        self.assertEqual(self.scheduler.window_end, 0)
+
+    def test_update_bitrate(self):
+        """
+        Test whether the bitrate is estimated from how fast the position advances
+        """
+        self.scheduler.bitrate = 100000
+        self.scheduler.set_position(0)
+        self.scheduler.bitrate_start = (self.scheduler.bitrate_start[0] - 10, 0)
+        self.scheduler.set_position(500)
+        self.assertEqual(self.scheduler.bitrate, piece_scheduler_module.MIN_BITRATE)
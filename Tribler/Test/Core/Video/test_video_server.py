@@ -9,14 +9,15 @@ import binascii
 import os
 
 from twisted.internet import reactor
-from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.defer import Deferred, inlineCallbacks, succeed
 from twisted.internet.endpoints import TCP4ClientEndpoint, connectProtocol
 from twisted.internet.protocol import Protocol, connectionDone
 
 from Tribler.Core.DownloadConfig import DownloadStartupConfig
 from Tribler.Core.TorrentDef import TorrentDef
 from Tribler.Core.Utilities.network_utils import get_random_port
-from Tribler.Core.Video.VideoServer import VideoServer
+from Tribler.Core.Video.VideoServer import VideoServer, VideoStream
+from Tribler.Core.simpledefs import DLMODE_NORMAL
 from Tribler.Test.Core.base_test import MockObject, TriblerCoreTest
 from Tribler.Test.common import TESTS_DATA_DIR
 from Tribler.Test.test_as_server import TestAsServer
@@ -98,12 +99,185 @@ class TestVideoServer(TriblerCoreTest):
 
         self.assertEqual(self.video_server.get_vod_destination(mock_download), os.path.join("abc", "def"))
 
-    def test_get_vod_stream(self):
+
+class MockRequest(MockObject):
+
+    def __init__(self):
+        self.data = ''
+        self.producer = None
+        self.finished = False
+        self.finish_deferred = Deferred()
+
+    def write(self, data):
+        self.data += data
+
+    def registerProducer(self, producer, _):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+    def notifyFinish(self):
+        return self.finish_deferred
+
+    def finish(self):
+        self.finished = True
+
+
+class TestVideoStream(TriblerCoreTest):
+
+    @inlineCallbacks
+    def setUp(self):
+        yield super(TestVideoStream, self).setUp()
+        self.content = ''.join(chr(i % 256) for i in range(100))
+        self.content_path = os.path.join(self.session_base_dir, 'video.avi')
+        with open(self.content_path, 'wb') as content_file:
+            content_file.write(self.content)
+
+        self.have_pieces = set(range(7))
+        self.waiting = {}
+
+        mock_info = MockObject()
+        mock_info.piece_length = lambda: 16
+        mock_info.map_file = self.map_file
+        mock_info.file_at = lambda _: self.file_entry
+        self.file_entry = MockObject()
+        self.file_entry.size = 100
+        self.file_entry.offset = 0
+        self.deadlines = {}
+        self.scheduled_pieces = set()
+
+        self.mock_download = MockObject()
+        self.mock_download.vod_seekpos = None
+        self.mock_download.handle = MockObject()
+        self.mock_download.handle.torrent_file = lambda: mock_info
+        self.mock_download.set_byte_priority = lambda *_: None
+        self.mock_download.set_piece_deadline = self.set_piece_deadline
+        self.mock_download.reset_piece_deadline = lambda piece: self.deadlines.pop(piece, None)
+        self.mock_download.get_content_dest = lambda: self.content_path
+        self.mock_download.get_def = lambda: self.mock_def
+        self.mock_download.wait_for_piece = self.wait_for_piece
+
+        self.mock_def = MockObject()
+        self.mock_def.is_multifile_torrent = lambda: False
+        self.mock_def.get_infohash = lambda: 'a' * 20
+
+        self.mock_session = MockObject()
+        self.mock_session.lm = MockObject()
+        self.mock_session.lm.ltmgr = None
+        self.video_server = VideoServer(get_random_port(), self.mock_session)
+        self.video_server.start_vod = lambda download, _: succeed(download)
+
+        self.request = MockRequest()
+
+    @staticmethod
+    def map_file(_, offset, __):
+        peer_request = MockObject()
+        peer_request.piece = offset // 16
+        peer_request.start = offset % 16
+        return peer_request
+
+    def set_piece_deadline(self, piece, deadline):
+        self.deadlines[piece] = deadline
+        self.scheduled_pieces.add(piece)
+
+    def wait_for_piece(self, piece):
+        if piece in self.have_pieces:
+            return succeed(piece)
+        self.waiting[piece] = Deferred()
+        return self.waiting[piece]
+
+    def create_stream(self, firstbyte, lastbyte):
+        stream = VideoStream(self.video_server, self.request, self.mock_download, 0, firstbyte, lastbyte)
+        stream.start()
+        return stream
+
+    def test_stream_range(self):
+        """
+        Testing whether a stream writes the requested range and finishes the request
+        """
+        self.create_stream(10, 50)
+        self.assertEqual(self.request.data, self.content[10:50])
+        self.assertTrue(self.request.finished)
+        self.assertIsNone(self.request.producer)
+        self.assertFalse(self.video_server.streams)
+        self.assertEqual(self.mock_download.vod_seekpos, 50)
+        self.assertEqual(sorted(self.scheduled_pieces), list(range(7)))
+        # The deadlines of a finished stream are removed
+        self.assertFalse(self.deadlines)
+
+    def test_stream_wait_for_piece(self):
+        """
+        Testing whether a stream waits for a missing piece and continues when the piece is finished
+        """
+        self.have_pieces.discard(2)
+        stream = self.create_stream(0, 100)
+        self.assertEqual(self.request.data, self.content[:32])
+        self.assertFalse(self.request.finished)
+        self.assertIn(stream, self.video_server.streams)
+
+        self.have_pieces.add(2)
+        self.waiting[2].callback(2)
+        self.assertEqual(self.request.data, self.content)
+        self.assertTrue(self.request.finished)
+
+    def test_stream_pause_resume(self):
+        """
+        Testing whether a stream stops writing while it is paused
+        """
+        self.have_pieces.discard(0)
+        stream = self.create_stream(0, 100)
+        stream.pauseProducing()
+        self.waiting[0].callback(0)
+        self.assertEqual(self.request.data, '')
+
+        self.have_pieces.add(0)
+        stream.resumeProducing()
+        self.assertEqual(self.request.data, self.content)
+        self.assertTrue(self.request.finished)
+
+    def test_stream_connection_lost(self):
+        """
+        Testing whether a stream stops waiting for pieces when the connection is lost
+        """
+        self.have_pieces.clear()
+        stream = self.create_stream(0, 100)
+        self.request.finish_deferred.errback(Exception("Connection lost"))
+        self.assertTrue(stream.stopped)
+        self.assertTrue(self.waiting[0].called)
+        self.assertFalse(self.video_server.streams)
+        self.assertFalse(self.request.finished)
+
+    def test_last_stream_stops_vod(self):
+        """
+        Testing whether a download goes back to normal mode with its old file selection when its last stream closes
+        """
+        calls = []
+        self.mock_download.set_mode = lambda mode: calls.append(('mode', mode))
+        self.mock_download.set_selected_files = lambda files: calls.append(('files', files))
+        self.mock_download.restart = lambda: calls.append(('restart',))
+        self.video_server.vod_downloads['a' * 20] = 0
+        self.video_server.vod_selected_files['a' * 20] = ['a.avi', 'b.avi']
+
+        self.have_pieces.clear()
+        first_stream = self.create_stream(0, 100)
+        second_stream = self.create_stream(0, 100)
+        first_stream.stopProducing()
+        self.assertFalse(calls)
+
+        second_stream.stopProducing()
+        self.assertEqual(calls, [('mode', DLMODE_NORMAL), ('files', ['a.avi', 'b.avi']), ('restart',)])
+        self.assertFalse(self.video_server.vod_downloads)
+        self.assertFalse(self.video_server.vod_selected_files)
+
+    def test_stream_other_file(self):
         """
-        Testing whether the right VOD stream is returned
+        Testing whether we know that another file of a download is being streamed
         """
-        self.mock_session.get_download = lambda _: None
-        self.assertEqual(self.video_server.get_vod_stream("abcd"), (None, None))
+        self.have_pieces.clear()
+        self.create_stream(0, 100)
+        self.assertFalse(self.video_server.is_streaming_other_file(self.mock_download, 0))
+        self.assertTrue(self.video_server.is_streaming_other_file(self.mock_download, 1))
 
 
 class TestVideoServerSession(TestAsServer):
@@ -6,13 +6,37 @@ from tempfile import mkstemp
 from twisted.internet.defer import Deferred, inlineCallbacks
 
 from Tribler.Core.DownloadConfig import DownloadStartupConfig
-from Tribler.Core.Libtorrent.LibtorrentDownloadImpl import VODFile
 from Tribler.Core.TorrentDef import TorrentDef
+from Tribler.Core.Utilities.network_utils import get_random_port
+from Tribler.Core.Video.VideoServer import VideoServer, VideoStream
 from Tribler.Core.simpledefs import DLMODE_VOD, DOWNLOAD, UPLOAD, dlstatus_strings
+from Tribler.Test.Core.base_test import MockObject
 from Tribler.Test.test_as_server import TestAsServer
 from Tribler.Test.tools import trial_timeout
 
 
+class MockRequest(MockObject):
+
+    def __init__(self):
+        self.data = ''
+        self.finished = Deferred()
+
+    def write(self, data):
+        self.data += data
+
+    def registerProducer(self, *_):
+        pass
+
+    def unregisterProducer(self):
+        pass
+
+    def notifyFinish(self):
+        return Deferred()
+
+    def finish(self):
+        self.finished.callback(self.data)
+
+
 class TestVideoOnDemand(TestAsServer):
 
     """
@@ -78,36 +102,31 @@ class TestVideoOnDemand(TestAsServer):
 
             self._logger.debug("Test: state_callback")
 
-            stream = VODFile(open(download.get_content_dest(), 'rb'), download)
-
             # Read last piece
             lastpieceoff = ((self.contentlen - 1) / self.piecelen) * self.piecelen
             lastpiecesize = self.contentlen - lastpieceoff
             self._logger.debug("stream: lastpieceoff %s %s", lastpieceoff, lastpiecesize)
-            self.stream_read(stream, lastpieceoff, lastpiecesize, self.piecelen)
-
-            # Read second,3rd,4th byte, only
-            secoff = 1
-            secsize = 3
-            blocksize = 3
-            self.stream_read(stream, secoff, secsize, blocksize)
-
-            # Read last byte
-            lastoff = self.contentlen - 1
-            lastsize = 1
-            self.stream_read(stream, lastoff, lastsize, self.piecelen)
-
-            self.test_deferred.callback(None)
+            self.stream_read(download, lastpieceoff, lastpiecesize)\
+                .addCallback(lambda _: self.stream_read(download, 1, 3))\
+                .addCallback(lambda _: self.stream_read(download, self.contentlen - 1, 1))\
+                .chainDeferred(self.test_deferred)
 
             return 0
         return 1.0
 
-    def stream_read(self, stream, off, size, blocksize):
-        stream.seek(off)
-        data = stream.read(blocksize)
-        self._logger.debug("stream: Got data %s", len(data))
-        self.assertEquals(len(data), size)
-        self.assertEquals(data, self.content[off:off + size])
+    def stream_read(self, download, off, size):
+        video_server = VideoServer(get_random_port(), self.session)
+        # The download is in VOD mode already
+        video_server.vod_downloads[download.get_def().get_infohash()] = 0
+
+        request = MockRequest()
+        VideoStream(video_server, request, download, 0, off, off + size).start()
+
+        def on_finished(data):
+            self._logger.debug("stream: Got data %s", len(data))
+            self.assertEquals(len(data), size)
+            self.assertEquals(data, self.content[off:off + size])
+        return request.finished.addCallback(on_finished)
 
     @trial_timeout(10)
     def test_99(self):
@@ -128,6 +128,20 @@ class TestDownloadState(TriblerCoreTest):
         handle.file_progress = lambda **_: [0]
         self.assertEqual(download_state.get_files_completion(), [('test.txt', 1.0)])
 
+    def test_get_peerlist_cached(self):
+        """
+        Testing whether the peers and tracker status are only retrieved once per state
+        """
+        self.mock_download.get_peerlist = lambda: [{'seed': True}, {'seed': False}, {'seed': False}]
+        self.mock_download.get_tracker_status = lambda: {'[DHT]': [0, 'Working']}
+        download_state = DownloadState(self.mock_download, MockObject(), None)
+
+        peerlist = download_state.get_peerlist()
+        self.mock_download.get_peerlist = lambda: []
+        self.assertIs(download_state.get_peerlist(), peerlist)
+        self.assertEqual(download_state.get_num_connected_seeds_peers(), (1, 2))
+        self.assertEqual(download_state.get_tracker_status(), {'[DHT]': [0, 'Working']})
+
     def test_get_availability(self):
         """
         Testing whether the right availability of a file is returned
@@ -150,3 +164,10 @@ class TestDownloadState(TriblerCoreTest):
         download_state.get_peerlist = lambda: [{'completed': 0.5, 'have': [1, 0]},
                                                {'completed': 0.9, 'have': [1, 0, 1]}]
         self.assertEqual(download_state.get_availability(), 0.0)
+
+        # Test whether peers that have all pieces are counted as seeders
+        download_state.lt_status.pieces = [0, 0, 0]
+        download_state.get_peerlist = lambda: [{'completed': 0.9, 'have': [1, 1, 1]},
+                                               {'completed': 0.5, 'have': [1, 1, 0]},
+                                               {'completed': 0.5, 'have': [0, 1, 1]}]
+        self.assertEqual(download_state.get_availability(), 2.0 + 1.0 / 3)
@@ -1,16 +1,21 @@
 from __future__ import absolute_import
 
 import os
+from binascii import hexlify
 from threading import RLock
 
 from nose.tools import raises
 
-from twisted.internet.defer import Deferred
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, fail, inlineCallbacks, succeed
+from twisted.internet.task import deferLater
 
 from Tribler.Core.APIImplementation.LaunchManyCore import TriblerLaunchMany
+from Tribler.Core.DownloadConfig import DownloadStartupConfig
 from Tribler.Core.Modules.payout_manager import PayoutManager
 from Tribler.Core.TorrentDef import TorrentDef
 from Tribler.Core.Utilities.configparser import CallbackConfigParser
+from Tribler.Core.exceptions import DownloadHopsUpdateError, SaveResumeDataError
 from Tribler.Core.simpledefs import DLSTATUS_DOWNLOADING, DLSTATUS_SEEDING, DLSTATUS_STOPPED_ON_ERROR
 from Tribler.Test.Core.base_test import MockObject, TriblerCoreTest
 from Tribler.Test.test_as_server import TestAsServer
@@ -59,6 +64,7 @@ class TestLaunchManyCore(TriblerCoreTest):
         dl_state.get_infohash = lambda: 'aaaa'
         dl_state.get_status = lambda: DLSTATUS_SEEDING
         dl_state.get_download = lambda: fake_download
+        dl_state.get_peerlist = lambda: [fake_peer]
 
         return fake_download, dl_state
 
@@ -108,6 +114,89 @@ class TestLaunchManyCore(TriblerCoreTest):
 
         return readd_deferred
 
+    @trial_timeout(10)
+    @inlineCallbacks
+    def test_update_downloads_hops(self):
+        """
+        Testing whether multiple downloads are re-added with the new hop count, and checkpointed together
+        """
+        def create_pstate():
+            pstate = CallbackConfigParser()
+            pstate.add_section('state')
+            return pstate
+
+        downloads = []
+        for name in ('a', 'b'):
+            download = MockObject()
+            download.tdef = name
+            download.copy = DownloadStartupConfig
+            download.get_persistent_download_config = create_pstate
+            download.save_resume_data = lambda name=name: succeed({'info-hash': name * 20})
+            downloads.append(download)
+
+        removed_downloads = []
+        added_downloads = []
+        checkpointed_downloads = []
+
+        def mocked_setup_download(tdef, dscfg, pstate=None):
+            added_downloads.append((tdef, dscfg.get_hops(), pstate.get('state', 'engineresumedata')))
+            return tdef, succeed(None)
+
+        self.lm.session.remove_download = lambda download: removed_downloads.append(download) or succeed(None)
+        self.lm.setup_download = mocked_setup_download
+        self.lm.checkpoint_downloads = lambda downloads: checkpointed_downloads.append(downloads) or succeed(None)
+
+        new_downloads = yield self.lm.update_downloads_hops(downloads, 2)
+
+        self.assertEqual(removed_downloads, downloads)
+        self.assertEqual(added_downloads, [('a', 2, {'info-hash': 'a' * 20}), ('b', 2, {'info-hash': 'b' * 20})])
+        self.assertEqual(checkpointed_downloads, [['a', 'b']])
+        self.assertEqual(new_downloads, ['a', 'b'])
+
+    @trial_timeout(10)
+    @inlineCallbacks
+    def test_update_downloads_hops_failure(self):
+        """
+        Testing whether downloads are re-added with the new hop count when updating other downloads fails
+        """
+        def create_pstate():
+            pstate = CallbackConfigParser()
+            pstate.add_section('state')
+            return pstate
+
+        downloads = {}
+        for name in ('a', 'b', 'c'):
+            tdef = MockObject()
+            tdef.get_infohash = lambda name=name: name * 20
+            download = MockObject()
+            download.tdef = name
+            download.get_def = lambda tdef=tdef: tdef
+            download.copy = DownloadStartupConfig
+            download.get_persistent_download_config = create_pstate
+            download.save_resume_data = lambda name=name: succeed({'info-hash': name * 20})
+            downloads[name] = download
+        downloads['a'].save_resume_data = lambda: fail(SaveResumeDataError("test error"))
+
+        added_downloads = []
+
+        def mocked_remove_download(download):
+            return fail(RuntimeError("test error")) if download is downloads['b'] else succeed(None)
+
+        def mocked_setup_download(tdef, dscfg, pstate=None):
+            added_downloads.append((tdef, dscfg.get_hops()))
+            return tdef, succeed(None)
+
+        self.lm.session.remove_download = mocked_remove_download
+        self.lm.setup_download = mocked_setup_download
+        self.lm.checkpoint_downloads = lambda _: succeed(None)
+
+        try:
+            yield self.lm.update_downloads_hops([downloads[name] for name in ('a', 'b', 'c')], 2)
+            self.fail("The update should report the downloads that failed")
+        except DownloadHopsUpdateError as e:
+            self.assertEqual(e.infohashes, [hexlify('a' * 20), hexlify('b' * 20)])
+        self.assertEqual(added_downloads, [('c', 2)])
+
     def test_update_payout_balance(self):
         """
         Test whether the balance of peers is correctly updated
@@ -129,21 +218,67 @@ class TestLaunchManyCore(TriblerCoreTest):
         """
         Test whether we are resuming downloads after loading checkpoint
         """
-        def mocked_resume_download(filename, setupDelay=3):
+        def mocked_resume_download_from_state(filename, *_):
             self.assertTrue(filename.endswith('abcd.state'))
-            self.assertEqual(setupDelay, 0)
-            mocked_resume_download.called = True
+            mocked_resume_download_from_state.called = True
 
-        mocked_resume_download.called = False
+        mocked_resume_download_from_state.called = False
         self.lm.session.get_downloads_pstate_dir = lambda: self.session_base_dir
 
         with open(os.path.join(self.lm.session.get_downloads_pstate_dir(), 'abcd.state'), 'wb') as state_file:
             state_file.write(b"hi")
 
         self.lm.initComplete = True
-        self.lm.resume_download = mocked_resume_download
-        self.lm.load_checkpoint()
-        self.assertTrue(mocked_resume_download.called)
+        self.lm.load_resume_state = lambda _: (None, None, None)
+        self.lm.resume_download_from_state = mocked_resume_download_from_state
+        return self.lm.load_checkpoint().addCallback(
+            lambda _: self.assertTrue(mocked_resume_download_from_state.called))
+
+    def test_resume_downloads_failure(self):
+        """
+        Test whether the other downloads of a batch are resumed when resuming one of them fails
+        """
+        resumed = []
+
+        def mocked_resume_download_from_state(filename, *_):
+            if filename == 'a.state':
+                raise ValueError("test error")
+            resumed.append(filename)
+
+        self.lm.resume_download_from_state = mocked_resume_download_from_state
+        self.lm.resume_downloads([('a.state', None, None, None), ('b.state', None, None, None)])
+        self.assertEqual(resumed, ['b.state'])
+
+    def test_load_resume_states_corrupt(self):
+        """
+        Test whether corrupt checkpoints are skipped when loading checkpoints
+        """
+        filename = os.path.join(self.session_base_dir, 'abcd.state')
+        with open(filename, 'wb') as state_file:
+            state_file.write(b"hi")
+
+        self.assertEqual(self.lm.load_resume_states([filename]), [])
+
+    def test_init_download_state_store(self):
+        """
+        Test whether existing checkpoints are moved to the download state store
+        """
+        self.lm.session.get_downloads_pstate_dir = lambda: self.session_base_dir
+        pstate = CallbackConfigParser()
+        pstate.add_section('state')
+        pstate.set('state', 'engineresumedata', None)
+        filename = os.path.join(self.session_base_dir, '61' * 20 + '.state')
+        pstate.write_file(filename)
+
+        self.lm.init_download_state_store()
+        self.lm.shutdown_task_manager()
+        self.assertFalse(os.path.exists(filename))
+        self.assertEqual(self.lm.download_state_store.get_infohashes(), ['61' * 20])
+        self.assertIsNotNone(self.lm.load_download_pstate_noexc('a' * 20))
+
+        self.lm.remove_pstate('a' * 20)
+        return deferLater(reactor, 0, lambda: self.assertFalse(self.lm.download_state_store.has('a' * 20)))\
+            .addCallback(lambda _: self.lm.download_state_store.close())
 
 
 class TestLaunchManyCoreFullSession(TestAsServer):
@@ -1,8 +1,10 @@
 from __future__ import absolute_import
 
 import os
+from hashlib import sha1
 
-from Tribler.Core.Utilities.torrent_utils import create_torrent_file, get_info_from_handle
+from Tribler.Core.Utilities.torrent_utils import close_hash_pool, create_torrent_file, get_hash_pool, \
+    get_info_from_handle, hash_pieces
 from Tribler.Test.Core.base_test import MockObject, TriblerCoreTest
 
 
@@ -51,3 +53,54 @@ class TriblerCoreTestTorrentUtils(TriblerCoreTest):
 
         mock_handle.torrent_file = mock_get_torrent_file
         self.assertIsNone(get_info_from_handle(mock_handle))
+
+    def get_test_file_list(self):
+        file_list = []
+        for path in [os.path.join(self.TORRENT_DATA_DIR, self.FILE1_NAME),
+                     os.path.join(self.TORRENT_DATA_DIR, self.FILE2_NAME)]:
+            file_list.append((path, os.path.getsize(path)))
+        file_list.insert(1, (None, 100))
+        return file_list
+
+    def test_hash_pieces(self):
+        """
+        Test whether hashing the pieces with multiple threads gives the same hashes as hashing them one by one
+        """
+        file_list = self.get_test_file_list()
+        data = b''
+        for path, size in file_list:
+            if path:
+                with open(path, 'rb') as test_file:
+                    data += test_file.read()
+            else:
+                data += b'\x00' * size
+
+        piece_length = 16
+        expected_hashes = [sha1(data[index:index + piece_length]).digest()
+                           for index in range(0, len(data), piece_length)]
+        self.assertEqual(hash_pieces(file_list, piece_length, num_threads=1), expected_hashes)
+        self.assertEqual(hash_pieces(file_list, piece_length, num_threads=3), expected_hashes)
+
+    def test_hash_pieces_first_piece(self):
+        """
+        Test whether we can skip the first pieces when hashing
+        """
+        file_list = self.get_test_file_list()
+        hashes = hash_pieces(file_list, 16)
+        self.assertEqual(hash_pieces(file_list, 16, first_piece=5), hashes[5:])
+        self.assertEqual(hash_pieces(file_list, 16, first_piece=len(hashes)), [])
+
+    def test_hash_pieces_error(self):
+        """
+        Test whether the hash threads are reused, and replaced after an error
+        """
+        file_list = self.get_test_file_list()
+        hash_pieces(file_list, 16)
+        pool = get_hash_pool()
+        hash_pieces(file_list, 16)
+        self.assertIs(get_hash_pool(), pool)
+
+        file_list.append((os.path.join(self.session_base_dir, 'missing'), 100))
+        self.assertRaises(IOError, hash_pieces, file_list, 16)
+        self.assertIsNot(get_hash_pool(), pool)
+        close_hash_pool()
@@ -0,0 +1,260 @@
+"""
+Benchmark of the order book and the matching engine of the market community.
+
+The benchmark replays a synthetic order flow, generated from a seed, against an order book with a price-time matching
+engine, and reports the throughput and latency percentiles of the insert, match and cancel operations. It does not
+need a network or a running Tribler session, e.g.:
+
+    python -m Tribler.community.market.benchmark --orders 100000 --asset-pairs BTC/MB,DUM1/DUM2 --cancel-rate 0.2
+"""
+from __future__ import absolute_import, division, print_function
+
+import random
+import sys
+from timeit import default_timer
+
+from twisted.python import usage
+
+from Tribler.community.market.core.assetamount import AssetAmount
+from Tribler.community.market.core.assetpair import AssetPair
+from Tribler.community.market.core.matching_engine import MatchingEngine, PriceTimeStrategy
+from Tribler.community.market.core.message import TraderId
+from Tribler.community.market.core.order import OrderId, OrderNumber
+from Tribler.community.market.core.orderbook import OrderBook
+from Tribler.community.market.core.tick import Ask, Bid
+from Tribler.community.market.core.timeout import Timeout
+from Tribler.community.market.core.timestamp import Timestamp
+
+OPERATIONS = ("insert", "match", "cancel")
+PERCENTILES = (50, 90, 99)
+
+
+class Options(usage.Options):
+    optParameters = [
+        ["orders", "n", 10000, "The number of orders in the order flow", int],
+        ["asset-pairs", "a", "BTC/MB", "Comma separated list of asset pairs, i.e. BTC/MB,DUM1/DUM2", str],
+        ["price-mean", None, 100.0, "The mean price of the orders, in the second asset per unit of the first", float],
+        ["price-stddev", None, 5.0, "The standard deviation of the prices of the orders", float],
+        ["max-quantity", None, 100, "The maximum quantity of the first asset in an order", int],
+        ["cancel-rate", "c", 0.1, "The chance that an order is followed by the cancellation of a random order", float],
+        ["traders", "t", 100, "The number of traders that place the orders", int],
+        ["seed", "s", 42, "The seed of the generated order flow", int],
+    ]
+
+    def postOptions(self):
+        try:
+            self["asset-pairs"] = parse_asset_pairs(self["asset-pairs"])
+        except ValueError as e:
+            raise usage.UsageError(str(e))
+        if not 0 <= self["cancel-rate"] <= 1:
+            raise usage.UsageError("The cancel rate should be between 0 and 1")
+        if self["orders"] < 1 or self["max-quantity"] < 1 or self["traders"] < 2:
+            raise usage.UsageError("We need at least one order, a quantity of one and two traders")
+
+
+def parse_asset_pairs(asset_pairs):
+    """
+    Parse a comma separated list of asset pairs.
+    :param asset_pairs: The asset pairs, i.e. BTC/MB,DUM1/DUM2
+    :type asset_pairs: str
+    :return: A list of tuples with the asset ids of the first and second asset of every pair
+    :raises ValueError: Thrown when an asset pair is invalid
+    """
+    parsed_pairs = []
+    for asset_pair in asset_pairs.split(','):
+        asset_ids = asset_pair.strip().split('/')
+        if len(asset_ids) != 2 or not asset_ids[0] or not asset_ids[1]:
+            raise ValueError("Invalid asset pair %s" % asset_pair)
+        # The order book expects the assets of a pair in alphabetical order
+        parsed_pairs.append(tuple(sorted(asset_ids)))
+    return parsed_pairs
+
+
+def generate_order_flow(num_orders, asset_pairs, price_mean, price_stddev, max_quantity, cancel_rate, num_traders,
+                        seed):
+    """
+    Generate a reproducible order flow. The prices of the orders are normally distributed around the mean price and
+    rounded to whole units, so orders of different traders end up in the same price levels.
+    :return: A generator of ("insert", tick) and ("cancel", position) events, where the position (between 0 and 1)
+             determines which of the orders in the book is cancelled.
+    """
+    rand = random.Random(seed)
+    trader_ids = [TraderId(("%040x" % trader_index).encode('ascii')) for trader_index in range(num_traders)]
+    order_numbers = [0] * num_traders
+
+    for _ in range(num_orders):
+        trader_index = rand.randrange(num_traders)
+        order_numbers[trader_index] += 1
+        order_id = OrderId(trader_ids[trader_index], OrderNumber(order_numbers[trader_index]))
+
+        first_asset_id, second_asset_id = rand.choice(asset_pairs)
+        price = max(1, int(round(rand.gauss(price_mean, price_stddev))))
+        quantity = rand.randint(1, max_quantity)
+        assets = AssetPair(AssetAmount(quantity, first_asset_id), AssetAmount(price * quantity, second_asset_id))
+
+        tick_class = Ask if rand.random() < 0.5 else Bid
+        yield "insert", tick_class(order_id, assets, Timeout(3600), Timestamp.now())
+
+        if rand.random() < cancel_rate:
+            yield "cancel", rand.random()
+
+
+def get_percentile(sorted_values, percentile):
+    """
+    Return the given percentile of a sorted list of values, using the nearest rank.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[int(round(percentile / 100 * (len(sorted_values) - 1)))]
+
+
+class MarketBenchmark(object):
+    """
+    Replays an order flow against an order book and a matching engine, and keeps track of the latency of every
+    operation. Matched quantities are traded immediately, and orders that are completely traded leave the book.
+    """
+
+    def __init__(self):
+        self.order_book = OrderBook()
+        self.matching_engine = MatchingEngine(PriceTimeStrategy(self.order_book))
+        self.latencies = {operation: [] for operation in OPERATIONS}
+        self.order_ids = []  # The order ids of the ticks in the book, for picking the order that is cancelled
+        self.order_id_indices = {}
+        self.num_matches = 0
+        self.traded_quantity = 0
+
+    def run(self, order_flow):
+        """
+        Replay the given order flow and return the results.
+        :rtype: dict
+        """
+        for event, argument in order_flow:
+            if event == "insert":
+                self.insert(argument)
+            else:
+                self.cancel(argument)
+        return self.get_results()
+
+    def insert(self, tick):
+        start_time = default_timer()
+        if tick.is_ask():
+            self.order_book.insert_ask(tick)
+        else:
+            self.order_book.insert_bid(tick)
+        self.latencies["insert"].append(default_timer() - start_time)
+        self.add_order_id(tick.order_id)
+        tick_entry = self.order_book.get_tick(tick.order_id)
+
+        start_time = default_timer()
+        matched_ticks = self.matching_engine.match(tick_entry)
+        self.latencies["match"].append(default_timer() - start_time)
+
+        for _, matched_tick_entry, quantity in matched_ticks:
+            self.num_matches += 1
+            self.traded_quantity += quantity
+            tick_entry.traded += quantity
+            matched_tick_entry.traded += quantity
+            if matched_tick_entry.traded >= matched_tick_entry.assets.first.amount:
+                self.remove_tick(matched_tick_entry.order_id)
+        if tick_entry.traded >= tick_entry.assets.first.amount:
+            self.remove_tick(tick.order_id)
+
+    def cancel(self, position):
+        if not self.order_ids:
+            return
+        order_id = self.order_ids[int(position * len(self.order_ids))]
+
+        start_time = default_timer()
+        self.order_book.remove_tick(order_id)
+        self.latencies["cancel"].append(default_timer() - start_time)
+        self.remove_order_id(order_id)
+
+    def remove_tick(self, order_id):
+        self.order_book.remove_tick(order_id)
+        self.remove_order_id(order_id)
+
+    def add_order_id(self, order_id):
+        self.order_id_indices[order_id] = len(self.order_ids)
+        self.order_ids.append(order_id)
+
+    def remove_order_id(self, order_id):
+        # Move the last order id into the freed position, so we can remove an order id in constant time
+        index = self.order_id_indices.pop(order_id)
+        last_order_id = self.order_ids.pop()
+        if index < len(self.order_ids):
+            self.order_ids[index] = last_order_id
+            self.order_id_indices[last_order_id] = index
+
+    def get_results(self):
+        """
+        Return the number of operations, the throughput (operations per second) and the latency percentiles (in
+        seconds) of every operation, together with the number of matches and the traded quantity.
+        :rtype: dict
+        """
+        results = {
+            "matches": self.num_matches,
+            "traded_quantity": self.traded_quantity,
+            "ticks_in_book": len(self.order_ids),
+        }
+        for operation in OPERATIONS:
+            latencies = sorted(self.latencies[operation])
+            total_time = sum(latencies)
+            operation_results = {
+                "count": len(latencies),
+                "throughput": len(latencies) / total_time if total_time else 0.0,
+                "max": latencies[-1] if latencies else 0.0,
+            }
+            for percentile in PERCENTILES:
+                operation_results["p%d" % percentile] = get_percentile(latencies, percentile)
+            results[operation] = operation_results
+        return results
+
+    def shutdown(self):
+        self.order_book.shutdown_task_manager()
+
+
+def run_benchmark(num_orders=10000, asset_pairs=(("BTC", "MB"),), price_mean=100.0, price_stddev=5.0,
+                  max_quantity=100, cancel_rate=0.1, num_traders=100, seed=42):
+    """
+    Generate an order flow with the given parameters, replay it and return the results of the benchmark.
+    :rtype: dict
+    """
+    benchmark = MarketBenchmark()
+    try:
+        return benchmark.run(generate_order_flow(num_orders, asset_pairs, price_mean, price_stddev, max_quantity,
+                                                 cancel_rate, num_traders, seed))
+    finally:
+        benchmark.shutdown()
+
+
+def format_results(results):
+    lines = ["%-8s %10s %14s %10s %10s %10s %10s" % ("", "count", "ops/s", "p50 (us)", "p90 (us)", "p99 (us)",
+                                                     "max (us)")]
+    for operation in OPERATIONS:
+        operation_results = results[operation]
+        lines.append("%-8s %10d %14.1f %10.1f %10.1f %10.1f %10.1f" % (
+            operation, operation_results["count"], operation_results["throughput"],
+            operation_results["p50"] * 1e6, operation_results["p90"] * 1e6, operation_results["p99"] * 1e6,
+            operation_results["max"] * 1e6))
+    lines.append("%d matches, %d traded, %d ticks left in the order book" %
+                 (results["matches"], results["traded_quantity"], results["ticks_in_book"]))
+    return "\n".join(lines)
+
+
+def main(argv):
+    options = Options()
+    try:
+        options.parseOptions(argv)
+    except usage.UsageError as e:
+        print("%s\n%s" % (e, options))
+        return 1
+
+    results = run_benchmark(options["orders"], options["asset-pairs"], options["price-mean"],
+                            options["price-stddev"], options["max-quantity"], options["cancel-rate"],
+                            options["traders"], options["seed"])
+    print(format_results(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,7 +1,9 @@
 from __future__ import absolute_import
 
+import time
 from base64 import b64decode
 from binascii import hexlify, unhexlify
+from collections import OrderedDict
 from functools import wraps
 
 from twisted.internet import reactor
@@ -40,7 +42,6 @@ from Tribler.community.market.reputation.temporal_pagerank_manager import Tempor
 from Tribler.pyipv8.ipv8.attestation.trustchain.listener import BlockListener
 from Tribler.pyipv8.ipv8.attestation.trustchain.payload import HalfBlockPairPayload
 from Tribler.pyipv8.ipv8.community import Community, lazy_wrapper
-from Tribler.pyipv8.ipv8.messaging.bloomfilter import BloomFilter
 from Tribler.pyipv8.ipv8.messaging.payload_headers import BinMemberAuthenticationPayload
 from Tribler.pyipv8.ipv8.messaging.payload_headers import GlobalTimeDistributionPayload
 from Tribler.pyipv8.ipv8.peer import Peer
@@ -65,6 +66,12 @@ MSG_PING = 20
 MSG_PONG = 21
 MSG_MATCH_DONE = 22
 
+# The interval (in seconds) at which we compare an order book sync request of a peer against all our ticks, instead of
+# only against the ticks that we inserted since the last sync request of that peer
+FULL_ORDERBOOK_SYNC_INTERVAL = 300
+# The maximum number of matches of an order that wait for the reserved quantity of that order to be released
+MAX_QUEUED_MATCHES = 20
+
 
 def synchronized(f):
     @wraps(f)
@@ -97,6 +104,8 @@ class ProposedTradeRequestCache(NumberCache):
             self.community.send_decline_match_message(self.match_id, match_message.matchmaker_trader_id,
                                                       DeclineMatchReason.OTHER)
 
+        self.community.process_queued_matches(order.order_id)
+
 
 class OrderStatusRequestCache(RandomNumberCache):
 
@@ -141,6 +150,7 @@ class MarketCommunity(Community, BlockListener):
                                  "30f28b82"))
     PROTOCOL_VERSION = 2
     BLOCK_CLASS = MarketBlock
+    QUEUED_MATCH_TIMEOUT = 10  # Seconds that a queued match may wait for quantity, before we decline it
     DB_NAME = 'market'
 
     def __init__(self, *args, **kwargs):
@@ -166,7 +176,12 @@ class MarketCommunity(Community, BlockListener):
         self.market_database = MarketDB(db_working_dir, self.DB_NAME)
         self.matching_engine = None
         self.incoming_match_messages = {}  # Map of TraderId -> Message (we save all incoming matches)
+        self.queued_matches = {}  # Map of OrderId -> match payloads that wait for quantity of that order
+        self.pending_match_order_ids = []  # The ticks that we match again once we have processed all responses
         self.transaction_manager = None
+        # We load the tx_done blocks from the database once, new blocks are added when we receive them
+        self.reputation_manager = TemporalPagerankReputationManager(
+            self.trustchain.persistence.get_blocks_with_type(b'tx_done'))
         self.reputation_dict = {}
         self.use_local_address = False
         self.matching_enabled = True
@@ -174,6 +189,9 @@ class MarketCommunity(Community, BlockListener):
         self.matchmakers = set()
         self.request_cache = RequestCache()
         self.cancelled_orders = set()  # Keep track of cancelled orders so we don't add them again to the orderbook.
+        # Map of peer mid -> (order book version, time of the last full sync) at the last order book sync of that peer,
+        # ordered by the time of the last full sync.
+        self.orderbook_sync_versions = OrderedDict()
 
         if use_database:
             order_repository = DatabaseOrderRepository(self.mid, self.market_database)
@@ -270,6 +288,7 @@ class MarketCommunity(Community, BlockListener):
         """
         self.order_book = DatabaseOrderBook(self.market_database)
         self.order_book.restore_from_database()
+        self.orderbook_sync_versions = OrderedDict()
         self.matching_engine = MatchingEngine(PriceTimeStrategy(self.order_book))
         self.is_matchmaker = True
 
@@ -277,6 +296,8 @@ class MarketCommunity(Community, BlockListener):
         """
         Disable the matchmaker status of this node
         """
+        if self.order_book:
+            self.order_book.shutdown_task_manager()
         self.order_book = None
         self.matching_engine = None
         self.is_matchmaker = False
@@ -317,20 +338,13 @@ class MarketCommunity(Community, BlockListener):
         """
         Send an orderbook sync message to a specific peer.
         """
-        bloomfilter = self.get_orders_bloomfilter()
+        bloomfilter = self.order_book.get_order_ids_bloomfilter()
         auth = BinMemberAuthenticationPayload(self.my_peer.public_key.key_to_bin()).to_pack_list()
         payload = OrderbookSyncPayload(TraderId(self.mid), Timestamp.now(), bloomfilter).to_pack_list()
 
         packet = self._ez_pack(self._prefix, MSG_BOOK_SYNC, [auth, payload])
         self.endpoint.send(peer.address, packet)
 
-    def get_orders_bloomfilter(self):
-        order_ids = [str(order_id) for order_id in self.order_book.get_order_ids()]
-        orders_bloom_filter = BloomFilter(0.005, max(len(order_ids), 1), prefix=' ')
-        if order_ids:
-            orders_bloom_filter.add_keys(order_ids)
-        return orders_bloom_filter
-
     @inlineCallbacks
     def unload(self):
         self.request_cache.clear()
@@ -373,6 +387,22 @@ class MarketCommunity(Community, BlockListener):
             if self.order_book.tick_exists(order_id):
                 self.match(self.order_book.get_tick(order_id))
 
+    def schedule_match(self, order_id):
+        """
+        Match the tick with the given order id again, after we have processed the other messages that are waiting.
+        The responses to the matches of a tick usually arrive together, so we only match the tick once for all of them.
+        :param order_id: The order id of the tick to match
+        """
+        if order_id not in self.pending_match_order_ids:
+            self.pending_match_order_ids.append(order_id)
+        if not self.is_pending_task_active("match_pending_ticks"):
+            self.register_task("match_pending_ticks", reactor.callLater(0, self.match_pending_ticks))
+
+    def match_pending_ticks(self):
+        order_ids, self.pending_match_order_ids = self.pending_match_order_ids, []
+        if self.is_matchmaker:
+            self.match_order_ids(order_ids)
+
     def match(self, tick):
         """
         Try to find a match for a specific tick and send proposed trade messages if there is a match
@@ -506,7 +536,25 @@ class MarketCommunity(Community, BlockListener):
         if not self.is_matchmaker:
             return
 
-        for order_id in self.order_book.get_order_ids():
+        # The ticks that we had at the last sync with this peer are in its order book, or have been sent to it then.
+        # Since a block can get lost, we check all ticks every once in a while.
+        # Peers of which the last full sync has expired get a full sync anyway, so we forget about them.
+        now = time.time()
+        while self.orderbook_sync_versions:
+            oldest_mid = next(iter(self.orderbook_sync_versions))
+            if now - self.orderbook_sync_versions[oldest_mid][1] < FULL_ORDERBOOK_SYNC_INTERVAL:
+                break
+            del self.orderbook_sync_versions[oldest_mid]
+
+        if peer.mid in self.orderbook_sync_versions:
+            last_version, last_full_sync = self.orderbook_sync_versions[peer.mid]
+            order_ids = self.order_book.get_order_ids_since(last_version)
+            self.orderbook_sync_versions[peer.mid] = (self.order_book.version, last_full_sync)
+        else:
+            order_ids = self.order_book.get_order_ids()
+            self.orderbook_sync_versions[peer.mid] = (self.order_book.version, now)
+
+        for order_id in order_ids:
             if str(order_id) not in payload.bloomfilter:
                 is_ask = self.order_book.ask_exists(order_id)
                 entry = self.order_book.get_ask(order_id) if is_ask else self.order_book.get_bid(order_id)
@@ -664,6 +712,9 @@ class MarketCommunity(Community, BlockListener):
         We received a block for the market community.
         Process it accordingly, after checking the version number first.
         """
+        if block.type == "tx_done":
+            self.reputation_manager.add_blocks([block])
+
         if block.transaction.get("version") != self.PROTOCOL_VERSION:
             return
 
@@ -812,10 +863,15 @@ class MarketCommunity(Community, BlockListener):
                         subject = NTFY_MARKET_ON_ASK if isinstance(tick, Ask) else NTFY_MARKET_ON_BID
                         self.tribler_session.notifier.notify(subject, NTFY_UPDATE, None, tick.to_dictionary())
 
-                    # Check for new matches against the orders of this node
-                    for order in self.order_manager.order_repository.find_all():
-                        order_tick_entry = self.order_book.get_tick(order.order_id)
-                        if not order.is_valid() or not order_tick_entry:
+                    # Check for new matches against the orders of this node. The new tick can only create matches
+                    # with our orders on the other side of the order book, with a price that crosses its price.
+                    my_trader_id = TraderId(self.mid)
+                    for order_tick_entry in self.order_book.get_crossing_tick_entries(tick):
+                        if order_tick_entry.order_id.trader_id != my_trader_id:
+                            continue
+
+                        order = self.order_manager.order_repository.find_by_id(order_tick_entry.order_id)
+                        if not order or not order.is_valid():
                             continue
 
                         self.match(order_tick_entry.tick)
@@ -886,12 +942,28 @@ class MarketCommunity(Community, BlockListener):
             self.logger.warning("Cannot find order %s in order repository!", order_id)
             return
 
+        if any(queued.match_id == payload.match_id for queued in self.queued_matches.get(order_id, [])):
+            self.logger.info("Ignoring match %s, since it is queued already", payload.match_id)
+            return
+
         # Store the message for later
         self.incoming_match_messages[payload.match_id] = payload
 
         if order.status == "unverified":
             # The order is not verified yet but it might be very soon. We simply save it and process it later.
             return
+        elif order.status == "open" and order.available_quantity == 0 and order.reserved_quantity > 0 \
+                and len(self.queued_matches.get(order_id, [])) < MAX_QUEUED_MATCHES:
+            # All quantity of the order is reserved for outstanding proposals. Instead of declining the match, we wait
+            # until some of the quantity is released again, or until the order is completed. Since the matchmaker keeps
+            # the quantity of both ticks reserved meanwhile, we decline the match if we have to wait too long.
+            self.queued_matches.setdefault(order_id, []).append(payload)
+            # A match that is queued again keeps the expiry time it got when it was queued first
+            if not self.is_pending_task_active("expire_match_%s" % payload.match_id):
+                self.register_task("expire_match_%s" % payload.match_id,
+                                   reactor.callLater(self.QUEUED_MATCH_TIMEOUT, self.on_queued_match_timeout,
+                                                     order_id, payload))
+            return
         elif order.status != "open" or order.available_quantity == 0:
             # Send a declined trade back
             decline_reason = DeclineMatchReason.ORDER_COMPLETED if order.status != "open" \
@@ -918,6 +990,7 @@ class MarketCommunity(Community, BlockListener):
                 self.send_decline_match_message(payload.match_id,
                                                 payload.matchmaker_trader_id,
                                                 DeclineMatchReason.OTHER)
+                self.process_queued_matches(order.order_id)
 
         # Reserve the quantity
         order.reserve_quantity_for_tick(other_order_id, propose_quantity)
@@ -932,6 +1005,31 @@ class MarketCommunity(Community, BlockListener):
 
         reactor.callFromThread(get_address)
 
+    def process_queued_matches(self, order_id):
+        """
+        Process the matches that are waiting for the reserved quantity of an order to be released. We propose trades
+        for these matches while the order has quantity available, and decline all of them if the order has been
+        completed or cancelled in the meantime.
+        :param order_id: The order id of our order
+        """
+        for payload in self.queued_matches.pop(order_id, []):
+            self.process_match_payload(payload)
+            if payload not in self.queued_matches.get(order_id, []):
+                self.cancel_pending_task("expire_match_%s" % payload.match_id)
+
+    def on_queued_match_timeout(self, order_id, payload):
+        """
+        Decline a queued match, since the reserved quantity of our order has not been released in time.
+        """
+        queued_payloads = self.queued_matches.get(order_id, [])
+        if payload not in queued_payloads:
+            return
+
+        queued_payloads.remove(payload)
+        if not queued_payloads:
+            del self.queued_matches[order_id]
+        self.send_decline_match_message(payload.match_id, payload.matchmaker_trader_id, DeclineMatchReason.OTHER)
+
     def send_accept_match_message(self, match_id, matchmaker_trader_id, quantity):
         address = self.lookup_ip(matchmaker_trader_id)
 
@@ -1019,12 +1117,13 @@ class MarketCommunity(Community, BlockListener):
             self.order_book.completed_orders.add(tick_entry.order_id)
         elif tick_entry:
             # Search for a new match
-            self.match(tick_entry.tick)
+            self.schedule_match(tick_entry.order_id)
 
     def cancel_order(self, order_id):
         order = self.order_manager.order_repository.find_by_id(order_id)
         if order and (order.status == "open" or order.status == "unverified"):
             self.order_manager.cancel_order(order_id)
+            self.process_queued_matches(order_id)
 
             if self.is_matchmaker:
                 self.order_book.remove_tick(order_id)
@@ -1177,6 +1276,7 @@ class MarketCommunity(Community, BlockListener):
             match_decline_reason = DeclineMatchReason.OTHER_ORDER_COMPLETED
 
         self.send_decline_match_message(request.match_id, match_payload.matchmaker_trader_id, match_decline_reason)
+        self.process_queued_matches(order.order_id)
 
     # Counter trade
     def send_counter_trade(self, counter_trade):
@@ -1230,6 +1330,7 @@ class MarketCommunity(Community, BlockListener):
             match_payload = self.incoming_match_messages[request.match_id]
             self.send_accept_match_message(request.match_id, match_payload.matchmaker_trader_id,
                                            counter_trade.assets.first.amount)
+            self.process_queued_matches(order.order_id)
 
     # Transactions
     def start_transaction(self, proposed_trade, match_id):
@@ -1411,6 +1512,7 @@ class MarketCommunity(Community, BlockListener):
         if success and order.is_ask():  # Release some of the reserved quantity
             order.add_trade(transaction.partner_order_id, transferred_assets.amount)
             self.order_manager.order_repository.update(order)
+            self.process_queued_matches(order.order_id)
 
         payment_message = self.transaction_manager.create_payment_message(
             TraderId(self.mid), payment_id, transaction, transferred_assets, success)
@@ -1473,6 +1575,7 @@ class MarketCommunity(Community, BlockListener):
         if payment.transferred_assets.amount > 0 and not order.is_ask():  # Release some of the reserved quantity
             order.add_trade(transaction.partner_order_id, payment.transferred_assets.amount)
             self.order_manager.order_repository.update(order)
+            self.process_queued_matches(order.order_id)
 
         if self.tribler_session:
             self.tribler_session.notifier.notify(NTFY_MARKET_ON_PAYMENT_RECEIVED, NTFY_UPDATE, None,
@@ -1518,6 +1621,7 @@ class MarketCommunity(Community, BlockListener):
                                             transaction.assets.first.amount -
                                             transaction.transferred_assets.first.amount)
             self.order_manager.order_repository.update(order)
+            self.process_queued_matches(order.order_id)
 
     def notify_transaction_complete(self, tx_dict, mine=False):
         if self.tribler_session:
@@ -1564,22 +1668,20 @@ class MarketCommunity(Community, BlockListener):
         self.order_book.update_ticks(tx_dict["ask"], tx_dict["bid"], quantity)
         ask_order_id = OrderId(TraderId(tx_dict["ask"]["trader_id"]), OrderNumber(tx_dict["ask"]["order_number"]))
         bid_order_id = OrderId(TraderId(tx_dict["bid"]["trader_id"]), OrderNumber(tx_dict["bid"]["order_number"]))
-        self.match_order_ids([ask_order_id, bid_order_id])
+        self.schedule_match(ask_order_id)
+        self.schedule_match(bid_order_id)
 
         # Broadcast the pair of blocks
         self.trustchain.send_block_pair(block1, block2)
 
         order_id = OrderId(TraderId(tx_dict["tx"]["trader_id"]), OrderNumber(tx_dict["tx"]["order_number"]))
-        tick_entry_sender = self.order_book.get_tick(order_id)
-        if tick_entry_sender:
-            self.match(tick_entry_sender.tick)
+        self.schedule_match(order_id)
 
     def compute_reputation(self):
         """
         Compute the reputation of peers in the community
         """
-        rep_manager = TemporalPagerankReputationManager(self.trustchain.persistence.get_all_blocks())
-        self.reputation_dict = rep_manager.compute(self.my_peer.public_key.key_to_bin())
+        self.reputation_dict = self.reputation_manager.compute(self.my_peer.public_key.key_to_bin())
 
 
 class MarketTestnetCommunity(MarketCommunity):
@@ -10,6 +10,7 @@ class AssetAmount(object):
     This class represents a specific number of assets. It contains various utility methods to add/substract asset
     amounts.
     """
+    __slots__ = ('_amount', '_asset_id')
 
     def __init__(self, amount, asset_id):
         """
@@ -2,6 +2,8 @@
 
 from __future__ import absolute_import
 
+from fractions import Fraction
+
 from Tribler.community.market.core.assetamount import AssetAmount
 from Tribler.community.market.core.price import Price
 
@@ -16,6 +18,7 @@ class AssetPair(object):
     An asset pair represents a pair of specific amounts of assets, i.e. 10 BTC - 20 MB.
     It is used when dealing with orders in the market.
     """
+    __slots__ = ('first', 'second', '_price')
 
     def __init__(self, first, second):
         if first.asset_id > second.asset_id:
@@ -23,6 +26,7 @@ class AssetPair(object):
 
         self.first = first
         self.second = second
+        self._price = None
 
     def __eq__(self, other):
         if not isinstance(other, AssetPair):
@@ -46,7 +50,10 @@ class AssetPair(object):
         """
         Return a Price object of this asset pair, which expresses the second asset into the first asset.
         """
-        return Price(float(self.second.amount) / float(self.first.amount), self.second.asset_id, self.first.asset_id)
+        if self._price is None:
+            self._price = Price(Fraction(self.second.amount, self.first.amount),
+                                self.second.asset_id, self.first.asset_id)
+        return self._price
 
     def proportional_downscale(self, new_amount):
         """
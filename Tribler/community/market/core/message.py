@@ -7,6 +7,7 @@ from Tribler.community.market.core.timestamp import Timestamp
 
 class TraderId(object):
     """Immutable class for representing the id of a trader."""
+    __slots__ = ('_trader_id',)
 
     def __init__(self, trader_id):
         """
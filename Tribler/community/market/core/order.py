@@ -19,6 +19,7 @@ class TickWasNotReserved(Exception):
 
 class OrderNumber(object):
     """Immutable class for representing the number of an order."""
+    __slots__ = ('_order_number',)
 
     def __init__(self, order_number):
         """
@@ -56,7 +57,11 @@ class OrderNumber(object):
 
 
 class OrderId(object):
-    """Immutable class for representing the id of an order."""
+    """
+    Immutable class for representing the id of an order. Order ids are compared and hashed by a key that is computed
+    once, since they are used as keys of many dictionaries in the order book.
+    """
+    __slots__ = ('_trader_id', '_order_number', '_key')
 
     def __init__(self, trader_id, order_number):
         """
@@ -69,6 +74,7 @@ class OrderId(object):
 
         self._trader_id = trader_id
         self._order_number = order_number
+        self._key = (trader_id.to_bytes(), int(order_number))
 
     @property
     def trader_id(self):
@@ -96,14 +102,13 @@ class OrderId(object):
         elif self is other:
             return True
         else:
-            return (self._trader_id, self._order_number) == \
-                   (other.trader_id, other.order_number)
+            return self._key == other._key
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash((self._trader_id, self._order_number))
+        return hash(self._key)
 
 
 class Order(object):
@@ -1,11 +1,13 @@
 import logging
 import time
+from collections import OrderedDict
+from heapq import heapify, heappop, heappush
+from itertools import count
 
 from Tribler.community.market.core.assetpair import AssetPair
 from Tribler.community.market.core.price import Price
-from twisted.internet import reactor
-from twisted.internet.defer import fail
-from twisted.internet.task import deferLater
+from twisted.internet.defer import Deferred, fail, maybeDeferred
+from twisted.internet.task import LoopingCall
 from twisted.python.failure import Failure
 
 from Tribler.community.market.core.message import TraderId
@@ -14,8 +16,18 @@ from Tribler.community.market.core.side import Side
 from Tribler.community.market.core.tick import Tick, Ask, Bid
 from Tribler.community.market.core.timeout import Timeout
 from Tribler.community.market.core.timestamp import Timestamp
+from Tribler.pyipv8.ipv8.messaging.bloomfilter import BloomFilter
 from Tribler.pyipv8.ipv8.taskmanager import TaskManager
 
+# The interval (in seconds) at which we remove the ticks that have timed out
+TICK_TIMEOUT_INTERVAL = 1
+# The interval (in seconds) at which the DatabaseOrderBook writes the changed ticks to the database
+ORDER_BOOK_SAVE_INTERVAL = 60
+# The false positive rate of the bloom filter with the order ids in the order book
+ORDER_IDS_BLOOMFILTER_ERROR_RATE = 0.005
+# The bloom filter has room for a tenth more order ids than the order book, but at least for this number of order ids
+ORDER_IDS_BLOOMFILTER_MIN_SLACK = 10
+
 
 class OrderBook(TaskManager):
     """
@@ -31,6 +43,127 @@ class OrderBook(TaskManager):
         self._asks = Side()
         self.completed_orders = set()
 
+        # Instead of scheduling a reactor call for every tick, we keep the timeouts of the ticks in a heap, and remove
+        # the ticks that have timed out in batches. Removed ticks stay in the heap until they would have timed out, or
+        # until they make up more than half of the heap.
+        self._tick_timeouts = []  # Heap of (timeout time, sequence number, order id, timeout method, deferred) tuples
+        self._stale_tick_timeouts = 0  # The number of entries in the heap of ticks that have been removed
+        self._tick_timeout_deferreds = {}  # Map from order id to the deferred that fires when the tick times out
+        self._tick_timeout_counter = count()
+        self.register_task("check_tick_timeouts", LoopingCall(self.check_tick_timeouts))\
+            .start(TICK_TIMEOUT_INTERVAL, now=False)
+
+        self.version = 0  # Incremented whenever a tick is inserted
+        self._insert_versions = OrderedDict()  # Map from order id to the version at which the tick was inserted
+        self._order_ids_bloomfilter = None
+        self._order_ids_bloomfilter_capacity = 0
+        self._order_ids_bloomfilter_keys = 0  # The number of keys in the filter, including those of removed ticks
+
+    def shutdown_task_manager(self):
+        for deferred in list(self._tick_timeout_deferreds.values()):
+            deferred.cancel()
+        self._tick_timeout_deferreds = {}
+        self._tick_timeouts = []
+        self._stale_tick_timeouts = 0
+        super(OrderBook, self).shutdown_task_manager()
+
+    def schedule_tick_timeout(self, tick, timeout_method):
+        """
+        Schedule the removal of a tick from the order book when it times out.
+        :return: a deferred that fires with the tick when it has timed out, or with None if it is removed earlier.
+        """
+        deferred = Deferred()
+        self._tick_timeout_deferreds[tick.order_id] = deferred
+        heappush(self._tick_timeouts, (float(tick.timestamp) + int(tick.timeout), next(self._tick_timeout_counter),
+                                       tick.order_id, timeout_method, deferred))
+        return deferred.addErrback(self.on_timeout_error)
+
+    def on_tick_inserted(self, order_id):
+        self.version += 1
+        self._insert_versions[order_id] = self.version
+
+        if self._order_ids_bloomfilter is not None:
+            if self._order_ids_bloomfilter_keys < self._order_ids_bloomfilter_capacity:
+                self._order_ids_bloomfilter.add(str(order_id))
+                self._order_ids_bloomfilter_keys += 1
+            else:
+                self._order_ids_bloomfilter = None
+
+    def on_tick_removed(self, order_id):
+        del self._insert_versions[order_id]
+
+        # We cannot remove keys from a bloom filter, so we rebuild it once most of its keys are of removed ticks
+        if self._order_ids_bloomfilter is not None and \
+                self._order_ids_bloomfilter_keys > 2 * len(self._insert_versions):
+            self._order_ids_bloomfilter = None
+
+    def on_tick_updated(self, order_id):
+        pass
+
+    def get_order_ids_bloomfilter(self):
+        """
+        Return a bloom filter with the ids of the orders in the order book. The filter is updated when ticks are
+        inserted, and is only rebuilt when it is full, or when it contains too many ids of removed ticks.
+        :rtype: BloomFilter
+        """
+        if self._order_ids_bloomfilter is None:
+            order_ids = [str(order_id) for order_id in self._insert_versions]
+            # Leave room for the ticks that are inserted until we rebuild the filter
+            self._order_ids_bloomfilter_capacity = len(order_ids) + max(len(order_ids) // 10,
+                                                                        ORDER_IDS_BLOOMFILTER_MIN_SLACK)
+            self._order_ids_bloomfilter = BloomFilter(ORDER_IDS_BLOOMFILTER_ERROR_RATE,
+                                                      self._order_ids_bloomfilter_capacity, prefix=' ')
+            if order_ids:
+                self._order_ids_bloomfilter.add_keys(order_ids)
+            self._order_ids_bloomfilter_keys = len(order_ids)
+        return self._order_ids_bloomfilter
+
+    def get_order_ids_since(self, version):
+        """
+        Return the IDs of the orders that have been inserted in the order book after the given version of the book.
+
+        :rtype: [OrderId]
+        """
+        order_ids = []
+        for order_id in reversed(self._insert_versions):
+            if self._insert_versions[order_id] <= version:
+                break
+            order_ids.append(order_id)
+        return order_ids
+
+    def cancel_tick_timeout(self, order_id):
+        deferred = self._tick_timeout_deferreds.pop(order_id, None)
+        if deferred:
+            deferred.cancel()
+
+            self._stale_tick_timeouts += 1
+            if self._stale_tick_timeouts > len(self._tick_timeouts) // 2:
+                self.compact_tick_timeouts()
+
+    def compact_tick_timeouts(self):
+        """
+        Remove the entries of the ticks that have been removed from the heap with tick timeouts.
+        """
+        self._tick_timeouts = [entry for entry in self._tick_timeouts
+                               if self._tick_timeout_deferreds.get(entry[2]) is entry[4]]
+        heapify(self._tick_timeouts)
+        self._stale_tick_timeouts = 0
+
+    def check_tick_timeouts(self):
+        """
+        Remove all ticks that have timed out.
+        """
+        now = time.time()
+        while self._tick_timeouts and self._tick_timeouts[0][0] <= now:
+            _, _, order_id, timeout_method, deferred = heappop(self._tick_timeouts)
+            # Skip the ticks that have been removed (and possibly inserted again) in the meantime
+            if self._tick_timeout_deferreds.get(order_id) is not deferred:
+                self._stale_tick_timeouts -= 1
+                continue
+
+            del self._tick_timeout_deferreds[order_id]
+            maybeDeferred(timeout_method, order_id).chainDeferred(deferred)
+
     def timeout_ask(self, order_id):
         ask = self.get_ask(order_id).tick
         self.remove_tick(order_id)
@@ -53,10 +186,8 @@ class OrderBook(TaskManager):
         """
         if not self._asks.tick_exists(ask.order_id) and ask.order_id not in self.completed_orders and ask.is_valid():
             self._asks.insert_tick(ask)
-            timeout_delay = float(ask.timestamp) + int(ask.timeout) - time.time()
-            task = deferLater(reactor, timeout_delay, self.timeout_ask, ask.order_id)
-            self.register_task("ask_%s_timeout" % ask.order_id, task)
-            return task.addErrback(self.on_timeout_error)
+            self.on_tick_inserted(ask.order_id)
+            return self.schedule_tick_timeout(ask, self.timeout_ask)
         return fail(Failure(RuntimeError("ask invalid"))).addErrback(self.on_invalid_tick_insert)
 
     def remove_ask(self, order_id):
@@ -64,8 +195,9 @@ class OrderBook(TaskManager):
         :type order_id: OrderId
         """
         if self._asks.tick_exists(order_id):
-            self.cancel_pending_task("ask_%s_timeout" % order_id)
+            self.cancel_tick_timeout(order_id)
             self._asks.remove_tick(order_id)
+            self.on_tick_removed(order_id)
 
     def insert_bid(self, bid):
         """
@@ -73,10 +205,8 @@ class OrderBook(TaskManager):
         """
         if not self._bids.tick_exists(bid.order_id) and bid.order_id not in self.completed_orders and bid.is_valid():
             self._bids.insert_tick(bid)
-            timeout_delay = float(bid.timestamp) + int(bid.timeout) - time.time()
-            task = deferLater(reactor, timeout_delay, self.timeout_bid, bid.order_id)
-            self.register_task("bid_%s_timeout" % bid.order_id, task)
-            return task.addErrback(self.on_timeout_error)
+            self.on_tick_inserted(bid.order_id)
+            return self.schedule_tick_timeout(bid, self.timeout_bid)
         return fail(Failure(RuntimeError("bid invalid"))).addErrback(self.on_invalid_tick_insert)
 
     def remove_bid(self, order_id):
@@ -84,8 +214,9 @@ class OrderBook(TaskManager):
         :type order_id: OrderId
         """
         if self._bids.tick_exists(order_id):
-            self.cancel_pending_task("bid_%s_timeout" % order_id)
+            self.cancel_tick_timeout(order_id)
             self._bids.remove_tick(order_id)
+            self.on_tick_removed(order_id)
 
     def update_ticks(self, ask_order_dict, bid_order_dict, traded_quantity, unreserve=True):
         """
@@ -107,6 +238,7 @@ class OrderBook(TaskManager):
         if ask_exists and ask_order_dict["traded"] >= self.get_tick(ask_order_id).traded:
             tick = self.get_tick(ask_order_id)
             tick.traded = ask_order_dict["traded"]
+            self.on_tick_updated(tick.order_id)
             if unreserve:
                 tick.release_for_matching(traded_quantity)
             if tick.traded >= tick.assets.first.amount:
@@ -126,6 +258,7 @@ class OrderBook(TaskManager):
         if bid_exists and bid_order_dict["traded"] >= self.get_tick(bid_order_id).traded:
             tick = self.get_tick(bid_order_id)
             tick.traded = bid_order_dict["traded"]
+            self.on_tick_updated(tick.order_id)
             if unreserve:
                 tick.release_for_matching(traded_quantity)
             if tick.traded >= tick.assets.first.amount:
@@ -239,8 +372,8 @@ class OrderBook(TaskManager):
         Return the spread between the bid and the ask price
         :rtype: Price
         """
-        spread = self.get_ask_price(price_wallet_id, quantity_wallet_id).amount - \
-                 self.get_bid_price(price_wallet_id, quantity_wallet_id).amount
+        spread = self.get_ask_price(price_wallet_id, quantity_wallet_id).exact_amount - \
+                 self.get_bid_price(price_wallet_id, quantity_wallet_id).exact_amount
         return Price(spread, price_wallet_id, quantity_wallet_id)
 
     def get_mid_price(self, price_wallet_id, quantity_wallet_id):
@@ -248,8 +381,8 @@ class OrderBook(TaskManager):
         Return the price in between the bid and the ask price
         :rtype: Price
         """
-        ask_price = self.get_ask_price(price_wallet_id, quantity_wallet_id).amount
-        bid_price = self.get_bid_price(price_wallet_id, quantity_wallet_id).amount
+        ask_price = self.get_ask_price(price_wallet_id, quantity_wallet_id).exact_amount
+        bid_price = self.get_bid_price(price_wallet_id, quantity_wallet_id).exact_amount
         return Price((ask_price + bid_price) / 2, price_wallet_id, quantity_wallet_id)
 
     def bid_side_depth(self, price):
@@ -312,6 +445,26 @@ class OrderBook(TaskManager):
         """
         return self._asks.get_min_price_list(price_wallet_id, quantity_wallet_id)
 
+    def get_crossing_tick_entries(self, tick):
+        """
+        Return the tick entries on the other side of the order book with a price at which they could trade with the
+        given tick. Only the price levels that cross the price of the tick are visited, from the best price onward.
+        :rtype: [TickEntry]
+        """
+        price = tick.price
+        tick_entries = []
+        if tick.is_ask():
+            price_level = self.get_bid_price_level(price.numerator, price.denominator)
+            while price_level is not None and price_level.price >= price:
+                tick_entries.extend(price_level)
+                price_level = price_level.prev_level
+        else:
+            price_level = self.get_ask_price_level(price.numerator, price.denominator)
+            while price_level is not None and price_level.price <= price:
+                tick_entries.extend(price_level)
+                price_level = price_level.next_level
+        return tick_entries
+
     def get_order_ids(self):
         """
         Return all IDs of the orders in the orderbook, both asks and bids. The returned list is sorted.
@@ -362,26 +515,50 @@ class OrderBook(TaskManager):
 class DatabaseOrderBook(OrderBook):
     """
     This class adds support for a persistency backend to store ticks.
-    For now, it only provides methods to save all ticks to the database or to restore all ticks from the database.
+    The ticks are restored from the database on startup, and the changed ticks are periodically written back.
     """
     def __init__(self, database):
         super(DatabaseOrderBook, self).__init__()
         self.database = database
+        self.dirty_order_ids = set()  # The ticks that have been inserted or changed since the last save
+        self.removed_order_ids = set()  # The ticks that have been removed since the last save
+        self.register_task("save_to_database", LoopingCall(self.save_to_database))\
+            .start(ORDER_BOOK_SAVE_INTERVAL, now=False)
+
+    def on_tick_inserted(self, order_id):
+        super(DatabaseOrderBook, self).on_tick_inserted(order_id)
+        self.dirty_order_ids.add(order_id)
+        self.removed_order_ids.discard(order_id)
+
+    def on_tick_updated(self, order_id):
+        super(DatabaseOrderBook, self).on_tick_updated(order_id)
+        self.dirty_order_ids.add(order_id)
+
+    def on_tick_removed(self, order_id):
+        super(DatabaseOrderBook, self).on_tick_removed(order_id)
+        self.dirty_order_ids.discard(order_id)
+        self.removed_order_ids.add(order_id)
 
     def save_to_database(self):
         """
-        Write all ticks to the database
+        Write the ticks that have changed since the last save to the database
         """
-        self.database.delete_all_ticks()
-        for order_id in self.get_order_ids():
-            tick = self.get_tick(order_id)
-            if tick.is_valid():
-                self.database.add_tick(tick.tick)
+        if self.removed_order_ids:
+            self.database.delete_ticks(self.removed_order_ids)
+        if self.dirty_order_ids:
+            self.database.add_ticks([self.get_tick(order_id).tick for order_id in self.dirty_order_ids])
+        self.dirty_order_ids = set()
+        self.removed_order_ids = set()
 
     def restore_from_database(self):
         """
         Restore ticks from the database
         """
         for tick in self.database.get_ticks():
-            if not self.tick_exists(tick.order_id) and tick.is_valid():
+            if not tick.is_valid():
+                self.removed_order_ids.add(tick.order_id)
+            elif not self.tick_exists(tick.order_id):
                 self.insert_ask(tick) if tick.is_ask() else self.insert_bid(tick)
+
+        # The restored ticks are already in the database
+        self.dirty_order_ids = set()
@@ -1,27 +1,39 @@
+from fractions import Fraction
+
+
 class Price(object):
     """
     This class represents a price in the market.
     The price is simply a fraction that expresses one asset in another asset.
     For instance, 0.5 MB/BTC means that one exchanges 0.5 MB for 1 BTC.
+
+    Prices are immutable. They are compared by the exact amount, a Fraction that is computed once, so prices of
+    assets with many decimals (e.g. a few satoshi) are never rounded to the same value.
     """
+    __slots__ = ('amount', 'numerator', 'denominator', 'exact_amount')
 
     def __init__(self, amount, numerator, denominator):
-        self.amount = amount
+        """
+        :param amount: the amount of the price, or the exact Fraction of the two asset amounts that it expresses
+        """
+        self.amount = float(amount) if isinstance(amount, Fraction) else amount
         self.numerator = numerator
         self.denominator = denominator
+        # A float is taken as the decimal number it stands for (e.g. 0.3 is 3/10), not as its binary approximation
+        self.exact_amount = Fraction(repr(amount)) if isinstance(amount, float) else Fraction(amount)
 
     def __str__(self):
         return "%g %s/%s" % (self.amount, self.numerator, self.denominator)
 
     def __lt__(self, other):
         if isinstance(other, Price) and self.numerator == other.numerator and self.denominator == other.denominator:
-            return self.amount < other.amount
+            return self.exact_amount < other.exact_amount
         else:
             return NotImplemented
 
     def __le__(self, other):
         if isinstance(other, Price) and self.numerator == other.numerator and self.denominator == other.denominator:
-            return self.amount <= other.amount
+            return self.exact_amount <= other.exact_amount
         else:
             return NotImplemented
 
@@ -32,13 +44,13 @@ class Price(object):
 
     def __gt__(self, other):
         if isinstance(other, Price) and self.numerator == other.numerator and self.denominator == other.denominator:
-            return self.amount > other.amount
+            return self.exact_amount > other.exact_amount
         else:
             return NotImplemented
 
     def __ge__(self, other):
         if isinstance(other, Price) and self.numerator == other.numerator and self.denominator == other.denominator:
-            return self.amount >= other.amount
+            return self.exact_amount >= other.exact_amount
         else:
             return NotImplemented
 
@@ -46,9 +58,7 @@ class Price(object):
         if not isinstance(other, Price) or self.numerator != other.numerator or self.denominator != other.denominator:
             return NotImplemented
         else:
-            rel_tol = 1e-09
-            abs_tol = 0.0
-            return abs(self.amount - other.amount) <= max(rel_tol * max(abs(self.amount), abs(other.amount)), abs_tol)
+            return self.exact_amount == other.exact_amount
 
     def __hash__(self):
-        return hash((self.amount, self.numerator, self.denominator))
+        return hash((self.exact_amount, self.numerator, self.denominator))
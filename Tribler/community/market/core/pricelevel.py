@@ -12,6 +12,8 @@ class PriceLevel(object):
         self._reserved = 0  # Total amount of reserved quantity in this price level
         self._last = None  # The current tick of the iterator
         self._price = price  # The price of this price level
+        self.prev_level = None  # The price level with the next lower price, set by the PriceLevelList
+        self.next_level = None  # The price level with the next higher price, set by the PriceLevelList
 
     @property
     def price(self):
@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 
+from bisect import bisect_left
+
 from typing import Any, Dict, List  # pylint: disable=unused-import
 
 from Tribler.community.market.core.price import Price  # pylint: disable=unused-import
@@ -8,29 +10,52 @@ from Tribler.community.market.core.pricelevel import PriceLevel
 
 class PriceLevelList(object):
     """
-    Sorted doubly linked dictionary implementation.
+    Sorted doubly linked dictionary implementation. The prices are kept in a sorted list, in which we search with
+    bisection, and the price levels are linked to their neighbours, so we can walk through them in constant time.
     """
 
     def __init__(self):
         super(PriceLevelList, self).__init__()
-        self._price_list = []  # type: List[float]
-        self._price_level_dictionary = {}  # type: Dict[float, PriceLevel]
+        self._price_list = []  # type: List[Price]
+        self._price_level_dictionary = {}  # type: Dict[Price, PriceLevel]
+
+    def _get_price_level(self, price):  # type: (Price) -> PriceLevel
+        price_level = self._price_level_dictionary.get(price)
+        if price_level is None:
+            raise ValueError("No price level with price %s" % price)
+        return price_level
 
     def insert(self, price_level):  # type: (PriceLevel) -> None
         """
         :type price_level: PriceLevel
         """
-        self._price_list.append(price_level.price)
-        self._price_list.sort()
+        index = bisect_left(self._price_list, price_level.price)
+        price_level.prev_level = self._price_level_dictionary[self._price_list[index - 1]] if index > 0 else None
+        price_level.next_level = self._price_level_dictionary[self._price_list[index]] \
+            if index < len(self._price_list) else None
+        if price_level.prev_level is not None:
+            price_level.prev_level.next_level = price_level
+        if price_level.next_level is not None:
+            price_level.next_level.prev_level = price_level
+
+        self._price_list.insert(index, price_level.price)
         self._price_level_dictionary[price_level.price] = price_level
 
     def remove(self, price):  # type: (Price) -> None
         """
         :type price: Price
         """
-        self._price_list.remove(price)
+        price_level = self._get_price_level(price)
+        del self._price_list[bisect_left(self._price_list, price_level.price)]
         del self._price_level_dictionary[price]
 
+        if price_level.prev_level is not None:
+            price_level.prev_level.next_level = price_level.next_level
+        if price_level.next_level is not None:
+            price_level.next_level.prev_level = price_level.prev_level
+        price_level.prev_level = None
+        price_level.next_level = None
+
     def succ_item(self, price):  # type: (Price) -> PriceLevel
         """
         Returns the price level where price_level.price is successor to given price
@@ -38,11 +63,10 @@ class PriceLevelList(object):
         :type price: Price
         :rtype: PriceLevel
         """
-        index = self._price_list.index(price) + 1
-        if index >= len(self._price_list):
+        succ_price_level = self._get_price_level(price).next_level
+        if succ_price_level is None:
             raise IndexError
-        succ_price = self._price_list[index]
-        return self._price_level_dictionary[succ_price]
+        return succ_price_level
 
     def prev_item(self, price):  # type: (Price) -> PriceLevel
         """
@@ -51,11 +75,10 @@ class PriceLevelList(object):
         :type price: Price
         :rtype: PriceLevel
         """
-        index = self._price_list.index(price) - 1
-        if index < 0:
+        prev_price_level = self._get_price_level(price).prev_level
+        if prev_price_level is None:
             raise IndexError
-        prev_price = self._price_list[index]
-        return self._price_level_dictionary[prev_price]
+        return prev_price_level
 
     def min_key(self):  # type: () -> Price
         """
@@ -81,13 +104,8 @@ class PriceLevelList(object):
         :type reverse: bool
         :rtype: List[(Price, PriceLevel)]
         """
-        items = []
-        for price in self._price_list:
-            if reverse:
-                items.insert(0, self._price_level_dictionary[price])
-            else:
-                items.append(self._price_level_dictionary[price])
-        return items
+        prices = reversed(self._price_list) if reverse else self._price_list
+        return [self._price_level_dictionary[price] for price in prices]
 
     def get_ticks_list(self):  # type: () -> List[Any]
         """
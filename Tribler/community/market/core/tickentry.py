@@ -3,11 +3,18 @@ import logging
 from twisted.internet import reactor
 
 from Tribler.community.market.core.tick import Tick
-from Tribler.pyipv8.ipv8.taskmanager import TaskManager
 
 
-class TickEntry(TaskManager):
-    """Class for representing a tick in the order book"""
+class TickEntry(object):
+    """
+    Class for representing a tick in the order book.
+
+    The order book holds a tick entry for every tick, so tick entries are kept small: they share a logger, and the
+    calls that unblock order ids for matching are only kept while an order id is blocked.
+    """
+    __slots__ = ('_tick', '_price_level', '_prev_tick', '_next_tick', '_reserved_for_matching',
+                 '_blocked_for_matching')
+    _logger = logging.getLogger("TickEntry")
 
     def __init__(self, tick, price_level):
         """
@@ -18,14 +25,12 @@ class TickEntry(TaskManager):
         """
         super(TickEntry, self).__init__()
 
-        self._logger = logging.getLogger(self.__class__.__name__)
-
         self._tick = tick
         self._price_level = price_level
         self._prev_tick = None
         self._next_tick = None
         self._reserved_for_matching = 0
-        self._blocked_for_matching = []
+        self._blocked_for_matching = None  # Map from a blocked order id to the call that unblocks it
 
     @property
     def tick(self):
@@ -70,23 +75,40 @@ class TickEntry(TaskManager):
         """
         Temporarily block an order id for matching
         """
-        if order_id in self._blocked_for_matching:
+        if self._blocked_for_matching is None:
+            self._blocked_for_matching = {}
+        elif order_id in self._blocked_for_matching:
             self._logger.debug("Not blocking %s for matching; already blocked", order_id)
             return
 
         def unblock_order_id(unblock_id):
             self._logger.debug("Unblocking order id %s", unblock_id)
-            self._blocked_for_matching.remove(unblock_id)
+            del self._blocked_for_matching[unblock_id]
 
         self._logger.debug("Blocking %s for tick %s", order_id, self.order_id)
-        self._blocked_for_matching.append(order_id)
-        self.register_task("unblock_%s" % order_id, reactor.callLater(10, unblock_order_id, order_id))
+        self._blocked_for_matching[order_id] = reactor.callLater(10, unblock_order_id, order_id)
 
     def is_blocked_for_matching(self, order_id):
         """
         Return whether the order_id is blocked for matching
         """
-        return order_id in self._blocked_for_matching
+        return self._blocked_for_matching is not None and order_id in self._blocked_for_matching
+
+    def cancel_all_pending_tasks(self):
+        """
+        Cancel the calls that unblock order ids.
+        """
+        if self._blocked_for_matching:
+            for unblock_call in self._blocked_for_matching.values():
+                if unblock_call.active():
+                    unblock_call.cancel()
+        self._blocked_for_matching = None
+
+    def shutdown_task_manager(self):
+        """
+        Called when the tick entry leaves the order book.
+        """
+        self.cancel_all_pending_tasks()
 
     def reserve_for_matching(self, reserve_quantity):
         """
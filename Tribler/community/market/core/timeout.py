@@ -5,6 +5,7 @@ from Tribler.community.market.core.timestamp import Timestamp
 
 class Timeout(object):
     """Used for having a validated instance of a timeout that we can easily check if it still valid."""
+    __slots__ = ('_timeout',)
 
     def __init__(self, timeout):
         """
@@ -8,6 +8,7 @@ from six import integer_types
 
 class Timestamp(object):
     """Used for having a validated instance of a timestamp that we can easily compare."""
+    __slots__ = ('_timestamp',)
 
     def __init__(self, timestamp):
         """
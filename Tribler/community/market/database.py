@@ -3,6 +3,7 @@ This file contains everything related to persistence for the market community.
 """
 from __future__ import absolute_import
 
+from itertools import groupby
 from os import path
 
 from six import text_type
@@ -136,9 +137,19 @@ class MarketDB(TrustChainDB):
         """
         Return all orders in the database.
         """
-        db_result = self.execute(u"SELECT * FROM orders")
-        return [Order.from_database(db_item, self.get_reserved_ticks(
-            OrderId(TraderId(bytes(db_item[0])), OrderNumber(db_item[1])))) for db_item in db_result]
+        # Get the orders together with their reserved ticks, so we do not need a query per order
+        db_result = self.execute(u"SELECT orders.*, reserved_trader_id, reserved_order_number, quantity "
+                                 u"FROM orders LEFT JOIN orders_reserved_ticks AS reserved "
+                                 u"ON orders.trader_id = reserved.trader_id "
+                                 u"AND orders.order_number = reserved.order_number "
+                                 u"ORDER BY orders.trader_id, orders.order_number")
+        orders = []
+        for _, db_items in groupby(db_result, lambda db_item: (bytes(db_item[0]), db_item[1])):
+            db_items = list(db_items)
+            reserved_ticks = [(OrderId(TraderId(bytes(db_item[-3])), OrderNumber(db_item[-2])), db_item[-1])
+                              for db_item in db_items if db_item[-3] is not None]
+            orders.append(Order.from_database(db_items[0][:-3], reserved_ticks))
+        return orders
 
     def get_order(self, order_id):
         """
@@ -331,6 +342,25 @@ class MarketDB(TrustChainDB):
             u"VALUES(?,?,?,?,?,?,?,?,?,?,?)", tick.to_database())
         self.commit()
 
+    def add_ticks(self, ticks):
+        """
+        Add or replace multiple ticks in the database, in a single transaction
+        """
+        self.executemany(
+            u"INSERT OR REPLACE INTO ticks (trader_id, order_number, asset1_amount, asset1_type, asset2_amount,"
+            u"asset2_type, timeout, timestamp, is_ask, traded, block_hash) "
+            u"VALUES(?,?,?,?,?,?,?,?,?,?,?)", [tick.to_database() for tick in ticks])
+        self.commit()
+
+    def delete_ticks(self, order_ids):
+        """
+        Remove the ticks with the given order ids from the database, in a single transaction
+        """
+        self.executemany(u"DELETE FROM ticks WHERE trader_id = ? AND order_number = ?",
+                         [(database_blob(order_id.trader_id.to_bytes()), text_type(order_id.order_number))
+                          for order_id in order_ids])
+        self.commit()
+
     def delete_all_ticks(self):
         """
         Remove all ticks from the database.
@@ -1,24 +1,68 @@
-import networkx as nx
+import numpy as np
+
+from scipy.sparse import coo_matrix, diags
 
 from Tribler.community.market.reputation.reputation_manager import ReputationManager
 from Tribler.pyipv8.ipv8.attestation.trustchain.block import UNKNOWN_SEQ
 
+# The parameters of the power iteration, which are the defaults of networkx.pagerank
+DAMPING_FACTOR = 0.85
+MAX_ITERATIONS = 100
+TOLERANCE = 1.0e-6
 
-class TemporalPagerankReputationManager(ReputationManager):
 
-    def compute(self, own_public_key):
+class TemporalPagerankReputationManager(ReputationManager):
+    """
+    Computes the reputation of traders with the Temporal PageRank algorithm.
+
+    The manager can be kept between computations: the blocks that are added are only processed once, the interaction
+    graph is kept as the entries of a sparse adjacency matrix, and every power iteration starts from the scores of the
+    previous computation.
+    """
+
+    def __init__(self, blocks):
+        super(TemporalPagerankReputationManager, self).__init__(blocks)
+        self.processed_blocks = set()  # The (public key, sequence number) of the blocks in the graph
+        self.node_indices = {}  # Map from an interaction (public key, sequence number) to its index in the matrix
+        self.node_owners = []  # For every node, the index of its public key in self.public_keys
+        self.public_keys = []
+        self.public_key_indices = {}
+        self.edge_rows = []
+        self.edge_columns = []
+        self.edge_weights = []
+        self.scores = np.zeros(0)  # The scores of the nodes at the end of the previous computation
+
+    def add_blocks(self, blocks):
         """
-        Compute the reputation based on the data in the TrustChain database using the Temporal PageRank algorithm.
+        Add blocks to the graph at the next computation. Blocks that we have processed before are ignored.
         """
-
-        nodes = set()
-        G = nx.DiGraph()
-
+        self.blocks.extend(blocks)
+
+    def get_node_index(self, public_key, sequence_number):
+        node = (public_key, sequence_number)
+        if node not in self.node_indices:
+            if public_key not in self.public_key_indices:
+                self.public_key_indices[public_key] = len(self.public_keys)
+                self.public_keys.append(public_key)
+            self.node_indices[node] = len(self.node_owners)
+            self.node_owners.append(self.public_key_indices[public_key])
+        return self.node_indices[node]
+
+    def add_edge(self, from_node, to_node, weight):
+        self.edge_rows.append(self.get_node_index(*from_node))
+        self.edge_columns.append(self.get_node_index(*to_node))
+        self.edge_weights.append(weight)
+
+    def process_blocks(self):
         for block in self.blocks:
             if block.link_sequence_number == UNKNOWN_SEQ or block.type != 'tx_done' \
                     or 'tx' not in block.transaction:
                 continue  # Don't consider half interactions
 
+            if (block.public_key, block.sequence_number) in self.processed_blocks:
+                continue
+            self.processed_blocks.add((block.public_key, block.sequence_number))
+
             pubkey_requester = block.link_public_key
             pubkey_responder = block.public_key
 
@@ -28,37 +72,58 @@ class TemporalPagerankReputationManager(ReputationManager):
             # In our market, we consider the amount of Bitcoin that have been transferred from A -> B.
             # For now, we assume that the value from B -> A is of equal worth.
 
-            value_exchange = block.transaction["tx"]["transferred"]["first"]["amount"]
+            value_exchange = float(block.transaction["tx"]["transferred"]["first"]["amount"])
 
-            G.add_edge((pubkey_requester, sequence_number_requester), (pubkey_requester, sequence_number_requester + 1),
-                       contribution=value_exchange)
-            G.add_edge((pubkey_requester, sequence_number_requester), (pubkey_responder, sequence_number_responder + 1),
-                       contribution=value_exchange)
+            self.add_edge((pubkey_requester, sequence_number_requester),
+                          (pubkey_requester, sequence_number_requester + 1), value_exchange)
+            self.add_edge((pubkey_requester, sequence_number_requester),
+                          (pubkey_responder, sequence_number_responder + 1), value_exchange)
 
-            G.add_edge((pubkey_responder, sequence_number_responder), (pubkey_responder, sequence_number_responder + 1),
-                       contribution=value_exchange)
-            G.add_edge((pubkey_responder, sequence_number_responder), (pubkey_requester, sequence_number_requester + 1),
-                       contribution=value_exchange)
+            self.add_edge((pubkey_responder, sequence_number_responder),
+                          (pubkey_responder, sequence_number_responder + 1), value_exchange)
+            self.add_edge((pubkey_responder, sequence_number_responder),
+                          (pubkey_requester, sequence_number_requester + 1), value_exchange)
+        self.blocks = []
 
-            nodes.add(pubkey_requester)
-            nodes.add(pubkey_responder)
+    def compute(self, own_public_key):
+        """
+        Compute the reputation based on the data in the TrustChain database using the Temporal PageRank algorithm.
+        """
+        self.process_blocks()
 
-        personal_nodes = [node1 for node1 in G.nodes() if node1[0] == own_public_key]
-        number_of_nodes = len(personal_nodes)
-        if number_of_nodes == 0:
+        if own_public_key not in self.public_key_indices:
             return {}
-        personalisation = {node_name: 1.0 / number_of_nodes if node_name in personal_nodes else 0
-                           for node_name in G.nodes()}
-
-        try:
-            result = nx.pagerank_scipy(G, personalization=personalisation, weight='contribution')
-        except nx.NetworkXException:
-            self._logger.info("Empty Temporal PageRank, returning empty scores")
+        num_nodes = len(self.node_owners)
+        node_owners = np.array(self.node_owners)
+
+        # The transition matrix, in which the weights of the outgoing edges of every node sum up to one
+        matrix = coo_matrix((self.edge_weights, (self.edge_rows, self.edge_columns)),
+                            shape=(num_nodes, num_nodes)).tocsr()
+        out_weights = np.asarray(matrix.sum(axis=1)).flatten()
+        is_dangling = out_weights == 0
+        out_weights[~is_dangling] = 1.0 / out_weights[~is_dangling]
+        matrix = diags(out_weights).dot(matrix).T.tocsr()
+
+        # We personalise the PageRank with our own interactions
+        personalisation = (node_owners == self.public_key_indices[own_public_key]).astype(float)
+        personalisation /= personalisation.sum()
+
+        # Start from the previous scores, and give the new nodes an equal share
+        scores = np.empty(num_nodes)
+        scores[:len(self.scores)] = self.scores
+        scores[len(self.scores):] = 1.0 / num_nodes
+        scores /= scores.sum()
+
+        for _ in range(MAX_ITERATIONS):
+            previous_scores = scores
+            scores = DAMPING_FACTOR * (matrix.dot(scores) + scores[is_dangling].sum() * personalisation) + \
+                (1 - DAMPING_FACTOR) * personalisation
+            if np.absolute(scores - previous_scores).sum() < num_nodes * TOLERANCE:
+                break
+        else:
+            self._logger.info("Temporal PageRank did not converge, returning empty scores")
             return {}
 
-        sums = {}
-
-        for interaction in result.keys():
-            sums[interaction[0]] = sums.get(interaction[0], 0) + result[interaction]
-
-        return sums
+        self.scores = scores
+        sums = np.bincount(node_owners, weights=scores, minlength=len(self.public_keys))
+        return dict(zip(self.public_keys, sums.tolist()))